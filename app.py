@@ -1,19 +1,58 @@
 import os
+import io
+import re
+import sys
+import time
+import bisect
+import csv
+import json
+import zlib
+import pickle
+import uuid
+import hmac
 import hashlib
+import sqlite3
+import shutil
+import tarfile
+import threading
+import multiprocessing
+import click
+import numpy as np
 import pandas as pd
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime
 from functools import wraps
+from jinja2 import DictLoader
+from markupsafe import escape
+
+try:
+    import fcntl
+except ImportError:  # Windows: hanya kunci antar-thread
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # penyimpanan kolom (Parquet) opsional
+    pa = pq = None
 
 # Impor library Flask
 from flask import (
     Flask, 
-    render_template_string,
+    render_template,
     request, 
     redirect, 
     url_for, 
     session, 
     flash,
-    jsonify 
+    jsonify,
+    Response,
+    send_file,
+    stream_template,
+    get_flashed_messages
 )
 
 # --- Path Absolut (Sudah Benar) ---
@@ -22,141 +61,3203 @@ APP_DIR = os.path.dirname(os.path.abspath(__file__))
 # Inisialisasi Aplikasi Flask
 app = Flask(__name__)
 
-# --- Kunci Rahasia (Sudah Benar) ---
-app.secret_key = 'kunci-rahasia-lokal-saya-bebas-diisi-apa-saja'
+# --- Kunci Rahasia (Sudah Benar) ---
+app.secret_key = 'kunci-rahasia-lokal-saya-bebas-diisi-apa-saja'
+
+# --- Lokasi Data ---
+# TANIAKUN_DATA_DIR: akar semua file data (default: folder app.py).
+# TANIAKUN_LAYOUT: "datar" (file user langsung di akar) atau "shard" (satu
+# folder per user, lihat bagian Folder per User).
+DATA_DIR = os.environ.get("TANIAKUN_DATA_DIR") or None
+LAYOUT_DATA = os.environ.get("TANIAKUN_LAYOUT", "datar")
+
+# --- Backend Penyimpanan: "csv" (default, file per user) atau "sqlite" ---
+STORAGE_BACKEND = os.environ.get("TANIAKUN_STORAGE", "csv")
+SQLITE_PATH = os.environ.get("TANIAKUN_SQLITE_PATH", os.path.join(DATA_DIR or APP_DIR, "taniakun.db"))
+
+# ---------------- Instrumentasi ----------------
+# Opt-in lewat TANIAKUN_INSTRUMENTASI=1. Fungsi yang diberi @diukur("nama")
+# (load_data, save_data, append_data, rollup, buku besar, render template,
+# ...) mencatat durasinya ke histogram per operasi; tiap request mendapat
+# header Server-Timing berisi total per operasi, dan /metrics menampilkan
+# histogram per route dan per operasi dalam format teks Prometheus (per
+# proses worker). User di TANIAKUN_ADMIN bisa mengirim header
+# "X-Taniakun-Profil: 1" untuk merekam profil sampling request itu ke
+# {data}/profil/ (format folded stack, bisa langsung dibuat flamegraph).
+# Kalau tidak aktif, @diukur mengembalikan fungsi aslinya dan hook request
+# tidak dipasang, jadi tidak ada biaya sama sekali.
+
+INSTRUMENTASI = os.environ.get("TANIAKUN_INSTRUMENTASI", "0") == "1"
+ADMIN_USERS = {u.strip() for u in os.environ.get("TANIAKUN_ADMIN", "").split(",") if u.strip()}
+PROFIL_INTERVAL = float(os.environ.get("TANIAKUN_PROFIL_INTERVAL", "0.005"))
+METRIK_EMBER = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIK = {
+    "taniakun_request_seconds": ("Latensi request per route", ("route", "method", "status")),
+    "taniakun_op_seconds": ("Durasi operasi penyimpanan/laporan", ("op",)),
+}
+
+_metrik_lock = threading.Lock()
+_histogram = {nama: {} for nama in METRIK}
+_ukur_local = threading.local()
+
+def _amati(nama, label, detik):
+    with _metrik_lock:
+        h = _histogram[nama].get(label)
+        if h is None:
+            h = _histogram[nama][label] = [[0] * len(METRIK_EMBER), 0.0, 0]
+        i = bisect.bisect_left(METRIK_EMBER, detik)
+        if i < len(METRIK_EMBER):
+            h[0][i] += 1
+        h[1] += detik
+        h[2] += 1
+
+def diukur(nama):
+    def pasang(f):
+        if not INSTRUMENTASI:
+            return f
+        @wraps(f)
+        def terukur(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                detik = time.perf_counter() - t0
+                _amati("taniakun_op_seconds", (nama,), detik)
+                catatan = getattr(_ukur_local, "catatan", None)
+                if catatan is not None:
+                    total = catatan.setdefault(nama, [0.0, 0])
+                    total[0] += detik
+                    total[1] += 1
+        return terukur
+    return pasang
+
+def teks_metrik():
+    baris = []
+    with _metrik_lock:
+        for nama, (bantuan, label_nama) in METRIK.items():
+            baris.append(f"# HELP {nama} {bantuan}")
+            baris.append(f"# TYPE {nama} histogram")
+            for label, (ember, total, jumlah) in sorted(_histogram[nama].items()):
+                lbl = ",".join(f'{k}="{v}"' for k, v in zip(label_nama, label))
+                kumulatif = 0
+                for batas, n in zip(METRIK_EMBER, ember):
+                    kumulatif += n
+                    baris.append(f'{nama}_bucket{{{lbl},le="{batas}"}} {kumulatif}')
+                baris.append(f'{nama}_bucket{{{lbl},le="+Inf"}} {jumlah}')
+                baris.append(f"{nama}_sum{{{lbl}}} {total:.6f}")
+                baris.append(f"{nama}_count{{{lbl}}} {jumlah}")
+    return "\n".join(baris) + "\n"
+
+class _Sampler(threading.Thread):
+    # Profiler sampling: tiap PROFIL_INTERVAL ambil stack thread request
+    def __init__(self, ident):
+        super().__init__(daemon=True)
+        self.target, self.stack, self.berhenti = ident, Counter(), threading.Event()
+
+    def run(self):
+        while not self.berhenti.wait(PROFIL_INTERVAL):
+            frame, bagian = sys._current_frames().get(self.target), []
+            while frame is not None:
+                kode = frame.f_code
+                bagian.append(f"{kode.co_name} ({os.path.basename(kode.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if bagian:
+                self.stack[";".join(reversed(bagian))] += 1
+
+    def simpan(self, endpoint):
+        self.berhenti.set()
+        self.join()
+        folder = os.path.join(_data_dir(), "profil")
+        os.makedirs(folder, exist_ok=True)
+        nama = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{endpoint}_{os.getpid()}.txt"
+        with open(os.path.join(folder, nama), "w", encoding="utf-8") as f:
+            for stack, n in self.stack.most_common():
+                f.write(f"{stack} {n}\n")
+        return nama
+
+if INSTRUMENTASI:
+    @app.before_request
+    def _mulai_ukur():
+        _ukur_local.catatan = {}
+        _ukur_local.mulai = time.perf_counter()
+        _ukur_local.sampler = None
+        if request.headers.get("X-Taniakun-Profil") == "1" and session.get("username") in ADMIN_USERS:
+            _ukur_local.sampler = _Sampler(threading.get_ident())
+            _ukur_local.sampler.start()
+
+    @app.after_request
+    def _selesai_ukur(resp):
+        mulai = getattr(_ukur_local, "mulai", None)
+        if mulai is None:
+            return resp
+        total = time.perf_counter() - mulai
+        endpoint = request.endpoint or "tidak_ditemukan"
+        _amati("taniakun_request_seconds", (endpoint, request.method, str(resp.status_code)), total)
+        timing = [f'{nama};desc="{n}x";dur={detik * 1000:.2f}' for nama, (detik, n) in _ukur_local.catatan.items()]
+        resp.headers["Server-Timing"] = ", ".join(timing + [f"total;dur={total * 1000:.2f}"])
+        if _ukur_local.sampler is not None:
+            resp.headers["X-Taniakun-Profil-File"] = _ukur_local.sampler.simpan(endpoint)
+            _ukur_local.sampler = None
+        return resp
+
+    @app.teardown_request
+    def _bersihkan_ukur(exc):
+        if getattr(_ukur_local, "sampler", None) is not None:
+            _ukur_local.sampler.berhenti.set()
+        _ukur_local.catatan = _ukur_local.mulai = _ukur_local.sampler = None
+
+# Durasi render template ikut tercatat sebagai operasi "template"
+render_template = diukur("template")(render_template)
+
+
+# ---------------- Data Kategori (Sama) ----------------
+kategori_pengeluaran = {
+    "Bibit": ["Intani", "Inpari", "Ciherang", "32"],
+    "Pupuk": ["Urea", "NPK", "Organik", "Ponska"],
+    "Pestisida": ["Debestan", "Ronsa", "Refaton", "Ema", "Plenum"],
+    "Alat Tani": ["Sabit", "Cangkul", "Karung"],
+    "Tenaga Kerja": ["Upah Harian", "Borongan"],
+    "Lainnya": ["Lain-lain"]
+}
+kategori_pemasukan = {
+    "Sumber Pemasukan": ["Penjualan Padi", "Lain-lain"]
+}
+metode_pemasukan = ["Tunai", "Transfer", "Piutang", "Pelunasan Piutang"]
+metode_pengeluaran = ["Tunai", "Transfer", "Utang", "Pelunasan Utang"]
+
+# ---------------- Bagan Akun ----------------
+# Registry akun dibangun sekali saat import. Kolom Akun, Metode, Kategori dan
+# Sub Kategori dimuat sebagai pandas Categorical dengan daftar kategori ini
+# di depan (nilai di luar registry ditambahkan di belakang), jadi
+# klasifikasi akun cukup lookup kode integer, bukan str.contains/isin.
+
+KELAS_AKUN = ["aktiva", "kewajiban", "pendapatan", "beban", "lainnya"]
+KELAS_LAINNYA = KELAS_AKUN.index("lainnya")
+
+BAGAN_AKUN = {}
+for _kelas, _daftar in (
+    ("aktiva", ["Kas", "Bank", "Piutang Dagang"]),
+    ("kewajiban", ["Utang Dagang"]),
+    ("pendapatan", ["Pendapatan"]),
+    ("beban", [a for kat, subs in kategori_pengeluaran.items() for a in [kat] + subs]),
+):
+    for _akun in _daftar:
+        BAGAN_AKUN.setdefault(_akun, KELAS_AKUN.index(_kelas))
+
+KATEGORI_KOLOM = {
+    "Akun": list(BAGAN_AKUN),
+    "Metode": list(dict.fromkeys(metode_pemasukan + metode_pengeluaran)),
+    "Kategori": list(kategori_pengeluaran),
+    "Sub Kategori": list(dict.fromkeys(s for subs in kategori_pengeluaran.values() for s in subs)),
+}
+
+def kelas_akun(akun):
+    # Akun di luar registry: aturan lama (nama mengandung "Pendapatan")
+    kelas = BAGAN_AKUN.get(akun)
+    if kelas is None:
+        kelas = KELAS_AKUN.index("pendapatan") if "Pendapatan" in str(akun) else KELAS_LAINNYA
+    return kelas
+
+def kode_kelas(akun):
+    # Kode kelas (indeks KELAS_AKUN) per baris. `akun` Series/Index nama
+    # akun; kalau sudah Categorical cukup satu lookup per kategori.
+    if not isinstance(akun.dtype, pd.CategoricalDtype):
+        akun = pd.Categorical(akun)
+    else:
+        akun = akun.array if isinstance(akun, pd.Series) else akun.values
+    peta = np.array([kelas_akun(a) for a in akun.categories] + [KELAS_LAINNYA], dtype=np.int8)
+    return peta[akun.codes]
+
+def _pakai_kategori(df):
+    # Ubah kolom kategori (in place) jadi Categorical sesuai registry
+    for kolom, daftar in KATEGORI_KOLOM.items():
+        if kolom not in df.columns or isinstance(df[kolom].dtype, pd.CategoricalDtype):
+            continue
+        nilai = df[kolom]
+        if not (pd.api.types.is_string_dtype(nilai) or nilai.dtype == object):
+            continue
+        terdaftar = set(daftar)
+        lain = [v for v in nilai.dropna().unique() if v not in terdaftar]
+        df[kolom] = pd.Categorical(nilai, categories=daftar + lain)
+    return df
+
+def _kategori_registry(df):
+    # Seperti _pakai_kategori, tapi kolom yang sudah Categorical (dibaca
+    # dengan dtype category / dictionary Parquet) diurutkan ulang kategorinya
+    for k, daftar in KATEGORI_KOLOM.items():
+        if k in df.columns and isinstance(df[k].dtype, pd.CategoricalDtype):
+            terdaftar = set(daftar)
+            df[k] = df[k].cat.set_categories(daftar + [v for v in df[k].cat.categories if v not in terdaftar])
+    return _pakai_kategori(df)
+
+# ---------------- Helper Functions ----------------
+# (Penyimpanan per user: file data, indeks, cache, tombstone, partisi, SQLite)
+
+def get_user_file(base_filename, username):
+    name, ext = os.path.splitext(base_filename)
+    filename = f"{name}_{username}{ext}"
+    return os.path.join(_folder_user(username), filename)
+
+# ---------------- Folder per User (Shard) ----------------
+# Dengan TANIAKUN_LAYOUT=shard setiap user punya folder sendiri di
+# {data}/user/{sha1[:2]}/{sha1[2:4]}/{user}/ (username yang tidak aman
+# dipakai sebagai nama folder diganti sha1-nya). Isinya file yang sama
+# seperti layout datar ({nama}_{user}.csv, .idx, .hapus, saldo, rollup,
+# kunci) plus subfolder grafik/ dan job/, jadi backup, hapus dan hitung
+# ukuran data satu user cukup satu folder, dan tidak ada folder berisi
+# ratusan ribu file. Pindah dari layout datar berjalan online: pertama kali
+# satu proses memakai folder seorang user, file lamanya dipindah (os.replace)
+# di bawah kunci user; `flask pindah-shard` memindah semua user sekaligus.
+# Semua worker harus memakai layout yang sama.
+
+_folder_lock = threading.Lock()
+_folder_siap = {}
+_NAMA_AMAN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]{0,99}")
+_POLA_FILE_USER = re.compile(r"(?:pemasukan|pengeluaran|jurnal)(?:@(?:\d{4}-\d{2}|lain))?_(.+)"
+                             r"\.(?:csv|idx|hapus|parquet|partisi)|saldo_(.+)\.json|rollup_(.+)\.csv")
+
+def _data_dir():
+    return DATA_DIR or APP_DIR
+
+def _folder_user(username):
+    root = _data_dir()
+    if LAYOUT_DATA != "shard":
+        return root
+    folder = _folder_siap.get((root, username))
+    if folder is not None:
+        return folder
+    h = hashlib.sha1(username.encode("utf-8")).hexdigest()
+    folder = os.path.join(root, "user", h[:2], h[2:4], username if _NAMA_AMAN.fullmatch(username) else h)
+    with _folder_lock:
+        if (root, username) not in _folder_siap:
+            os.makedirs(folder, exist_ok=True)
+            _pindah_dari_datar(username, root, folder)
+            _folder_siap[(root, username)] = folder
+    return folder
+
+def _subfolder_user(username, nama):
+    # Folder turunan milik user (grafik/, job/)
+    if LAYOUT_DATA != "shard":
+        return os.path.join(_data_dir(), nama, username)
+    return os.path.join(_folder_user(username), nama)
+
+def _nama_file_user(username, folder):
+    # Nama file milik user yang ada di folder, tanpa listdir (folder datar
+    # bisa berisi ratusan ribu file). Manifest partisi paling akhir: selama
+    # masih di tempat lama, partisinya tetap ditemukan kalau pindah terputus.
+    nama = ["saldo.json", "rollup.csv"]
+    for base_filename in COLUMNS_MAP:
+        stem = os.path.splitext(base_filename)[0]
+        nama += [stem + ext for ext in (".csv", ".idx", ".hapus", ".parquet")]
+        try:
+            with open(os.path.join(folder, f"{stem}_{username}.partisi"), encoding="utf-8") as f:
+                bulan = json.load(f)
+        except (FileNotFoundError, ValueError):
+            bulan = []
+        nama += [f"{stem}@{b}{ext}" for b in bulan for ext in (".csv", ".idx", ".hapus", ".parquet")]
+    nama += [os.path.splitext(b)[0] + ".partisi" for b in COLUMNS_MAP]
+    hasil = []
+    for base_filename in nama:
+        name, ext = os.path.splitext(base_filename)
+        if os.path.exists(os.path.join(folder, f"{name}_{username}{ext}")):
+            hasil.append(f"{name}_{username}{ext}")
+    return hasil
+
+def _pindah_dari_datar(username, root, folder):
+    sub = [(os.path.join(root, nama, username), os.path.join(folder, nama)) for nama in ("grafik", "job")]
+    if not _nama_file_user(username, root) and not any(os.path.isdir(lama) for lama, _ in sub):
+        return
+    with _kunci_path(os.path.join(folder, f"kunci_{username}.lock")):
+        for nama in _nama_file_user(username, root):
+            if not os.path.exists(os.path.join(folder, nama)):
+                os.replace(os.path.join(root, nama), os.path.join(folder, nama))
+        for lama, baru in sub:
+            if os.path.isdir(lama) and not os.path.exists(baru):
+                os.replace(lama, baru)
+        _hapus_file(os.path.join(root, f"kunci_{username}.lock"))
+
+def _folder_data():
+    # Semua folder yang bisa berisi file user: akar data (layout datar /
+    # sisa yang belum dipindah), lalu folder per user kalau shard
+    root = _data_dir()
+    yield root
+    akar_user = os.path.join(root, "user")
+    if LAYOUT_DATA != "shard" or not os.path.isdir(akar_user):
+        return
+    for a in sorted(os.listdir(akar_user)):
+        for b in sorted(os.listdir(os.path.join(akar_user, a))):
+            for nama in sorted(os.listdir(os.path.join(akar_user, a, b))):
+                yield os.path.join(akar_user, a, b, nama)
+
+def ukuran_user(username):
+    # (jumlah file, byte) data satu user; hanya untuk layout shard
+    n = total = 0
+    for folder, _, files in os.walk(_folder_user(username)):
+        for nama in files:
+            try:
+                total += os.path.getsize(os.path.join(folder, nama))
+            except FileNotFoundError:
+                continue
+            n += 1
+    return n, total
+
+def backup_user(username, tujuan):
+    # Arsip .tar.gz folder user; di bawah kunci user supaya isinya konsisten
+    folder = _folder_user(username)
+    with _kunci_user(username):
+        with tarfile.open(tujuan, "w:gz") as tar:
+            tar.add(folder, arcname=os.path.basename(folder),
+                    filter=lambda info: None if info.name.endswith((".lock", ".tmp")) else info)
+
+def hapus_data_user(username):
+    # Hapus semua data transaksi user (folder, baris SQLite, job); akun login tetap ada
+    folder = _folder_user(username)
+    with _kunci_user(username):
+        if STORAGE_BACKEND == "sqlite":
+            for base_filename in COLUMNS_MAP:
+                save_data(pd.DataFrame(columns=COLUMNS_MAP[base_filename]), base_filename, username)
+        conn = _job_conn()
+        with conn:
+            conn.execute('DELETE FROM "job" WHERE "Username" = ?', (username,))
+        shutil.rmtree(folder, ignore_errors=True)
+    _folder_siap.pop((_data_dir(), username), None)
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == username]:
+            _cache_drop(key)
+    for cache in (_append_state, _index_cache, _tombstone_cache, _manifest_cache, _rollup_cache, _grafik_gagal):
+        for path in [p for p in cache if p.startswith(folder + os.sep)]:
+            cache.pop(path, None)
+
+def _perlu_shard():
+    if LAYOUT_DATA != "shard":
+        click.echo("Perintah ini butuh TANIAKUN_LAYOUT=shard (lalu flask pindah-shard)")
+        return False
+    return True
+
+@app.cli.command("pindah-shard")
+def pindah_shard():
+    # Pindahkan file semua user dari layout datar ke folder per user. Aman
+    # dijalankan saat aplikasi hidup (per user di bawah kuncinya) dan diulang.
+    if not _perlu_shard():
+        return
+    root = _data_dir()
+    users = set()
+    for nama in os.listdir(root):
+        m = _POLA_FILE_USER.fullmatch(nama)
+        if m:
+            users.add(next(u for u in m.groups() if u is not None))
+    for sub in ("grafik", "job"):
+        if os.path.isdir(os.path.join(root, sub)):
+            users.update(os.listdir(os.path.join(root, sub)))
+    for username in sorted(users):
+        _folder_user(username)
+    click.echo(f"{len(users)} user dipindah ke {os.path.join(root, 'user')}")
+
+@app.cli.command("tenant-ukuran")
+@click.argument("username", required=False)
+def tenant_ukuran(username):
+    # Ukuran data satu user, atau semua folder user (terbesar dulu)
+    if not _perlu_shard():
+        return
+    if username:
+        n, total = ukuran_user(username)
+        click.echo(f"{username}: {n} file, {total / 2**20:.2f} MB")
+        return
+    hasil = []
+    for folder in list(_folder_data())[1:]:
+        total = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(folder) for f in files)
+        hasil.append((total, os.path.basename(folder)))
+    for total, nama in sorted(hasil, reverse=True):
+        click.echo(f"{nama}: {total / 2**20:.2f} MB")
+
+@app.cli.command("tenant-backup")
+@click.argument("username")
+@click.argument("tujuan")
+def tenant_backup(username, tujuan):
+    if not _perlu_shard():
+        return
+    backup_user(username, tujuan)
+    click.echo(f"{username} -> {tujuan} ({os.path.getsize(tujuan) / 2**20:.2f} MB)")
+
+@app.cli.command("tenant-hapus")
+@click.argument("username")
+@click.option("--ya", is_flag=True, help="tanpa konfirmasi")
+def tenant_hapus(username, ya):
+    if not _perlu_shard():
+        return
+    if not ya and not click.confirm(f"Hapus semua data transaksi {username}?"):
+        return
+    hapus_data_user(username)
+    click.echo(f"Data {username} dihapus")
+
+# ---------------- Skema Tabel ----------------
+# Tipe tiap kolom, urutannya = urutan kolom file (COLUMNS_MAP):
+#   tanggal  -> datetime64 di memori, ditulis sebagai FORMAT_TANGGAL
+#   rupiah   -> int64 (rupiah bulat, kosong = 0), jumlahnya tidak bergeser
+#   kategori -> Categorical sesuai KATEGORI_KOLOM
+#   teks     -> apa adanya
+# Pembaca (CSV, SQLite, Parquet) mengubah ke tipe ini sekali saat data
+# dimuat ke cache, jadi laporan tidak perlu pd.to_datetime lagi; penulis
+# (append_data, append_bersama, save_data) selalu menulis nilai baku.
+
+SKEMA = {
+    "pemasukan.csv": {"Tanggal": "tanggal", "Sumber": "teks", "Jumlah": "rupiah", "Metode": "kategori",
+                      "Keterangan": "teks", "Username": "teks", "ID": "teks"},
+    "pengeluaran.csv": {"Tanggal": "tanggal", "Kategori": "kategori", "Sub Kategori": "kategori",
+                        "Jumlah": "rupiah", "Keterangan": "teks", "Metode": "kategori", "Username": "teks",
+                        "ID": "teks"},
+    "jurnal.csv": {"Tanggal": "tanggal", "Akun": "kategori", "Debit": "rupiah", "Kredit": "rupiah",
+                   "Keterangan": "teks", "ID": "teks"},
+}
+COLUMNS_MAP = {base_filename: list(skema) for base_filename, skema in SKEMA.items()}
+FORMAT_TANGGAL = "%Y-%m-%d %H:%M:%S"
+
+def buat_id():
+    return uuid.uuid4().hex[:12]
+
+def _format_waktu(waktu):
+    return pd.Timestamp(waktu).strftime(FORMAT_TANGGAL)
+
+def _parse_tanggal(nilai):
+    # Jalur cepat dengan format tetap; sisa nilai lama berformat lain
+    # (mis. tanpa jam) diparse terpisah
+    tanggal = pd.to_datetime(nilai, format=FORMAT_TANGGAL, errors="coerce")
+    sisa = tanggal.isna() & nilai.notna()
+    if sisa.any():
+        tanggal[sisa] = pd.to_datetime(nilai[sisa], format="mixed", errors="coerce")
+    return tanggal
+
+# Batas satu nominal input (Rp 1 kuadriliun): jauh di bawah batas int64,
+# jadi total ribuan transaksi pun tidak meluap
+RUPIAH_MAKS = 10 ** 15
+PESAN_RUPIAH = "Jumlah harus bilangan bulat rupiah (tanpa sen), maksimal Rp 1.000.000.000.000.000."
+
+def _rupiah_bulat(jumlah):
+    # Nominal input baru yang sah: rupiah tidak punya sen (pecahan ditolak,
+    # bukan dibulatkan diam-diam) dan tidak lebih dari RUPIAH_MAKS
+    jumlah = float(jumlah)
+    return jumlah.is_integer() and abs(jumlah) <= RUPIAH_MAKS
+
+def _parse_rupiah(nilai):
+    # Kolom rupiah -> int64. Data lama ber-sen yang sudah tersimpan
+    # dibulatkan setengah ke atas (validasi pecahan hanya untuk input baru);
+    # nilai di luar jangkauan int64 ditolak, bukan dibiarkan meluap.
+    angka = np.floor(pd.to_numeric(nilai, errors="coerce").fillna(0) + 0.5)
+    if (angka.abs() >= 2.0 ** 63).any():
+        raise ValueError("Nilai rupiah di luar jangkauan int64.")
+    return angka.astype("int64")
+
+def _terapkan_skema(df, base_filename):
+    # Ubah kolom df (in place) ke tipe SKEMA; kolom yang sudah bertipe benar dilewati
+    for kolom, tipe in SKEMA.get(_tabel(base_filename), {}).items():
+        if kolom not in df.columns:
+            continue
+        if tipe == "tanggal" and not pd.api.types.is_datetime64_any_dtype(df[kolom]):
+            df[kolom] = _parse_tanggal(df[kolom])
+        elif tipe == "rupiah" and df[kolom].dtype != np.int64:
+            df[kolom] = _parse_rupiah(df[kolom])
+    return _kategori_registry(df)
+
+def _baca_csv(sumber, base_filename, **kwargs):
+    # pd.read_csv dengan dtype dari SKEMA (tanpa inferensi), lalu _terapkan_skema.
+    # Parser pyarrow (kalau terpasang) jauh lebih cepat dan langsung mengenali
+    # Tanggal; file yang ditolaknya (baris rusak, rupiah bukan angka) dibaca
+    # ulang dengan parser C, terakhir tanpa dtype.
+    skema = SKEMA.get(_tabel(base_filename), {})
+    dtype = {k: "float64" if t == "rupiah" else "category" for k, t in skema.items() if t in ("rupiah", "kategori")}
+    percobaan = ([{"dtype": dtype, "engine": "pyarrow"}] if pa is not None else []) + [{"dtype": dtype}, {}]
+    for i, opsi in enumerate(percobaan):
+        if i and hasattr(sumber, "seek"):
+            sumber.seek(0)
+        try:
+            df = pd.read_csv(sumber, **opsi, **kwargs)
+            break
+        except ValueError:
+            if i == len(percobaan) - 1:
+                raise
+    return _terapkan_skema(df, base_filename)
+
+def _teks_tanggal(nilai):
+    # Series -> teks FORMAT_TANGGAL; nilai yang tidak bisa diparse dibiarkan
+    if pd.api.types.is_datetime64_any_dtype(nilai):
+        return nilai.dt.strftime(FORMAT_TANGGAL).astype(object).where(nilai.notna(), None)
+    teks = nilai.astype(object)
+    baku = teks.map(lambda v: type(v) is str and len(v) == 19).astype(bool)
+    baku &= pd.to_datetime(teks.where(baku), format=FORMAT_TANGGAL, errors="coerce").notna()
+    lain = ~baku & teks.notna()
+    if lain.any():
+        tanggal = _parse_tanggal(teks[lain])
+        teks[lain] = tanggal.dt.strftime(FORMAT_TANGGAL).astype(object).where(tanggal.notna(), teks[lain])
+    return teks
+
+def _normalisasi_df(df, base_filename):
+    # Salinan df dengan nilai baku untuk ditulis ulang: tanggal FORMAT_TANGGAL,
+    # rupiah bulat (data lama ber-sen dibulatkan seperti saat dibaca)
+    df = df.copy()
+    for kolom, tipe in SKEMA.get(_tabel(base_filename), {}).items():
+        if kolom not in df.columns:
+            continue
+        if tipe == "tanggal":
+            df[kolom] = _teks_tanggal(df[kolom])
+        elif tipe == "rupiah":
+            df[kolom] = _parse_rupiah(df[kolom])
+    return df
+
+def _normalisasi_baris(row, base_filename):
+    # Versi satu baris (dict) dari _normalisasi_df untuk baris baru
+    # (append_data/append_bersama): rupiah yang tidak sah (_rupiah_bulat)
+    # ditolak dengan ValueError. Nilai yang sudah baku dilewati cepat.
+    for kolom, tipe in SKEMA.get(_tabel(base_filename), {}).items():
+        nilai = row.get(kolom)
+        if nilai is None or nilai == "":
+            continue
+        if tipe == "tanggal" and not (type(nilai) is str and len(nilai) == 19):
+            try:
+                row = dict(row, **{kolom: _format_waktu(nilai)})
+            except (ValueError, TypeError):
+                pass
+        elif tipe == "rupiah" and not (type(nilai) is int and abs(nilai) <= RUPIAH_MAKS):
+            try:
+                bulat = _rupiah_bulat(nilai)
+            except (ValueError, TypeError):
+                continue
+            if not bulat:
+                raise ValueError(PESAN_RUPIAH)
+            row = dict(row, **{kolom: int(float(nilai))})
+    return row
+
+@diukur("load_data")
+def load_data(base_filename, username, mulai=None, akhir=None, akun=None, kolom=None):
+    # mulai/akhir (opsional) membatasi Tanggal ke [mulai, akhir); akun
+    # (opsional) membatasi ke satu akun atau list akun (khusus jurnal).
+    # kolom (opsional): hanya kolom ini yang perlu. Pemanggil yang memberi
+    # kolom harus siap menerima Tanggal sebagai datetime (dari file Parquet).
+    if STORAGE_BACKEND == "sqlite":
+        return _sqlite_load(base_filename, username, mulai, akhir, akun, kolom)
+    bagian = _file_tabel(base_filename, username, mulai, akhir)
+    if bagian == [base_filename]:
+        return _load_file(base_filename, username, mulai, akhir, akun, kolom)
+    if not bagian:
+        return pd.DataFrame(columns=list(kolom or COLUMNS_MAP[base_filename]))
+    return _gabung([_load_file(b, username, mulai, akhir, akun, kolom) for b in bagian])
+
+def _load_file(base_filename, username, mulai=None, akhir=None, akun=None, kolom=None):
+    # load_data untuk satu file CSV (tabel tanpa partisi, atau satu partisi)
+    if KOLOM_AKTIF and kolom is not None:
+        filename = get_user_file(base_filename, username)
+        if _cache_get((username, base_filename), _stat_file(filename)) is None:
+            df = _kolom_load(base_filename, username, mulai, akhir, akun, kolom)
+            if df is not None:
+                return df
+
+    df = _csv_load(base_filename, username)
+    if kolom is not None:
+        df = df[[k for k in kolom if k in df.columns]]
+    return _saring(df, mulai, akhir, akun)
+
+def _saring(df, mulai=None, akhir=None, akun=None):
+    if df.empty or (mulai is None and akhir is None and akun is None):
+        return df
+    mask = pd.Series(True, index=df.index)
+    if mulai is not None or akhir is not None:
+        tanggal = df["Tanggal"]
+        if mulai is not None:
+            mask &= tanggal >= pd.Timestamp(mulai)
+        if akhir is not None:
+            mask &= tanggal < pd.Timestamp(akhir)
+    if akun is not None:
+        mask &= df["Akun"].isin([akun] if isinstance(akun, str) else list(akun))
+    return df[mask].copy()
+
+def _csv_load(base_filename, username):
+    # Isi file CSV lengkap (lewat cache), tanpa baris yang sudah di-tombstone
+    filename = get_user_file(base_filename, username)
+    stat = _stat_file(filename)
+    if stat is None:
+        return pd.DataFrame(columns=COLUMNS_MAP.get(_tabel(base_filename), []))
+    key = (username, base_filename)
+    df = _cache_get(key, stat)
+    if df is None:
+        # Baca di bawah kunci user supaya tidak pernah melihat append yang
+        # sedang ditulis worker lain; stat diambil ulang agar cocok dengan isi.
+        with _kunci_user(username):
+            stat = _stat_file(filename)
+            try:
+                df = _baca_csv(filename, base_filename)
+            except (FileNotFoundError, pd.errors.EmptyDataError):
+                return pd.DataFrame(columns=COLUMNS_MAP.get(_tabel(base_filename), []))
+            _cache_put(key, stat, df)
+
+    if "ID" not in df.columns or df["ID"].isna().any():
+        return _terapkan_skema(_migrasi_id(base_filename, username), base_filename)
+    dihapus = _baca_tombstone(base_filename, username)
+    if dihapus:
+        return df[~df["ID"].isin(dihapus)]
+    return df.copy()
+
+@diukur("save_data")
+def save_data(df, base_filename, username):
+    df = _normalisasi_df(df, base_filename)
+    if STORAGE_BACKEND == "sqlite":
+        _sqlite_save(df, base_filename, username)
+        return
+    if _partisi_aktif(base_filename, username):
+        _tulis_partisi(df, base_filename, username)
+        return
+    filename = get_user_file(base_filename, username)
+    if "ID" in COLUMNS_MAP.get(_tabel(base_filename), []):
+        df = _isi_id(df)
+    with _kunci_user(username):
+        _tulis_atomik(filename, lambda f: df.to_csv(f, index=False))
+        _append_state.pop(filename, None)
+        bertipe = _terapkan_skema(df.copy(), base_filename)
+        _cache_put((username, base_filename), _stat_file(filename), bertipe)
+        _hapus_file(_kolom_file(base_filename, username))
+        if KOLOM_AKTIF:
+            _tulis_kolom(bertipe, base_filename, username)
+        # Isi file sekarang = df, jadi tombstone dan index offset lama tidak berlaku
+        _hapus_file(_tombstone_file(base_filename, username))
+        _hapus_file(_index_file(base_filename, username))
+        _index_cache.pop(_index_file(base_filename, username), None)
+        if _tabel(base_filename) == "jurnal.csv":
+            _hapus_snapshot(username)
+        if _tabel(base_filename) in ROLLUP_TABEL:
+            _hapus_rollup(username)
+
+@diukur("saldo")
+def saldo_per_akun(username, akhir=None):
+    # Total Debit/Kredit per Akun untuk jurnal dengan Tanggal < akhir
+    # (dipakai Neraca). DataFrame ber-index Akun, kolom Debit dan Kredit.
+    if STORAGE_BACKEND == "sqlite":
+        return _sqlite_saldo(username, akhir)
+    return _saldo_dari_snapshot(username, akhir)
+
+@diukur("rollup")
+def rollup_rentang(username, mulai, akhir):
+    # Total per (Tabel, Kunci, Sub) untuk Tanggal di [mulai, akhir): Kunci =
+    # Sumber / Kategori / Akun, Sub = Sub Kategori. Nilai [Debit, Kredit];
+    # untuk pemasukan/pengeluaran Jumlah ada di posisi Debit.
+    if STORAGE_BACKEND == "sqlite":
+        return _sqlite_rollup(username, mulai, akhir)
+    return _rollup_csv(username, mulai, akhir)
+
+def versi_data(username):
+    # Penanda isi data user (pemasukan, pengeluaran, jurnal): berubah setiap
+    # ada insert/hapus/compaction. Dipakai sebagai kunci cache turunan data.
+    if STORAGE_BACKEND == "sqlite":
+        return _sqlite_versi(username)
+    stat = [(_stat_file(get_user_file(b, username)), _stat_file(_tombstone_file(b, username)))
+            for tabel in COLUMNS_MAP for b in _file_tabel(tabel, username)]
+    return hashlib.sha1(repr(stat).encode()).hexdigest()[:16]
+
+def _urutan(tanggal, ids):
+    # Permutasi yang mengurutkan per (tanggal, ids): argsort stabil per
+    # tanggal, lalu hanya deretan tanggal kembar yang diurutkan lagi per ID
+    urut = np.argsort(tanggal, kind="stable")
+    t = tanggal[urut]
+    sama = t[1:] == t[:-1]
+    kembar = np.zeros(len(t), dtype=bool)
+    kembar[1:] |= sama
+    kembar[:-1] |= sama
+    if kembar.any():
+        sub = urut[kembar]
+        urut[kembar] = sub[np.lexsort((ids[sub].astype(str), tanggal[sub]))]
+    return urut
+
+def _bangun_urut(df, dihapus, awal=0):
+    # {"pos", "tgl", "id"}: posisi baris df (+ awal) yang Tanggal-nya valid dan
+    # tidak di-tombstone, diurutkan per (Tanggal, ID), beserta kunci urutnya
+    tanggal = df["Tanggal"] if "Tanggal" in df.columns else pd.Series(pd.NaT, index=df.index)
+    if not pd.api.types.is_datetime64_any_dtype(tanggal):
+        tanggal = pd.to_datetime(tanggal, errors="coerce", format=FORMAT_TANGGAL)
+    ok = tanggal.notna().to_numpy().copy()
+    if dihapus:
+        ok &= ~df["ID"].isin(dihapus).to_numpy()
+    pos = np.flatnonzero(ok)
+    tgl = tanggal.to_numpy()[pos].astype("datetime64[ns]")
+    ids = df["ID"].astype(str).to_numpy(dtype=object)[pos] if "ID" in df.columns else np.array([], dtype=object)
+    urut = _urutan(tgl, ids)
+    return {"pos": pos[urut] + awal, "tgl": tgl[urut], "id": ids[urut]}
+
+def _sambung_urut(lama, baru, awal):
+    # Urutan file sesudah append: baris baru (mulai posisi awal) biasanya
+    # paling baru, jadi cukup disambung; urut ulang hanya kalau jatuh di tengah
+    tambah = _bangun_urut(baru, None, awal)
+    if not len(tambah["pos"]):
+        return lama
+    gabung = {k: np.concatenate([lama[k], tambah[k]]) for k in ("pos", "tgl", "id")}
+    if len(lama["pos"]) and (tambah["tgl"][0], tambah["id"][0]) < (lama["tgl"][-1], lama["id"][-1]):
+        urut = _urutan(gabung["tgl"], gabung["id"])
+        gabung = {k: v[urut] for k, v in gabung.items()}
+    gabung["tanda"] = lama["tanda"]
+    return gabung
+
+def _urut_file(base_filename, username):
+    # (df, urut) satu file CSV untuk load_halaman: df = isi file di cache,
+    # urut = _bangun_urut-nya. urut disimpan di entry cache bersama stat
+    # tombstone, disambung di _cache_get saat ada append, jadi tidak diurutkan
+    # ulang per request.
+    key = (username, base_filename)
+    df = None
+    if _cache_get(key, _stat_file(get_user_file(base_filename, username))) is None:
+        df = _csv_load(base_filename, username)  # baca file, isi cache
+    tanda = _stat_file(_tombstone_file(base_filename, username))
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or entry["pending"] or "ID" not in entry["df"].columns:
+            entry = None
+        elif entry["urut"] is not None and entry["urut"]["tanda"] == tanda:
+            return entry["df"], entry["urut"]
+        else:
+            sumber, lama = entry["df"], entry["urut"]
+    if entry is None:
+        # Tidak ter-cache (lebih besar dari CACHE_MAX_BYTES): urutkan langsung
+        df = _csv_load(base_filename, username) if df is None else df
+        return df, _bangun_urut(df, None)
+    dihapus = _baca_tombstone(base_filename, username)
+    if lama is not None and lama["tanda"] is not None and tanda is not None:
+        # Tombstone hanya bertambah: buang ID-nya tanpa urut ulang
+        tetap = ~pd.Series(lama["id"]).isin(dihapus).to_numpy()
+        urut = {k: lama[k][tetap] for k in ("pos", "tgl", "id")}
+    else:
+        urut = _bangun_urut(sumber, dihapus)
+    urut["tanda"] = tanda
+    with _cache_lock:
+        if _cache.get(key) is entry and entry["df"] is sumber:
+            entry["urut"] = urut
+    return sumber, urut
+
+def _bulan_utuh(bulan, mulai, akhir):
+    # Bulan partisi "YYYY-MM" seluruhnya di dalam [mulai, akhir)?
+    awal = pd.Timestamp(bulan + "-01")
+    return ((mulai is None or pd.Timestamp(mulai) <= awal)
+            and (akhir is None or awal + pd.offsets.MonthBegin(1) <= pd.Timestamp(akhir)))
+
+def _halaman_file(base_filename, username, per, cursor, urutan, mulai, akhir, kategori, metode):
+    # load_halaman untuk satu file: (maksimal per+1 baris sesudah cursor
+    # sesuai urutan, jumlah baris sesuai filter). Rentang tanggal dan cursor
+    # dicari dengan searchsorted; kategori/metode hanya diperiksa di rentangnya.
+    df, urut = _urut_file(base_filename, username)
+    tgl, ids, pos = urut["tgl"], urut["id"], urut["pos"]
+    a = 0 if mulai is None else int(tgl.searchsorted(pd.Timestamp(mulai).to_datetime64().astype("datetime64[ns]")))
+    b = len(tgl) if akhir is None else int(tgl.searchsorted(pd.Timestamp(akhir).to_datetime64().astype("datetime64[ns]")))
+    b = max(a, b)
+    cocok = None
+    if (kategori and "Kategori" in df.columns) or metode:
+        mask = np.ones(b - a, dtype=bool)
+        if kategori and "Kategori" in df.columns:
+            mask &= df["Kategori"].take(pos[a:b]).to_numpy(dtype=object) == kategori
+        if metode:
+            mask &= df["Metode"].take(pos[a:b]).to_numpy(dtype=object) == metode
+        cocok = np.flatnonzero(mask) + a
+    total = b - a if cocok is None else len(cocok)
+
+    desc = urutan == "desc"
+    batas = b if desc else a
+    if cursor is not None:
+        t = pd.Timestamp(cursor[0]).to_datetime64().astype("datetime64[ns]")
+        lo, hi = tgl.searchsorted(t, "left"), tgl.searchsorted(t, "right")
+        c = int(lo + ids[lo:hi].searchsorted(cursor[1], "left" if desc else "right"))
+        batas = min(b, c) if desc else max(a, c)
+    if cocok is None:
+        pilih = np.arange(max(a, batas - per - 1), batas)[::-1] if desc else np.arange(batas, min(b, batas + per + 1))
+    elif desc:
+        pilih = cocok[:cocok.searchsorted(batas)][-(per + 1):][::-1]
+    else:
+        pilih = cocok[cocok.searchsorted(batas):][:per + 1]
+    return df.iloc[pos[pilih]], total
+
+@diukur("load_halaman")
+def load_halaman(base_filename, username, per=50, cursor=None, urutan="desc",
+                 mulai=None, akhir=None, kategori=None, metode=None):
+    # Satu halaman data (keyset pagination) diurutkan per (Tanggal, ID).
+    # cursor = (Tanggal, ID) baris terakhir halaman sebelumnya.
+    # Hasil: (df halaman, total baris sesuai filter, cursor halaman berikutnya)
+    if STORAGE_BACKEND == "sqlite":
+        return _sqlite_halaman(base_filename, username, per, cursor, urutan, mulai, akhir, kategori, metode)
+
+    # Partisi bulanan dibaca dari bulan terdekat ke arah urutan (terbaru dulu
+    # untuk desc) dan berhenti membuka partisi begitu per+1 baris terkumpul;
+    # sisanya hanya dihitung lewat _jumlah_baris. Kalau ada filter kategori/
+    # metode atau bulannya terpotong rentang, partisi tetap dibuka untuk total.
+    # Partisi "lain" (tanpa Tanggal valid) tidak pernah tampil di halaman.
+    desc = urutan == "desc"
+    daftar = _file_tabel(base_filename, username, mulai, akhir)
+    bulan_cursor = pd.Timestamp(cursor[0]).strftime("%Y-%m") if cursor is not None else None
+    hasil, terkumpul, total = [], 0, 0
+    for b in (daftar[::-1] if desc else daftar):
+        bulan = os.path.splitext(b)[0].partition("@")[2]
+        if bulan == PARTISI_LAIN:
+            continue
+        lewat = bool(bulan) and (terkumpul > per or (
+            bulan_cursor is not None and (bulan > bulan_cursor if desc else bulan < bulan_cursor)))
+        if lewat and not (kategori or metode) and _bulan_utuh(bulan, mulai, akhir):
+            total += _jumlah_baris(b, username)
+            continue
+        h, n = _halaman_file(b, username, per, cursor, urutan, mulai, akhir, kategori, metode)
+        total += n
+        if not lewat:
+            hasil.append(h)
+            terkumpul += len(h)
+    if not hasil:
+        return pd.DataFrame(columns=COLUMNS_MAP[base_filename]), total, None
+    df = _gabung(hasil)
+    if len(hasil) > 1:
+        df = (df.assign(_id=df["ID"].astype(str))
+                .sort_values(["Tanggal", "_id"], ascending=not desc, kind="stable")
+                .drop(columns="_id"))
+    halaman = df.head(per)
+    berikut = None
+    if len(df) > per:
+        berikut = (str(halaman["Tanggal"].iloc[-1]), str(halaman["ID"].iloc[-1]))
+    return halaman, total, berikut
+
+# ---------------- Backend SQLite ----------------
+# Skema tabel sama dengan COLUMNS_MAP (ditambah Username untuk jurnal),
+# dengan index (Username, Tanggal) dan (Username, Akun, Tanggal) supaya
+# filter tanggal laporan dan pencarian per akun hanya membaca baris
+# yang cocok.
+
+_sqlite_local = threading.local()
+
+def _sqlite_table(base_filename):
+    return os.path.splitext(base_filename)[0]
+
+def _sqlite_columns(base_filename):
+    kolom = list(COLUMNS_MAP[base_filename])
+    if "Username" not in kolom:
+        kolom.append("Username")
+    return kolom
+
+def _sqlite_kolom(kolom):
+    return ", ".join('"%s"' % k for k in kolom)
+
+def _sqlite_conn():
+    conn = getattr(_sqlite_local, "conn", None)
+    if conn is not None and _sqlite_local.path == SQLITE_PATH:
+        return conn
+    conn = sqlite3.connect(SQLITE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for base_filename in COLUMNS_MAP:
+        tabel = _sqlite_table(base_filename)
+        kolom = ", ".join(
+            f'"{k}" INTEGER' if SKEMA[base_filename].get(k) == "rupiah" else f'"{k}" TEXT'
+            for k in _sqlite_columns(base_filename)
+        )
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{tabel}" ({kolom})')
+        # Database lama (sebelum ada kolom ID): tambah kolom dan isi ID baru
+        if "ID" not in [r[1] for r in conn.execute(f'PRAGMA table_info("{tabel}")')]:
+            conn.execute(f'ALTER TABLE "{tabel}" ADD COLUMN "ID" TEXT')
+            conn.execute(f'UPDATE "{tabel}" SET "ID" = lower(hex(randomblob(6))) WHERE "ID" IS NULL')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{tabel}_user_tanggal" ON "{tabel}" ("Username", "Tanggal")')
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "idx_{tabel}_user_id" ON "{tabel}" ("Username", "ID")')
+    conn.execute('CREATE INDEX IF NOT EXISTS "idx_jurnal_user_akun_tanggal" ON "jurnal" ("Username", "Akun", "Tanggal")')
+    # Nomor versi data per user, dinaikkan di transaksi yang sama dengan insert/delete
+    conn.execute('CREATE TABLE IF NOT EXISTS "versi" ("Username" TEXT PRIMARY KEY, "Versi" INTEGER NOT NULL)')
+    conn.commit()
+    _sqlite_local.conn, _sqlite_local.path = conn, SQLITE_PATH
+    return conn
+
+def _sqlite_load(base_filename, username, mulai=None, akhir=None, akun=None, kolom=None):
+    kolom = [k for k in kolom if k in COLUMNS_MAP[base_filename]] if kolom is not None else COLUMNS_MAP[base_filename]
+    where, params = ['"Username" = ?'], [username]
+    if akun is not None:
+        akun = [akun] if isinstance(akun, str) else list(akun)
+        where.append(f'"Akun" IN ({", ".join("?" * len(akun))})')
+        params.extend(akun)
+    if mulai is not None:
+        where.append('"Tanggal" >= ?')
+        params.append(_format_waktu(mulai))
+    if akhir is not None:
+        where.append('"Tanggal" < ?')
+        params.append(_format_waktu(akhir))
+    query = (f'SELECT {_sqlite_kolom(kolom)} '
+             f'FROM "{_sqlite_table(base_filename)}" WHERE {" AND ".join(where)} ORDER BY rowid')
+    return _terapkan_skema(pd.read_sql_query(query, _sqlite_conn(), params=params), base_filename)
+
+def _sqlite_halaman(base_filename, username, per, cursor, urutan, mulai, akhir, kategori, metode):
+    kolom = COLUMNS_MAP[base_filename]
+    where, params = ['"Username" = ?'], [username]
+    if mulai is not None:
+        where.append('"Tanggal" >= ?')
+        params.append(_format_waktu(mulai))
+    if akhir is not None:
+        where.append('"Tanggal" < ?')
+        params.append(_format_waktu(akhir))
+    if kategori and "Kategori" in kolom:
+        where.append('"Kategori" = ?')
+        params.append(kategori)
+    if metode:
+        where.append('"Metode" = ?')
+        params.append(metode)
+    tabel = _sqlite_table(base_filename)
+    conn = _sqlite_conn()
+    total = conn.execute(f'SELECT COUNT(*) FROM "{tabel}" WHERE {" AND ".join(where)}', params).fetchone()[0]
+
+    arah = "DESC" if urutan == "desc" else "ASC"
+    if cursor is not None:
+        where.append(f'("Tanggal", "ID") {"<" if urutan == "desc" else ">"} (?, ?)')
+        params.extend(cursor)
+    query = (f'SELECT {_sqlite_kolom(kolom)} FROM "{tabel}" '
+             f'WHERE {" AND ".join(where)} ORDER BY "Tanggal" {arah}, "ID" {arah} LIMIT ?')
+    df = _terapkan_skema(pd.read_sql_query(query, conn, params=params + [per + 1]), base_filename)
+    halaman = df.head(per)
+    berikut = None
+    if len(df) > per:
+        berikut = (str(halaman["Tanggal"].iloc[-1]), str(halaman["ID"].iloc[-1]))
+    return halaman, total, berikut
+
+def _sqlite_saldo(username, akhir=None):
+    where, params = '"Username" = ?', [username]
+    if akhir is not None:
+        where += ' AND "Tanggal" < ?'
+        params.append(_format_waktu(akhir))
+    query = (f'SELECT "Akun", COALESCE(SUM("Debit"), 0) AS "Debit", COALESCE(SUM("Kredit"), 0) AS "Kredit" '
+             f'FROM "jurnal" WHERE {where} GROUP BY "Akun"')
+    return pd.read_sql_query(query, _sqlite_conn(), params=params, index_col="Akun")
+
+def _sqlite_rollup(username, mulai, akhir):
+    conn = _sqlite_conn()
+    total = {}
+    for base_filename, (kunci, sub, debit, kredit) in ROLLUP_TABEL.items():
+        kolom = _sqlite_kolom([kunci, sub] if sub else [kunci])
+        query = (f'SELECT {kolom}, COALESCE(SUM("{debit}"), 0), ' +
+                 (f'COALESCE(SUM("{kredit}"), 0) ' if kredit else '0 ') +
+                 f'FROM "{_sqlite_table(base_filename)}" '
+                 f'WHERE "Username" = ? AND "Tanggal" >= ? AND "Tanggal" < ? GROUP BY {kolom}')
+        for row in conn.execute(query, (username, _format_waktu(mulai), _format_waktu(akhir))):
+            k = (base_filename, _kunci_rollup(row[0]), _kunci_rollup(row[1]) if sub else "")
+            t = total.setdefault(k, [0.0, 0.0])
+            t[0] += row[-2]
+            t[1] += row[-1]
+    return total
+
+def _sqlite_naik_versi(conn, username):
+    conn.execute('INSERT INTO "versi" VALUES (?, 1) ON CONFLICT("Username") DO UPDATE SET "Versi" = "Versi" + 1',
+                 (username,))
+
+def _sqlite_versi(username):
+    row = _sqlite_conn().execute('SELECT "Versi" FROM "versi" WHERE "Username" = ?', (username,)).fetchone()
+    return str(row[0] if row else 0)
+
+def _sqlite_insert(conn, rows, base_filename, username):
+    _sqlite_naik_versi(conn, username)
+    kolom = _sqlite_columns(base_filename)
+    values = [[username if k == "Username" else row.get(k) for k in kolom] for row in rows]
+    conn.executemany(
+        f'INSERT INTO "{_sqlite_table(base_filename)}" ({_sqlite_kolom(kolom)}) '
+        f'VALUES ({", ".join("?" * len(kolom))})',
+        values,
+    )
+
+def _sqlite_append(rows, base_filename, username):
+    conn = _sqlite_conn()
+    with conn:
+        _sqlite_insert(conn, rows, base_filename, username)
+
+def _sqlite_hapus(base_filename, username, id_transaksi, pembalikan=None):
+    # Hapus satu baris per ID; hanya satu dari beberapa penghapusan
+    # bersamaan yang mendapat baris (rowcount == 1). Jurnal pembalik ikut
+    # di-insert dalam transaksi yang sama.
+    kolom = COLUMNS_MAP[base_filename]
+    tabel = _sqlite_table(base_filename)
+    conn = _sqlite_conn()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(f'SELECT {_sqlite_kolom(kolom)} FROM "{tabel}" WHERE "Username" = ? AND "ID" = ?',
+                           (username, id_transaksi)).fetchone()
+        if row is None:
+            return None
+        transaksi = dict(zip(kolom, row))
+        jurnal = [_normalisasi_baris(r, "jurnal.csv") for r in pembalikan(transaksi)] if pembalikan else []
+        cur = conn.execute(f'DELETE FROM "{tabel}" WHERE "Username" = ? AND "ID" = ?', (username, id_transaksi))
+        if cur.rowcount != 1:
+            return None
+        if jurnal:
+            _sqlite_insert(conn, jurnal, "jurnal.csv", username)
+        _sqlite_naik_versi(conn, username)
+    return transaksi
+
+def _sqlite_save(df, base_filename, username):
+    df = _isi_id(df)
+    rows = df.astype(object).where(df.notna(), None).to_dict("records")
+    conn = _sqlite_conn()
+    with conn:
+        conn.execute(f'DELETE FROM "{_sqlite_table(base_filename)}" WHERE "Username" = ?', (username,))
+        _sqlite_insert(conn, rows, base_filename, username)
+
+@app.cli.command("migrasi-sqlite")
+def migrasi_sqlite():
+    # Salin semua file {pemasukan,pengeluaran,jurnal}_{user}.csv (atau
+    # partisinya) di folder data ke database SQLite. Aman diulang: data user
+    # yang sama ditimpa.
+    conn = _sqlite_conn()
+    for base_filename in COLUMNS_MAP:
+        for username in sorted({u for _, _, u in _berkas_tabel(base_filename)}):
+            bagian = [_csv_load(b, username) for b in _file_tabel(base_filename, username)]
+            if not bagian:
+                continue
+            df = _normalisasi_df(_gabung(bagian), base_filename)
+            rows = df.astype(object).where(df.notna(), None).to_dict("records")
+            with conn:
+                conn.execute(f'DELETE FROM "{_sqlite_table(base_filename)}" WHERE "Username" = ?', (username,))
+                _sqlite_insert(conn, rows, base_filename, username)
+            click.echo(f"{os.path.basename(get_user_file(base_filename, username))}: {len(rows)} baris -> {SQLITE_PATH}")
+
+# ---------------- Penyimpanan Kolom (Parquet) ----------------
+# Opsional (TANIAKUN_KOLOM=1, butuh pyarrow), khusus backend CSV. Setiap
+# save_data/compaction juga menulis {nama}_{user}.parquet: terkompresi zstd,
+# row group KOLOM_ROW_GROUP baris dengan statistik min/max Tanggal. CSV tetap
+# sumber kebenaran; load_data dengan kolom/rentang yang tidak ada di cache
+# membaca hanya kolom dan row group yang perlu (memory-mapped), ditambah ekor
+# CSV yang di-append sesudah file Parquet ditulis, dikurangi tombstone.
+# File Parquet yang tidak cocok lagi dengan CSV-nya (inode beda) diabaikan.
+
+KOLOM_AKTIF = os.environ.get("TANIAKUN_KOLOM", "0") == "1" and pq is not None
+KOLOM_ROW_GROUP = int(os.environ.get("TANIAKUN_KOLOM_ROW_GROUP", "50000"))
+
+def _kolom_file(base_filename, username):
+    return get_user_file(os.path.splitext(base_filename)[0] + ".parquet", username)
+
+def _tulis_kolom(df, base_filename, username):
+    # Dipanggil di bawah kunci user; df = isi file CSV saat ini
+    filename = get_user_file(base_filename, username)
+    st = os.stat(filename)
+    df = _terapkan_skema(df.copy(), base_filename)
+    for kolom in df.columns:
+        if isinstance(df[kolom].dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(df[kolom]):
+            df[kolom] = df[kolom].astype(object).where(df[kolom].notna(), None)
+    tabel = pa.Table.from_pandas(df, preserve_index=False)
+    meta = {**(tabel.schema.metadata or {}), b"taniakun": json.dumps({"ino": st.st_ino, "offset": st.st_size}).encode()}
+    _tulis_atomik(_kolom_file(base_filename, username), lambda f: pq.write_table(
+        tabel.replace_schema_metadata(meta), f, compression="zstd", row_group_size=KOLOM_ROW_GROUP,
+        write_statistics=True), biner=True)
+
+def _kolom_load(base_filename, username, mulai, akhir, akun, kolom):
+    # None kalau file Parquet tidak ada / tidak cocok: pemanggil pakai CSV
+    path = _kolom_file(base_filename, username)
+    filename = get_user_file(base_filename, username)
+    try:
+        skema = pq.read_schema(path, memory_map=True)
+        meta = json.loads(skema.metadata[b"taniakun"])
+        st = os.stat(filename)
+    except (FileNotFoundError, KeyError, TypeError, ValueError, pa.ArrowInvalid):
+        return None
+    if meta["ino"] != st.st_ino or st.st_size < meta["offset"]:
+        return None
+
+    dihapus = _baca_tombstone(base_filename, username)
+    kolom = [k for k in (kolom or skema.names) if k in skema.names]
+    baca = kolom + ["ID"] if dihapus and "ID" not in kolom else kolom
+    filter_ = []
+    if mulai is not None:
+        filter_.append(("Tanggal", ">=", pd.Timestamp(mulai)))
+    if akhir is not None:
+        filter_.append(("Tanggal", "<", pd.Timestamp(akhir)))
+    if akun is not None:
+        filter_.append(("Akun", "in", [akun] if isinstance(akun, str) else list(akun)))
+    # Kolom kategori dibaca sebagai dictionary -> Categorical, tanpa objek str per baris
+    df = pq.read_table(path, columns=baca, filters=filter_ or None, memory_map=True,
+                       read_dictionary=[k for k in baca if k in KATEGORI_KOLOM]).to_pandas()
+    df = _terapkan_skema(df, base_filename)
+
+    if st.st_size > meta["offset"]:
+        # Ekor CSV yang belum masuk Parquet (append sesudah compaction)
+        with _kunci_user(username):
+            with open(filename, "rb") as f:
+                header = f.readline()
+                f.seek(meta["offset"])
+                ekor = f.read(os.path.getsize(filename) - meta["offset"])
+        ekor = _baca_csv(io.BytesIO(header + ekor), base_filename, on_bad_lines="skip")
+        ekor = _saring(ekor, mulai, akhir, akun)[[k for k in baca if k in ekor.columns]]
+        if not ekor.empty:
+            for k in ekor.columns.intersection(list(KATEGORI_KOLOM)):
+                # Samakan kategori supaya concat tetap Categorical
+                kategori = list(df[k].cat.categories)
+                kategori += [v for v in ekor[k].dropna().unique() if v not in set(kategori)]
+                df[k] = df[k].cat.set_categories(kategori)
+                ekor[k] = pd.Categorical(ekor[k], categories=kategori)
+            df = pd.concat([df, ekor], ignore_index=True)
+    if dihapus:
+        df = df[~df["ID"].isin(dihapus)]
+    return df[kolom].copy()
+
+@app.cli.command("konversi-parquet")
+def konversi_parquet():
+    # Tulis file Parquet untuk semua {pemasukan,pengeluaran,jurnal}_{user}.csv
+    # di folder data (CSV tidak diubah). Aman diulang.
+    if pq is None:
+        click.echo("pyarrow belum terpasang: pip install pyarrow")
+        return
+    for tabel in COLUMNS_MAP:
+        for nama, base_filename, username in _berkas_tabel(tabel):
+            _csv_load(base_filename, username)  # migrasi file lama tanpa ID dulu
+            with _kunci_user(username):
+                # Isi file apa adanya (termasuk baris ber-tombstone, disaring saat baca)
+                df = pd.read_csv(get_user_file(base_filename, username), on_bad_lines="skip")
+                _tulis_kolom(df, base_filename, username)
+            click.echo(f"{nama}: {len(df)} baris -> {os.path.basename(_kolom_file(base_filename, username))}")
+
+# ---------------- Cache DataFrame per User ----------------
+# Hasil pd.read_csv disimpan per (username, base_filename) dan divalidasi
+# dengan mtime + ukuran file, jadi perubahan dari worker lain tetap
+# terbaca. append_data/save_data memperbarui cache langsung tanpa baca
+# ulang file. Total memori dibatasi CACHE_MAX_BYTES (LRU).
+
+CACHE_MAX_BYTES = int(os.environ.get("TANIAKUN_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "bytes": 0, "entries": 0}
+
+def _stat_file(filename):
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _cache_drop(key):
+    entry = _cache.pop(key, None)
+    if entry is not None:
+        cache_stats["bytes"] -= entry["bytes"]
+        cache_stats["entries"] = len(_cache)
+
+def _cache_get(key, stat):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry["stat"] != stat:
+            _cache_drop(key)
+            cache_stats["invalidations"] += 1
+            entry = None
+        if entry is None:
+            cache_stats["misses"] += 1
+            return None
+        if entry["pending"]:
+            baru = _baca_csv(io.StringIO("".join(entry["pending"])), key[1], names=list(entry["df"].columns), header=None)
+            if entry["urut"] is not None:
+                entry["urut"] = _sambung_urut(entry["urut"], baru, len(entry["df"]))
+            baris_lama = max(len(entry["df"]), 1)
+            entry["df"] = _pakai_kategori(pd.concat([entry["df"], baru], ignore_index=True) if not entry["df"].empty else baru)
+            entry["pending"] = []
+            bytes_baru = entry["bytes"] * len(entry["df"]) // baris_lama
+            cache_stats["bytes"] += bytes_baru - entry["bytes"]
+            entry["bytes"] = bytes_baru
+            _cache_evict()
+        _cache.move_to_end(key)
+        cache_stats["hits"] += 1
+        return entry["df"]
+
+def _cache_put(key, stat, df):
+    nbytes = int(df.memory_usage(deep=True).sum())
+    with _cache_lock:
+        _cache_drop(key)
+        if stat is None or nbytes > CACHE_MAX_BYTES:
+            return
+        _cache[key] = {"stat": stat, "df": df, "pending": [], "bytes": nbytes, "urut": None}
+        cache_stats["bytes"] += nbytes
+        cache_stats["entries"] = len(_cache)
+        _cache_evict()
+
+def _cache_append(key, stat_awal, stat_akhir, teks):
+    # Baris yang baru di-append disimpan sebagai teks CSV dan baru di-parse
+    # (sekali untuk semua) saat data dibaca lagi.
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return
+        if entry["stat"] != stat_awal or stat_akhir is None:
+            _cache_drop(key)
+            return
+        entry["pending"].append(teks)
+        entry["stat"] = stat_akhir
+
+def _cache_drop_locked(key):
+    with _cache_lock:
+        _cache_drop(key)
+
+def _cache_evict():
+    while cache_stats["bytes"] > CACHE_MAX_BYTES and _cache:
+        key, entry = _cache.popitem(last=False)
+        cache_stats["bytes"] -= entry["bytes"]
+        cache_stats["evictions"] += 1
+    cache_stats["entries"] = len(_cache)
+
+# ---------------- Kunci per User & Tulis Atomik ----------------
+# Beberapa worker (proses gunicorn/uwsgi) bisa menulis file user yang sama.
+# Semua penulisan file milik satu user dilakukan di bawah _kunci_user:
+# RLock (antar-thread) + flock pada kunci_{user}.lock (antar-proses),
+# reentrant dalam satu thread. File yang ditulis ulang penuh ditulis ke file
+# sementara lalu os.replace, jadi pembaca tidak pernah melihat file setengah jadi.
+
+_kunci_lock = threading.Lock()
+_kunci = {}
+
+@contextmanager
+def _kunci_path(path):
+    with _kunci_lock:
+        entry = _kunci.get(path)
+        if entry is None:
+            entry = _kunci[path] = {"lock": threading.RLock(), "depth": 0, "file": None, "pemilik": None}
+    with entry["lock"]:
+        if entry["depth"] == 0:
+            f = open(path, "a+", encoding="utf-8")
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            entry["file"] = f
+            entry["pemilik"] = threading.get_ident()
+        entry["depth"] += 1
+        try:
+            yield
+        finally:
+            entry["depth"] -= 1
+            if entry["depth"] == 0:
+                f, entry["file"], entry["pemilik"] = entry["file"], None, None
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                f.close()
+
+def _kunci_user(username):
+    return _kunci_path(get_user_file("kunci.lock", username))
+
+def _memegang_kunci(username):
+    entry = _kunci.get(get_user_file("kunci.lock", username))
+    return entry is not None and entry["pemilik"] == threading.get_ident()
+
+def _tulis_atomik(filename, tulis, biner=False, fsync=True):
+    # tulis(f) mengisi file sementara; baru menggantikan `filename` kalau sukses.
+    # fsync=False untuk file turunan yang dibangun ulang sendiri kalau hilang/basi.
+    tmp = f"{filename}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with (open(tmp, "wb") if biner else open(tmp, "w", newline="", encoding="utf-8")) as f:
+            tulis(f)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        _hapus_file(tmp)
+        raise
+
+# ---------------- Penyimpanan Append-Only ----------------
+# Baris baru ditambahkan langsung di akhir file (O(1)), tidak lagi
+# load -> concat -> tulis ulang seluruh file. fsync dilakukan per
+# FSYNC_EVERY append milik satu user (semua file, semua proses; dicatat di
+# file kunci user), dan file dipadatkan ulang (compaction) setiap
+# COMPACT_EVERY baris.
+
+FSYNC_EVERY = int(os.environ.get("TANIAKUN_FSYNC_EVERY", "16"))
+_LEBAR_CATATAN = 32  # byte per catatan append di file kunci (nama file partisi terpanjang < 32)
+COMPACT_EVERY = int(os.environ.get("TANIAKUN_COMPACT_EVERY", "50000"))
+
+_append_state = {}
+
+# Group commit: append yang datang bersamaan untuk file yang sama digabung
+# jadi satu write (+ satu fsync). Thread pertama jadi "pemimpin" dan menulis
+# semua baris yang terkumpul selama ia menunggu kunci user. Penggabungan
+# write hanya antar-thread satu proses; antar-proses yang dibagi adalah
+# catatan fsync (_catat_append), jadi N worker tetap satu putaran fsync per
+# FSYNC_EVERY append, bukan per FSYNC_EVERY append masing-masing.
+_grup_lock = threading.Lock()
+_grup_commit = {}
+
+def _catat_append(username, base_filename):
+    # Catat satu append yang belum di-fsync di file kunci user (dibagi semua
+    # proses, hanya disentuh selagi kuncinya dipegang), satu catatan lebar
+    # tetap per append. Setiap FSYNC_EVERY catatan, semua file yang tercatat
+    # di-fsync sekaligus lalu catatannya dikosongkan.
+    f = _kunci[get_user_file("kunci.lock", username)]["file"]
+    f.write(base_filename.ljust(_LEBAR_CATATAN - 1) + "\n")
+    f.flush()
+    if os.fstat(f.fileno()).st_size < FSYNC_EVERY * _LEBAR_CATATAN:
+        return
+    f.seek(0)
+    for b in {baris.strip() for baris in f.read().splitlines() if baris.strip()}:
+        try:
+            with open(get_user_file(b, username), "ab") as fb:
+                os.fsync(fb.fileno())
+        except FileNotFoundError:
+            pass  # partisi/file sudah ditulis ulang (dan di-fsync) sejak itu
+    f.truncate(0)
+
+def _read_header(filename):
+    with open(filename, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+def _csv_baris(values):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(values)
+    return buffer.getvalue()
+
+def _ends_with_newline(f):
+    f.seek(0, os.SEEK_END)
+    if f.tell() == 0:
+        return True
+    f.seek(f.tell() - 1)
+    return f.read(1) in (b"\n", b"\r")
+
+@diukur("append_data")
+def append_data(data, base_filename, username):
+    # `data` boleh satu dict atau list of dict (mis. pasangan debit/kredit
+    # dari buat_jurnal), semuanya ditulis dalam satu kali append.
+    rows = [_normalisasi_baris(row, base_filename) for row in ([data] if isinstance(data, dict) else data)]
+    if not rows:
+        return
+    if "ID" in COLUMNS_MAP.get(_tabel(base_filename), []):
+        rows = [row if row.get("ID") else dict(row, ID=buat_id()) for row in rows]
+    if STORAGE_BACKEND == "sqlite":
+        _sqlite_append(rows, base_filename, username)
+        return
+    if _partisi_aktif(base_filename, username):
+        for bulan, rows_bulan in _per_bulan(rows).items():
+            _daftar_partisi(base_filename, username, [bulan])
+            append_data(rows_bulan, _base_partisi(base_filename, bulan), username)
+        return
+    filename = get_user_file(base_filename, username)
+    if _memegang_kunci(username):
+        # Sudah di dalam kunci user (mis. dari compaction): tulis langsung
+        _tulis_append(rows, base_filename, username)
+        return
+
+    with _grup_lock:
+        grup = _grup_commit.get(filename)
+        pemimpin = grup is None
+        if pemimpin:
+            grup = _grup_commit[filename] = {"rows": [], "selesai": threading.Event(), "error": None}
+        grup["rows"].extend(rows)
+    if not pemimpin:
+        grup["selesai"].wait()
+        if grup["error"] is not None:
+            raise grup["error"]
+        return
+
+    try:
+        with _kunci_user(username):
+            with _grup_lock:
+                # Tutup grup: append berikutnya membentuk grup baru
+                _grup_commit.pop(filename, None)
+            _tulis_append(grup["rows"], base_filename, username)
+    except BaseException as e:
+        grup["error"] = e
+        raise
+    finally:
+        with _grup_lock:
+            if _grup_commit.get(filename) is grup:
+                _grup_commit.pop(filename)
+        grup["selesai"].set()
+
+def _tulis_append(rows, base_filename, username, compact=True):
+    # compact=False: baris yang ditulis sudah bersih (impor massal), tidak
+    # dihitung untuk COMPACT_EVERY
+    filename = get_user_file(base_filename, username)
+    with _kunci_user(username):
+        stat_awal = _stat_file(filename)
+        state = _append_state.get(filename)
+        if state is None or stat_awal is None or state.get("stat") != stat_awal:
+            # Belum pernah ditulis proses ini, atau sudah diubah worker lain
+            header, torn = [], False
+            if stat_awal is not None and stat_awal[1] > 0:
+                header = _read_header(filename)
+                with open(filename, "rb") as fb:
+                    torn = not _ends_with_newline(fb)
+            lama = state or {"since_compact": 0}
+            state = {"header": header, "torn": torn, "since_compact": lama["since_compact"]}
+            _append_state[filename] = state
+
+        header = state["header"]
+        if not header:
+            header = list(COLUMNS_MAP.get(_tabel(base_filename), []))
+            for row in rows:
+                header.extend(k for k in row if k not in header)
+            write_header = True
+        elif any(k not in header for row in rows for k in row):
+            # Kolom baru: jatuh ke jalur lama (tulis ulang penuh) sekali saja
+            df = load_data(base_filename, username)
+            df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True) if not df.empty else pd.DataFrame(rows)
+            save_data(df, base_filename, username)
+            return
+        else:
+            write_header = False
+
+        ukuran_awal = stat_awal[1] if stat_awal else 0
+        torn = state.pop("torn", False)
+
+        # Offset byte tiap baris dicatat untuk index ID -> offset
+        kepala = _csv_baris(header) if write_header else ""
+        baris = [_csv_baris([row.get(col, "") for col in header]) for row in rows]
+        offset = ukuran_awal + (1 if torn else 0) + len(kepala.encode("utf-8"))
+        entri_index = []
+        for row, teks_baris in zip(rows, baris):
+            if row.get("ID"):
+                entri_index.append((row["ID"], offset))
+            offset += len(teks_baris.encode("utf-8"))
+        teks = "".join(baris)
+
+        tabel = _tabel(base_filename)
+        versi_awal = _rollup_versi(tabel, username)
+        if tabel == "jurnal.csv":
+            versi_snapshot = _ukuran_jurnal(username)
+        with open(filename, "a", newline="", encoding="utf-8") as f:
+            if torn:
+                f.write("\n")
+            f.write(kepala + teks)
+            f.flush()
+        _catat_append(username, base_filename)
+        stat_akhir = _stat_file(filename)
+        _rollup_append(username, tabel, rows, 1, versi_awal)
+
+        if write_header or torn:
+            _cache_drop_locked((username, base_filename))
+        else:
+            _cache_append((username, base_filename), stat_awal, stat_akhir, teks)
+        _index_append(base_filename, username, entri_index)
+        if tabel == "jurnal.csv":
+            _update_snapshot(username, rows, versi_snapshot, _ukuran_jurnal(username))
+
+        state["header"] = header
+        state["stat"] = stat_akhir
+        if compact:
+            state["since_compact"] += len(rows)
+            _cek_compact(base_filename, username)
+
+def _cek_compact(base_filename, username):
+    state = _append_state.get(get_user_file(base_filename, username))
+    if state is not None and COMPACT_EVERY and state["since_compact"] >= COMPACT_EVERY:
+        compact_data(base_filename, username)
+
+def append_bersama(per_file, username):
+    # Append ke beberapa file sekaligus ({base_filename: list of dict}),
+    # satu write per file, semua atau tidak sama sekali: kalau satu gagal,
+    # file yang sudah ditulis dipotong kembali ke ukuran semula.
+    per_file = {b: [_normalisasi_baris(row, b) for row in rows] for b, rows in per_file.items() if rows}
+    if STORAGE_BACKEND == "sqlite":
+        conn = _sqlite_conn()
+        with conn:
+            for base_filename, rows in per_file.items():
+                _sqlite_insert(conn, rows, base_filename, username)
+        return
+    with _kunci_user(username):
+        # Tabel berpartisi dipecah dulu per file partisi
+        per_berkas, manifest_awal = {}, {}
+        for tabel, rows in per_file.items():
+            if not _partisi_aktif(tabel, username):
+                per_berkas[tabel] = rows
+                continue
+            manifest_awal[tabel] = _baca_manifest(tabel, username)
+            per_bulan = _per_bulan(rows)
+            _daftar_partisi(tabel, username, per_bulan)
+            per_berkas.update((_base_partisi(tabel, bulan), r) for bulan, r in per_bulan.items())
+        ukuran_awal = {}
+        for base_filename in per_berkas:
+            _csv_load(base_filename, username)  # migrasi file lama tanpa ID dulu
+            stat = _stat_file(get_user_file(base_filename, username))
+            ukuran_awal[base_filename] = stat[1] if stat else None
+        try:
+            for base_filename, rows in per_berkas.items():
+                _tulis_append(rows, base_filename, username, compact=False)
+        except BaseException:
+            for base_filename, ukuran in ukuran_awal.items():
+                filename = get_user_file(base_filename, username)
+                if ukuran is None:
+                    _hapus_file(filename)
+                    _hapus_file(_index_file(base_filename, username))
+                    _index_cache.pop(_index_file(base_filename, username), None)
+                elif os.path.exists(filename):
+                    os.truncate(filename, ukuran)
+                # Index, rollup dan snapshot memakai ukuran file sebagai versi,
+                # jadi otomatis dianggap basi; cache dibuang langsung.
+                _cache_drop_locked((username, base_filename))
+            for tabel, bulan in manifest_awal.items():
+                _tulis_manifest(tabel, username, bulan)
+            raise
+
+def compact_data(base_filename, username):
+    # Tulis ulang file dalam bentuk kanonik: baris yang sudah di-tombstone
+    # dibuang, begitu juga baris yang terpotong akibat crash di tengah append.
+    if _partisi_aktif(base_filename, username):
+        for b in _file_tabel(base_filename, username):
+            compact_data(b, username)
+        return
+    filename = get_user_file(base_filename, username)
+    if not os.path.exists(filename):
+        return
+    with _kunci_user(username):
+        try:
+            df = pd.read_csv(filename, on_bad_lines="skip")
+        except pd.errors.EmptyDataError:
+            return
+        dihapus = _baca_tombstone(base_filename, username)
+        if dihapus and "ID" in df.columns:
+            df = df[~df["ID"].isin(dihapus)]
+        save_data(df, base_filename, username)
+        if _tabel(base_filename) == "jurnal.csv":
+            _bangun_snapshot(username)
+
+# ---------------- ID Transaksi, Index Offset & Tombstone ----------------
+# Setiap baris punya ID tetap (buat_id) sejak disimpan. {nama}_{user}.idx
+# berisi pasangan "ID,offset" (posisi byte baris di file CSV), di-append
+# bersamaan dengan datanya. Penghapusan tidak menulis ulang file: ID
+# dicatat di {nama}_{user}.hapus (tombstone) dan baris itu disaring saat
+# load; compaction yang benar-benar membuangnya dari file.
+
+_index_cache = {}
+_tombstone_cache = {}
+
+def _index_file(base_filename, username):
+    return get_user_file(os.path.splitext(base_filename)[0] + ".idx", username)
+
+def _tombstone_file(base_filename, username):
+    return get_user_file(os.path.splitext(base_filename)[0] + ".hapus", username)
+
+def _hapus_file(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+def _isi_id(df):
+    if "ID" in df.columns and not df["ID"].isna().any():
+        return df
+    df = df.copy()
+    ids = df["ID"].astype(object) if "ID" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    kosong = ids.isna()
+    ids[kosong] = [buat_id() for _ in range(int(kosong.sum()))]
+    df["ID"] = ids
+    return df
+
+def _migrasi_id(base_filename, username):
+    # File lama tanpa kolom ID: beri ID ke semua baris, tulis ulang sekali
+    with _kunci_user(username):
+        filename = get_user_file(base_filename, username)
+        try:
+            df = pd.read_csv(filename)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            return pd.DataFrame(columns=COLUMNS_MAP.get(_tabel(base_filename), []))
+        if "ID" in df.columns and not df["ID"].isna().any():
+            return df
+        df = _isi_id(df)
+        save_data(df, base_filename, username)
+        return df.copy()
+
+def _index_append(base_filename, username, entri):
+    if not entri:
+        return
+    with open(_index_file(base_filename, username), "a", encoding="utf-8") as f:
+        f.write("".join(f"{id_baris},{offset}\n" for id_baris, offset in entri))
+
+def _index_bangun(base_filename, username):
+    # Hitung ulang offset semua baris: batas baris = newline di luar tanda kutip
+    filename = get_user_file(base_filename, username)
+    with open(filename, "rb") as f:
+        data = f.read()
+    ids = pd.read_csv(io.BytesIO(data), usecols=["ID"])["ID"].astype(str).tolist() if data else []
+    offsets, awal = [], 0
+    for m in re.finditer(rb'"[^"]*"|\n', data):
+        if m.group() != b"\n":
+            continue
+        if data[awal:m.end()].strip():
+            offsets.append(awal)
+        awal = m.end()
+    if awal < len(data) and data[awal:].strip():
+        offsets.append(awal)
+    offsets = offsets[1:]  # baris pertama = header
+    _tulis_atomik(_index_file(base_filename, username),
+                  lambda f: f.write("".join(f"{id_baris},{offset}\n" for id_baris, offset in zip(ids, offsets))))
+    _index_cache.pop(_index_file(base_filename, username), None)
+
+def _index_cari(base_filename, username, id_transaksi):
+    # Baca hanya bagian .idx yang belum pernah dibaca (index hanya bertambah)
+    idx_file = _index_file(base_filename, username)
+    if not os.path.exists(idx_file):
+        if not os.path.exists(get_user_file(base_filename, username)):
+            return None
+        _index_bangun(base_filename, username)
+    entry = _index_cache.get(idx_file)
+    ukuran = os.path.getsize(idx_file)
+    if entry is None or ukuran < entry["pos"]:
+        entry = _index_cache[idx_file] = {"pos": 0, "map": {}}
+    if ukuran > entry["pos"]:
+        with open(idx_file, "rb") as f:
+            f.seek(entry["pos"])
+            tambahan = f.read()
+        utuh = tambahan.rfind(b"\n") + 1
+        for baris in tambahan[:utuh].decode("utf-8").splitlines():
+            id_baris, _, offset = baris.rpartition(",")
+            if id_baris:
+                entry["map"][id_baris] = int(offset)
+        entry["pos"] += utuh
+    return entry["map"].get(id_transaksi)
+
+def _baca_baris(base_filename, username, id_transaksi):
+    # Ambil satu baris per ID lewat index offset, tanpa memuat seluruh file.
+    # Kalau index ternyata basi (ID tidak cocok), bangun ulang sekali.
+    filename = get_user_file(base_filename, username)
+    if not os.path.exists(filename):
+        return None
+    header = _read_header(filename)
+    for percobaan in range(2):
+        offset = _index_cari(base_filename, username, id_transaksi)
+        if offset is not None:
+            with open(filename, "rb") as fb:
+                fb.seek(offset)
+                row = next(csv.reader(io.TextIOWrapper(fb, encoding="utf-8", newline="")), None)
+            if row is not None and len(row) == len(header):
+                row = dict(zip(header, row))
+                if row.get("ID") == id_transaksi:
+                    return row
+        if percobaan == 0:
+            _index_bangun(base_filename, username)
+    return None
+
+def _jumlah_baris(base_filename, username):
+    # Jumlah baris yang belum dihapus tanpa mem-parse file CSV: jumlah entri
+    # index dikurangi tombstone. Index yang lebih tua dari datanya (append
+    # terputus, batch dibatalkan) dibangun ulang dulu.
+    data = _stat_file(get_user_file(base_filename, username))
+    if data is None:
+        return 0
+    idx = _stat_file(_index_file(base_filename, username))
+    if idx is None or idx[0] < data[0]:
+        _index_bangun(base_filename, username)
+    with open(_index_file(base_filename, username), "rb") as f:
+        return f.read().count(b"\n") - len(_baca_tombstone(base_filename, username))
+
+def _baca_tombstone(base_filename, username):
+    filename = _tombstone_file(base_filename, username)
+    stat = _stat_file(filename)
+    if stat is None:
+        return set()
+    entry = _tombstone_cache.get(filename)
+    if entry is None or entry[0] != stat:
+        with open(filename, encoding="utf-8") as f:
+            ids = {baris.split(",", 1)[0] for baris in f.read().splitlines() if baris}
+        entry = _tombstone_cache[filename] = (stat, ids)
+    return entry[1]
+
+def _tandai_hapus(base_filename, username, id_transaksi, pembalikan=None):
+    # Tombstone satu transaksi; hasilnya dict baris yang dihapus, atau None
+    # kalau ID tidak ada / sudah dihapus (termasuk oleh request lain).
+    # pembalikan(transaksi) (opsional) = baris jurnal pembalik: dibuat dan
+    # divalidasi sebelum tombstone ditulis, di-append di bawah kunci yang
+    # sama, dan kalau append-nya gagal tombstone dipotong kembali.
+    if STORAGE_BACKEND == "sqlite":
+        return _sqlite_hapus(base_filename, username, id_transaksi, pembalikan)
+    with _kunci_user(username):
+        berkas = _file_dengan_id(base_filename, username, id_transaksi)
+        if berkas is None or id_transaksi in _baca_tombstone(berkas, username):
+            return None
+        transaksi = _baca_baris(berkas, username, id_transaksi)
+        if transaksi is None:
+            return None
+        jurnal = [_normalisasi_baris(r, "jurnal.csv") for r in pembalikan(transaksi)] if pembalikan else []
+        tombstone = _tombstone_file(berkas, username)
+        ukuran_awal = (_stat_file(tombstone) or (0, 0))[1]
+        versi_awal = _rollup_versi(base_filename, username)
+        with open(tombstone, "a", encoding="utf-8") as f:
+            f.write(f"{id_transaksi},{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        _rollup_append(username, base_filename, [transaksi], -1, versi_awal)
+        if jurnal:
+            try:
+                append_data(jurnal, "jurnal.csv", username)
+            except BaseException:
+                # Rollup memakai ukuran tombstone sebagai versi, jadi otomatis
+                # dibangun ulang; urutan halaman di cache harus dibuang langsung.
+                os.truncate(tombstone, ukuran_awal)
+                _cache_drop_locked((username, berkas))
+                raise
+        return transaksi
+
+# ---------------- Partisi Bulanan ----------------
+# Opsional (TANIAKUN_PARTISI=1), khusus backend CSV. Tiap tabel disimpan per
+# bulan Tanggal di {nama}@{YYYY-MM}_{user}.csv (baris tanpa tanggal valid di
+# {nama}@lain_{user}.csv); daftar bulannya di {nama}_{user}.partisi (JSON).
+# Satu partisi = satu file biasa dengan index, tombstone, cache dan Parquet
+# sendiri, jadi load_data/load_halaman/iter_data dengan rentang hanya membuka
+# partisi yang beririsan. Baris baru masuk ke partisi bulan Tanggal-nya,
+# hapus mencari ID di partisi terbaru dulu. File tunggal lama dipecah saat
+# pertama dipakai (atau sekaligus: flask partisi-bulanan). Tabel yang sudah
+# punya manifest tetap dibaca per partisi walau TANIAKUN_PARTISI dimatikan.
+
+PARTISI_AKTIF = os.environ.get("TANIAKUN_PARTISI", "0") == "1" and STORAGE_BACKEND == "csv"
+PARTISI_LAIN = "lain"
+
+_POLA_BULAN = re.compile(r"\d{4}-(0[1-9]|1[0-2])-")
+_manifest_cache = {}
+
+def _tabel(base_filename):
+    # "jurnal@2024-03.csv" -> "jurnal.csv"
+    nama, ext = os.path.splitext(base_filename)
+    return nama.split("@", 1)[0] + ext
+
+def _base_partisi(base_filename, bulan):
+    nama, ext = os.path.splitext(base_filename)
+    return f"{nama}@{bulan}{ext}"
+
+def _manifest_file(base_filename, username):
+    return get_user_file(os.path.splitext(base_filename)[0] + ".partisi", username)
+
+def _baca_manifest(base_filename, username):
+    # Daftar bulan partisi (urut), None kalau tabel belum dipartisi
+    filename = _manifest_file(base_filename, username)
+    stat = _stat_file(filename)
+    if stat is None:
+        return None
+    entry = _manifest_cache.get(filename)
+    if entry is None or entry[0] != stat:
+        with open(filename, encoding="utf-8") as f:
+            entry = _manifest_cache[filename] = (stat, sorted(json.load(f)))
+    return entry[1]
+
+def _tulis_manifest(base_filename, username, bulan):
+    filename = _manifest_file(base_filename, username)
+    _tulis_atomik(filename, lambda f: json.dump(sorted(bulan), f))
+    _manifest_cache.pop(filename, None)
+
+def _partisi_aktif(base_filename, username):
+    if _tabel(base_filename) != base_filename:
+        return False  # sudah nama file partisi
+    if _baca_manifest(base_filename, username) is not None:
+        return True
+    if not PARTISI_AKTIF:
+        return False
+    pecah_partisi(base_filename, username)
+    return True
+
+def _file_tabel(base_filename, username, mulai=None, akhir=None):
+    # base_filename semua file penyimpan tabel; dengan mulai/akhir hanya
+    # partisi yang beririsan dengan [mulai, akhir)
+    if not _partisi_aktif(base_filename, username):
+        return [base_filename]
+    bulan = _baca_manifest(base_filename, username)
+    if mulai is not None or akhir is not None:
+        dari = pd.Timestamp(mulai).strftime("%Y-%m") if mulai is not None else ""
+        sampai = (pd.Timestamp(akhir) - pd.Timedelta(1, "ns")).strftime("%Y-%m") if akhir is not None else "9999-99"
+        bulan = [b for b in bulan if b != PARTISI_LAIN and dari <= b <= sampai]
+    return [_base_partisi(base_filename, b) for b in bulan]
+
+def _kunci_bulan(tanggal):
+    # Series Tanggal -> bulan partisi per baris
+    if not pd.api.types.is_datetime64_any_dtype(tanggal):
+        tanggal = _parse_tanggal(tanggal.astype(object))
+    return tanggal.dt.strftime("%Y-%m").astype(object).where(tanggal.notna(), PARTISI_LAIN)
+
+def _per_bulan(rows):
+    # rows (dict, sudah dinormalisasi) -> {bulan partisi: rows}
+    hasil = {}
+    for row in rows:
+        tanggal = row.get("Tanggal")
+        if type(tanggal) is str and _POLA_BULAN.match(tanggal):
+            bulan = tanggal[:7]
+        else:
+            bulan = _bulan(tanggal) or PARTISI_LAIN
+        hasil.setdefault(bulan, []).append(row)
+    return hasil
+
+def _daftar_partisi(base_filename, username, bulan):
+    # Tambahkan bulan baru ke manifest (sebelum partisinya ditulis)
+    if set(bulan) <= set(_baca_manifest(base_filename, username) or []):
+        return
+    with _kunci_user(username):
+        lama = _baca_manifest(base_filename, username) or []
+        if not set(bulan) <= set(lama):
+            _tulis_manifest(base_filename, username, set(lama) | set(bulan))
+
+def _hapus_partisi(base_filename, username, bulan):
+    base_bulan = _base_partisi(base_filename, bulan)
+    filename = get_user_file(base_bulan, username)
+    for path in (filename, _index_file(base_bulan, username), _tombstone_file(base_bulan, username),
+                 _kolom_file(base_bulan, username)):
+        _hapus_file(path)
+    _index_cache.pop(_index_file(base_bulan, username), None)
+    _append_state.pop(filename, None)
+    _cache_drop_locked((username, base_bulan))
+
+def _tulis_partisi(df, base_filename, username):
+    # save_data untuk tabel berpartisi: df dibagi per bulan, partisi yang
+    # tidak ada lagi di df dihapus. Manifest ditulis sesudah semua partisi.
+    with _kunci_user(username):
+        lama = set(_baca_manifest(base_filename, username) or [])
+        if "Tanggal" in df.columns:
+            kunci = _kunci_bulan(df["Tanggal"])
+        else:
+            kunci = pd.Series(PARTISI_LAIN, index=df.index)
+        for bulan, bagian in df.groupby(kunci, sort=False):
+            save_data(bagian, _base_partisi(base_filename, bulan), username)
+        bulan = set(kunci)
+        _tulis_manifest(base_filename, username, bulan)
+        for b in lama - bulan:
+            _hapus_partisi(base_filename, username, b)
+        if base_filename == "jurnal.csv":
+            _hapus_snapshot(username)
+        if base_filename in ROLLUP_TABEL:
+            _hapus_rollup(username)
+
+def _gabung(potongan):
+    # pd.concat hasil per partisi; kategori disatukan dulu supaya kolom
+    # Categorical tidak jatuh jadi object
+    potongan = [df for df in potongan if not df.empty] or potongan[:1]
+    if len(potongan) == 1:
+        return potongan[0]
+    for k in potongan[0].columns:
+        if all(k in df.columns and isinstance(df[k].dtype, pd.CategoricalDtype) for df in potongan):
+            kategori = list(dict.fromkeys(v for df in potongan for v in df[k].cat.categories))
+            for df in potongan:
+                df[k] = df[k].cat.set_categories(kategori)
+    return pd.concat(potongan, ignore_index=True)
+
+def _file_dengan_id(base_filename, username, id_transaksi):
+    # File (partisi) yang memuat ID; dicari di index partisi terbaru dulu
+    bagian = _file_tabel(base_filename, username)
+    if len(bagian) == 1:
+        return bagian[0]
+    for b in reversed(bagian):
+        if _index_cari(b, username, id_transaksi) is not None:
+            return b
+    # Index mungkin basi: periksa ulang per baris (bangun ulang index)
+    for b in reversed(bagian):
+        if _baca_baris(b, username, id_transaksi) is not None:
+            return b
+    return None
+
+def pecah_partisi(base_filename, username):
+    # Migrasi file tunggal -> partisi bulanan. Manifest baru ditulis sesudah
+    # semua partisi jadi; sebelum itu file tunggal tetap dipakai, jadi aman
+    # diulang kalau terputus di tengah.
+    with _kunci_user(username):
+        if _baca_manifest(base_filename, username) is not None:
+            return False
+        filename = get_user_file(base_filename, username)
+        try:
+            df = _baca_csv(filename, base_filename, on_bad_lines="skip")
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            df = pd.DataFrame(columns=COLUMNS_MAP[base_filename])
+        dihapus = _baca_tombstone(base_filename, username)
+        if dihapus and "ID" in df.columns:
+            df = df[~df["ID"].isin(dihapus)]
+        _tulis_partisi(df, base_filename, username)
+        for path in (filename, _index_file(base_filename, username), _tombstone_file(base_filename, username),
+                     _kolom_file(base_filename, username)):
+            _hapus_file(path)
+        _index_cache.pop(_index_file(base_filename, username), None)
+        _append_state.pop(filename, None)
+        _cache_drop_locked((username, base_filename))
+        return True
+
+def _berkas_tabel(base_filename):
+    # (nama file, base_filename file, username) untuk semua file tabel di
+    # folder data (semua folder user kalau shard), termasuk partisi
+    nama_tabel = os.path.splitext(base_filename)[0]
+    pola = re.compile(rf"{re.escape(nama_tabel)}(@(?:\d{{4}}-\d{{2}}|{PARTISI_LAIN}))?_(.+)\.csv")
+    for folder in _folder_data():
+        for nama in sorted(os.listdir(folder)):
+            m = pola.fullmatch(nama)
+            if m:
+                yield nama, f"{nama_tabel}{m.group(1) or ''}.csv", m.group(2)
+
+@app.cli.command("partisi-bulanan")
+def partisi_bulanan():
+    # Pecah semua file {pemasukan,pengeluaran,jurnal}_{user}.csv di folder data
+    # jadi partisi bulanan. Aman diulang: tabel yang sudah dipartisi dilewati.
+    for base_filename in COLUMNS_MAP:
+        for nama, base_file, username in list(_berkas_tabel(base_filename)):
+            if base_file != base_filename:
+                continue
+            if pecah_partisi(base_filename, username):
+                bulan = _baca_manifest(base_filename, username)
+                click.echo(f"{nama}: {len(bulan)} partisi -> {os.path.basename(_manifest_file(base_filename, username))}")
+
+# ---------------- Snapshot Saldo per Akun ----------------
+# saldo_{user}.json menyimpan total Debit/Kredit per Akun untuk tiap bulan
+# (checkpoint akhir bulan = jumlah semua bulan sampai bulan itu). Diperbarui
+# setiap kali jurnal di-append (termasuk jurnal pembalikan), jadi saldo s/d
+# tanggal X = checkpoint bulan sebelum X + scan jurnal dari awal bulan X.
+# "versi" = ukuran file jurnal yang tercermin di snapshot; kalau berbeda
+# (mis. file diubah di luar aplikasi) snapshot dibangun ulang dari jurnal.
+
+def _snapshot_file(username):
+    return get_user_file("saldo.json", username)
+
+def _bulan(tanggal):
+    try:
+        ts = pd.Timestamp(tanggal)
+    except (ValueError, TypeError):
+        return None
+    return None if pd.isna(ts) else ts.strftime("%Y-%m")
+
+def _ukuran_jurnal(username):
+    stat = [_stat_file(get_user_file(b, username)) for b in _file_tabel("jurnal.csv", username)]
+    return sum(st[1] for st in stat if st)
+
+def _tulis_snapshot(username, snapshot):
+    # Tanpa fsync: snapshot hanya turunan jurnal, dan yang hilang/basi sesudah
+    # crash (versi != ukuran jurnal) dibangun ulang saat dibaca
+    filename = _snapshot_file(username)
+    _tulis_atomik(filename, lambda f: json.dump(snapshot, f), fsync=False)
+
+def _hapus_snapshot(username):
+    try:
+        os.remove(_snapshot_file(username))
+    except FileNotFoundError:
+        pass
+
+def _bangun_snapshot(username):
+    bulan = {}
+    jurnal_df = load_data("jurnal.csv", username, kolom=["Tanggal", "Akun", "Debit", "Kredit"])
+    if not jurnal_df.empty:
+        jurnal_df["Bulan"] = pd.to_datetime(jurnal_df["Tanggal"], errors='coerce').dt.strftime("%Y-%m")
+        total = jurnal_df.dropna(subset=["Bulan"]).groupby(["Bulan", "Akun"])[["Debit", "Kredit"]].sum()
+        for (bln, akun), row in total.iterrows():
+            bulan.setdefault(bln, {})[akun] = [float(row["Debit"]), float(row["Kredit"])]
+    snapshot = {"versi": _ukuran_jurnal(username), "bulan": bulan}
+    _tulis_snapshot(username, snapshot)
+    return snapshot
+
+def _baca_snapshot(username):
+    try:
+        with open(_snapshot_file(username), encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return _bangun_snapshot(username)
+    if snapshot.get("versi") != _ukuran_jurnal(username):
+        return _bangun_snapshot(username)
+    return snapshot
+
+def _update_snapshot(username, rows, ukuran_awal, ukuran_akhir):
+    try:
+        with open(_snapshot_file(username), encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, ValueError):
+        snapshot = None
+    if snapshot is None or snapshot.get("versi") != ukuran_awal:
+        # Snapshot belum ada / tertinggal: biarkan dibangun ulang saat dibaca
+        _hapus_snapshot(username)
+        return
+    for row in rows:
+        bln = _bulan(row.get("Tanggal"))
+        if bln is None:
+            continue
+        saldo = snapshot["bulan"].setdefault(bln, {}).setdefault(row.get("Akun"), [0.0, 0.0])
+        saldo[0] += float(row.get("Debit") or 0)
+        saldo[1] += float(row.get("Kredit") or 0)
+    snapshot["versi"] = ukuran_akhir
+    _tulis_snapshot(username, snapshot)
+
+def _saldo_dari_snapshot(username, akhir=None):
+    snapshot = _baca_snapshot(username)
+    batas_bulan, delta = None, None
+    if akhir is not None:
+        akhir = pd.Timestamp(akhir)
+        awal_bulan = akhir.normalize().replace(day=1)
+        batas_bulan = awal_bulan.strftime("%Y-%m")
+        if akhir > awal_bulan:
+            delta = load_data("jurnal.csv", username, mulai=awal_bulan, akhir=akhir,
+                              kolom=["Tanggal", "Akun", "Debit", "Kredit"])
+
+    total = {}
+    for bln, per_akun in snapshot["bulan"].items():
+        if batas_bulan is not None and bln >= batas_bulan:
+            continue
+        for akun, (debit, kredit) in per_akun.items():
+            saldo = total.setdefault(akun, [0.0, 0.0])
+            saldo[0] += debit
+            saldo[1] += kredit
+    if delta is not None and not delta.empty:
+        for akun, row in delta.groupby("Akun")[["Debit", "Kredit"]].sum().iterrows():
+            saldo = total.setdefault(akun, [0.0, 0.0])
+            saldo[0] += float(row["Debit"])
+            saldo[1] += float(row["Kredit"])
+
+    return pd.DataFrame(
+        [{"Akun": akun, "Debit": d, "Kredit": k} for akun, (d, k) in total.items()],
+        columns=["Akun", "Debit", "Kredit"],
+    ).set_index("Akun")
+
+# ---------------- Rollup Harian ----------------
+# rollup_{user}.csv berisi total per hari untuk Sumber (pemasukan), Kategori
+# + Sub Kategori (pengeluaran) dan Akun (jurnal). File ini hanya di-append:
+# tiap insert menambah baris delta positif, tiap hapus (tombstone) delta
+# negatif, dan sesekali dipadatkan jadi satu baris per (hari, kunci).
+# Kolom Versi = "ukuran data:ukuran tombstone" tabel itu sesudah perubahan;
+# kalau tidak cocok dengan file sekarang, rollup dibangun ulang dari data.
+# Di memori disimpan total per hari dan per bulan, jadi rollup_rentang cukup
+# menjumlah bulan utuh + hari di tepi rentang (+ baris mentah kalau batas
+# rentang jatuh di tengah hari). Jumlah rupiah bulat hasilnya sama persis
+# dengan menjumlah baris mentah.
+
+ROLLUP_TABEL = {
+    "pemasukan.csv": ("Sumber", None, "Jumlah", None),
+    "pengeluaran.csv": ("Kategori", "Sub Kategori", "Jumlah", None),
+    "jurnal.csv": ("Akun", None, "Debit", "Kredit"),
+}
+ROLLUP_KOLOM = ["Hari", "Tabel", "Kunci", "Sub", "Debit", "Kredit", "Versi"]
+ROLLUP_COMPACT_EVERY = int(os.environ.get("TANIAKUN_ROLLUP_COMPACT_EVERY", "20000"))
+
+_rollup_cache = {}
+
+def _rollup_file(username):
+    return get_user_file("rollup.csv", username)
+
+def _rollup_versi(base_filename, username):
+    # Tabel berpartisi: jumlah ukuran semua partisi
+    data = tomb = 0
+    for b in _file_tabel(base_filename, username):
+        stat_data, stat_tomb = _stat_file(get_user_file(b, username)), _stat_file(_tombstone_file(b, username))
+        data += stat_data[1] if stat_data else 0
+        tomb += stat_tomb[1] if stat_tomb else 0
+    return f"{data}:{tomb}"
+
+def _hari(tanggal):
+    try:
+        ts = pd.Timestamp(tanggal)
+    except (ValueError, TypeError):
+        return None
+    return None if pd.isna(ts) else ts.strftime("%Y-%m-%d")
+
+def _angka(nilai):
+    try:
+        nilai = float(nilai)
+    except (ValueError, TypeError):
+        return 0.0
+    return 0.0 if nilai != nilai else nilai
+
+def _kunci_rollup(nilai):
+    return "" if nilai is None or (isinstance(nilai, float) and nilai != nilai) else str(nilai)
+
+def _rollup_baris(base_filename, rows, tanda):
+    # rows (dict) -> baris rollup [Hari, Tabel, Kunci, Sub, Debit, Kredit]
+    kunci, sub, debit, kredit = ROLLUP_TABEL[base_filename]
+    total = {}
+    for row in rows:
+        hari = _hari(row.get("Tanggal"))
+        if hari is None:
+            continue
+        t = total.setdefault((hari, _kunci_rollup(row.get(kunci)), _kunci_rollup(row.get(sub)) if sub else ""), [0.0, 0.0])
+        t[0] += tanda * _angka(row.get(debit))
+        if kredit:
+            t[1] += tanda * _angka(row.get(kredit))
+    return [[hari, base_filename, k, s, d, kr] for (hari, k, s), (d, kr) in total.items()]
+
+def _rollup_kolom(base_filename):
+    return ["Tanggal"] + [k for k in ROLLUP_TABEL[base_filename] if k]
+
+def _hapus_rollup(username):
+    _hapus_file(_rollup_file(username))
+    _rollup_cache.pop(_rollup_file(username), None)
+
+def _rollup_tambah(entry, hari, kunci, debit, kredit):
+    for tingkat, waktu in (("hari", hari), ("bulan", hari[:7])):
+        per_kunci = entry[tingkat].setdefault(waktu, {})
+        t = per_kunci.get(kunci)
+        if t is None:
+            t = per_kunci[kunci] = [0.0, 0.0]
+            if tingkat == "hari":
+                entry["kunci"] += 1
+        t[0] += debit
+        t[1] += kredit
+
+def _rollup_muat(username):
+    # Isi rollup di memori; hanya baris yang baru di-append yang dibaca
+    filename = _rollup_file(username)
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    entry = _rollup_cache.get(filename)
+    if entry is None or entry["ino"] != st.st_ino or st.st_size < entry["pos"]:
+        entry = _rollup_cache[filename] = {"ino": st.st_ino, "pos": 0, "hari": {}, "bulan": {},
+                                           "versi": {}, "baris": 0, "kunci": 0}
+    if st.st_size > entry["pos"]:
+        with open(filename, "rb") as f:
+            f.seek(entry["pos"])
+            tambahan = f.read(st.st_size - entry["pos"])
+        utuh = tambahan.rfind(b"\n") + 1
+        for row in csv.reader(io.StringIO(tambahan[:utuh].decode("utf-8"), newline="")):
+            if len(row) != len(ROLLUP_KOLOM) or row == ROLLUP_KOLOM:
+                continue
+            hari, tabel, kunci, sub, debit, kredit, versi = row
+            entry["versi"][tabel] = versi
+            entry["baris"] += 1
+            if hari:
+                _rollup_tambah(entry, hari, (tabel, kunci, sub), float(debit), float(kredit))
+        entry["pos"] += utuh
+    return entry
+
+def _rollup_tulis(username, baris, versi):
+    def tulis(f):
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(ROLLUP_KOLOM)
+        for row in baris:
+            writer.writerow(list(row) + [versi[row[1]]])
+        for tabel in ROLLUP_TABEL:
+            writer.writerow(["", tabel, "", "", 0, 0, versi[tabel]])
+    _tulis_atomik(_rollup_file(username), tulis)
+    _rollup_cache.pop(_rollup_file(username), None)
+    return _rollup_muat(username)
+
+def _bangun_rollup(username):
+    baris, versi = [], {}
+    for base_filename, (kunci, sub, debit, kredit) in ROLLUP_TABEL.items():
+        versi[base_filename] = _rollup_versi(base_filename, username)
+        df = load_data(base_filename, username, kolom=_rollup_kolom(base_filename))
+        if df.empty:
+            continue
+        df = pd.DataFrame({
+            "Hari": pd.to_datetime(df["Tanggal"], errors='coerce').dt.strftime("%Y-%m-%d"),
+            "Kunci": df[kunci].astype(object).where(df[kunci].notna(), "").astype(str),
+            "Sub": df[sub].astype(object).where(df[sub].notna(), "").astype(str) if sub else "",
+            "Debit": pd.to_numeric(df[debit], errors='coerce'),
+            "Kredit": pd.to_numeric(df[kredit], errors='coerce') if kredit else 0.0,
+        }).dropna(subset=["Hari"])
+        total = df.groupby(["Hari", "Kunci", "Sub"], sort=False)[["Debit", "Kredit"]].sum()
+        baris.extend([hari, base_filename, k, s, float(d), float(kr)]
+                     for (hari, k, s), (d, kr) in zip(total.index, total.to_numpy()))
+    return _rollup_tulis(username, baris, versi)
+
+def _padatkan_rollup(username, entry):
+    baris = [[hari, tabel, k, s, d, kr]
+             for hari, per_kunci in entry["hari"].items()
+             for (tabel, k, s), (d, kr) in per_kunci.items() if d or kr]
+    return _rollup_tulis(username, baris, dict(entry["versi"]))
+
+def _rollup_append(username, base_filename, rows, tanda, versi_awal):
+    # Dipanggil di bawah kunci user sesudah data / tombstone ditulis
+    if base_filename not in ROLLUP_TABEL:
+        return
+    entry = _rollup_muat(username)
+    if entry is None:
+        return  # belum pernah dibangun: dibangun saat pertama dibaca
+    if entry["versi"].get(base_filename) != versi_awal:
+        _hapus_rollup(username)
+        return
+    versi = _rollup_versi(base_filename, username)
+    baris = _rollup_baris(base_filename, rows, tanda) or [["", base_filename, "", "", 0, 0]]
+    with open(_rollup_file(username), "a", newline="", encoding="utf-8") as f:
+        f.write("".join(_csv_baris(row + [versi]) for row in baris))
+
+def _rollup_csv(username, mulai, akhir):
+    mulai, akhir = pd.Timestamp(mulai), pd.Timestamp(akhir)
+    hari_awal, hari_akhir = mulai.ceil("D"), akhir.floor("D")
+    total = {}
+
+    def tambah(per_kunci):
+        for kunci, (debit, kredit) in per_kunci.items():
+            t = total.setdefault(kunci, [0.0, 0.0])
+            t[0] += debit
+            t[1] += kredit
+
+    def mentah(dari, sampai):
+        # Sisa hari yang tidak utuh: jumlahkan baris mentahnya
+        for base_filename in ROLLUP_TABEL:
+            df = load_data(base_filename, username, mulai=dari, akhir=sampai, kolom=_rollup_kolom(base_filename))
+            if not df.empty:
+                tambah({(tabel, k, s): [d, kr] for _, tabel, k, s, d, kr in
+                        _rollup_baris(base_filename, df.to_dict("records"), 1)})
+
+    if hari_awal >= hari_akhir:
+        mentah(mulai, akhir)
+        return total
+    with _kunci_user(username):
+        entry = _rollup_muat(username)
+        if entry is None or any(entry["versi"].get(t) != _rollup_versi(t, username) for t in ROLLUP_TABEL):
+            entry = _bangun_rollup(username)
+        elif entry["baris"] - entry["kunci"] > ROLLUP_COMPACT_EVERY:
+            entry = _padatkan_rollup(username, entry)
+
+        bulan_awal = hari_awal if hari_awal.day == 1 else hari_awal + pd.offsets.MonthBegin(1)
+        bulan_akhir = hari_akhir.replace(day=1)
+        if bulan_awal < bulan_akhir:
+            for bln in pd.period_range(bulan_awal, bulan_akhir - pd.Timedelta(days=1), freq="M"):
+                tambah(entry["bulan"].get(str(bln), {}))
+            tepi = [(hari_awal, bulan_awal), (bulan_akhir, hari_akhir)]
+        else:
+            tepi = [(hari_awal, hari_akhir)]
+        for dari, sampai in tepi:
+            if dari >= sampai:
+                continue  # date_range(x, x, inclusive="left") tetap berisi x
+            for hari in pd.date_range(dari, sampai, inclusive="left"):
+                tambah(entry["hari"].get(hari.strftime("%Y-%m-%d"), {}))
+    if mulai < hari_awal:
+        mentah(mulai, hari_awal)
+    if hari_akhir < akhir:
+        mentah(hari_akhir, akhir)
+    return total
+
+def buat_jurnal(tanggal, akun_debit, akun_kredit, jumlah, keterangan, id_transaksi=None):
+    # ID jurnal diturunkan dari ID transaksi asal supaya bisa ditelusuri
+    id_transaksi = id_transaksi or buat_id()
+    return [
+        {"Tanggal": tanggal, "Akun": akun_debit, "Debit": jumlah, "Kredit": 0, "Keterangan": keterangan, "ID": f"{id_transaksi}-D"},
+        {"Tanggal": tanggal, "Akun": akun_kredit, "Debit": 0, "Kredit": jumlah, "Keterangan": keterangan, "ID": f"{id_transaksi}-K"},
+    ]
+
+# ---------------- Hash Password ----------------
+# Password disimpan sebagai "scrypt$n$r$p$salt$hash" (salt acak per user).
+# scrypt sengaja mahal (CPU + memori), jadi dijalankan di process pool
+# berukuran KDF_WORKERS supaya lonjakan login tidak menahan thread/worker
+# yang melayani rute lain; KDF_WORKERS=0 = hitung langsung di thread request.
+# Pool yang rusak (worker mati, mis. kena OOM killer) diganti pool baru dan
+# hash-nya diulang sekali. Entri lama (SHA-256 polos, 64 hex) tetap diterima
+# dan di-hash ulang otomatis saat login berhasil, begitu juga entri dengan
+# biaya KDF lama.
+
+KDF_N = int(os.environ.get("TANIAKUN_KDF_N", str(2 ** 14)))
+KDF_R = int(os.environ.get("TANIAKUN_KDF_R", "8"))
+KDF_P = int(os.environ.get("TANIAKUN_KDF_P", "1"))
+KDF_WORKERS = int(os.environ.get("TANIAKUN_KDF_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+_kdf_lock = threading.Lock()
+_kdf_pool = None
+_kdf_slot = None
+
+def _kdf_pool_aktif(rusak=None):
+    # Pool KDF sekarang; dibuat kalau belum ada, atau diganti kalau masih
+    # berupa `rusak` (request lain mungkin sudah menggantinya lebih dulu)
+    global _kdf_pool, _kdf_slot
+    with _kdf_lock:
+        if _kdf_pool is None or _kdf_pool is rusak:
+            if rusak is not None:
+                rusak.shutdown(wait=False, cancel_futures=True)
+            # spawn: proses anak tidak ikut menyalin thread/kunci aplikasi
+            _kdf_pool = ProcessPoolExecutor(KDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        if _kdf_slot is None:
+            _kdf_slot = threading.BoundedSemaphore(KDF_WORKERS * 4)
+        return _kdf_pool
+
+def _kdf(password, salt, n, r, p):
+    kwargs = dict(salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 2 ** 20, dklen=32)
+    if not KDF_WORKERS:
+        return hashlib.scrypt(password.encode(), **kwargs).hex()
+    pool = _kdf_pool_aktif()
+    # Antrean dibatasi: request login ke-(4 x worker) berikutnya menunggu di sini
+    with _kdf_slot:
+        for percobaan in range(2):
+            try:
+                return pool.submit(hashlib.scrypt, password.encode(), **kwargs).result().hex()
+            except BrokenProcessPool:
+                if percobaan:
+                    raise
+                pool = _kdf_pool_aktif(rusak=pool)
+
+def _sha256_lama(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def hash_password(password):
+    salt = os.urandom(16)
+    return f"scrypt${KDF_N}${KDF_R}${KDF_P}${salt.hex()}${_kdf(password, salt, KDF_N, KDF_R, KDF_P)}"
+
+def cek_password(password, tersimpan):
+    # Hasil: (cocok, perlu_hash_ulang)
+    if not tersimpan:
+        return False, False
+    if not tersimpan.startswith("scrypt$"):
+        return hmac.compare_digest(_sha256_lama(password), tersimpan), True
+    try:
+        _, n, r, p, salt, hasil = tersimpan.split("$")
+        n, r, p, salt = int(n), int(r), int(p), bytes.fromhex(salt)
+    except ValueError:
+        return False, False
+    cocok = hmac.compare_digest(_kdf(password, salt, n, r, p), hasil)
+    return cocok, (n, r, p) != (KDF_N, KDF_R, KDF_P)
+
+# ---------------- Akun Pengguna ----------------
+# akun.csv hanya di-append saat registrasi. Isinya dicerminkan ke dict
+# username -> hash password (_akun_index) supaya login O(1). Index dibaca
+# penuh sekali, lalu hanya bagian yang baru di-append; kalau file diganti
+# (inode berubah / mengecil, mis. save_user_accounts) dibaca ulang penuh.
+# Username yang muncul lebih dari sekali: baris terakhir yang berlaku
+# (dipakai saat hash password diperbarui).
+
+_akun_lock = threading.Lock()
+_akun_index = {"file": None, "ino": None, "pos": 0, "header": None, "map": {}}
+
+def _akun_file():
+    return os.path.join(_data_dir(), "akun.csv")
+
+def _akun_refresh():
+    akun_file = _akun_file()
+    with _akun_lock:
+        try:
+            st = os.stat(akun_file)
+        except FileNotFoundError:
+            _akun_index.update(file=akun_file, ino=None, pos=0, header=None, map={})
+            return _akun_index["map"]
+        if (_akun_index["file"] != akun_file or _akun_index["ino"] != st.st_ino
+                or st.st_size < _akun_index["pos"]):
+            _akun_index.update(file=akun_file, ino=st.st_ino, pos=0, header=None, map={})
+        if st.st_size > _akun_index["pos"]:
+            with open(akun_file, "rb") as f:
+                f.seek(_akun_index["pos"])
+                tambahan = f.read(st.st_size - _akun_index["pos"])
+            utuh = tambahan.rfind(b"\n") + 1
+            baris = csv.reader(io.StringIO(tambahan[:utuh].decode("utf-8"), newline=""))
+            for row in baris:
+                if not row:
+                    continue
+                if _akun_index["header"] is None:
+                    _akun_index["header"] = row
+                    continue
+                row = dict(zip(_akun_index["header"], row))
+                _akun_index["map"][row.get("Username", "")] = row.get("Password", "")
+            _akun_index["pos"] += utuh
+        return _akun_index["map"]
+
+def load_user_accounts():
+    akun_file = _akun_file()
+    if os.path.exists(akun_file):
+        try:
+            return pd.read_csv(akun_file)
+        except pd.errors.EmptyDataError:
+             return pd.DataFrame(columns=["Username", "Password"])
+    else:
+        return pd.DataFrame(columns=["Username", "Password"])
+
+def save_user_accounts(df):
+    _tulis_atomik(_akun_file(), lambda f: df.to_csv(f, index=False))
+
+def register_user(username, password):
+    # Cek-lalu-append di bawah kunci supaya dua worker tidak mendaftarkan
+    # username yang sama; file tidak pernah ditulis ulang penuh. Hash
+    # dihitung di luar kunci (mahal), jadi username dicek ulang di dalamnya.
+    if username in _akun_refresh():
+        return False
+    hashed = hash_password(password)
+    with _kunci_path(os.path.join(_data_dir(), "akun.lock")):
+        if username in _akun_refresh():
+            return False
+        _akun_append(username, hashed)
+        return True
+
+def _akun_append(username, hashed):
+    teks = _csv_baris([username, hashed])
+    with open(_akun_file(), "a+b") as f:
+        if f.tell() == 0:
+            teks = _csv_baris(["Username", "Password"]) + teks
+        elif not _ends_with_newline(f):
+            teks = "\n" + teks
+        f.write(teks.encode("utf-8"))
+    _akun_refresh()
+
+def validate_login(username, password):
+    tersimpan = _akun_refresh().get(username)
+    cocok, perlu_ulang = cek_password(password, tersimpan)
+    if cocok and perlu_ulang:
+        hashed = hash_password(password)
+        with _kunci_path(os.path.join(_data_dir(), "akun.lock")):
+            # Lewati kalau entri sudah diganti request lain sementara itu
+            if _akun_refresh().get(username) == tersimpan:
+                _akun_append(username, hashed)
+    return cocok
+
+_akun_refresh()  # hangatkan index saat aplikasi dimuat
+
+@diukur("hapus")
+def _jurnal_pembalikan(transaksi_type, transaksi):
+    waktu_hapus = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    keterangan_batal = f"Pembatalan: {transaksi.get('Keterangan') or ''}"
+    # Nominal lama ber-sen dibulatkan seperti saat dibaca, supaya pembaliknya
+    # sama dengan jumlah yang tampil di laporan
+    jumlah_transaksi = int(np.floor(float(transaksi['Jumlah']) + 0.5))
+    metode_transaksi = transaksi['Metode']
+    id_batal = f"{transaksi['ID']}-B"
+
+    if transaksi_type == "pemasukan":
+        if metode_transaksi == "Pelunasan Piutang":
+            return buat_jurnal(waktu_hapus, "Piutang Dagang", "Kas", jumlah_transaksi, keterangan_batal, id_batal)
+        akun_debit = {"Tunai": "Kas", "Transfer": "Bank", "Piutang": "Piutang Dagang"}.get(metode_transaksi, "Kas")
+        return buat_jurnal(waktu_hapus, "Pendapatan", akun_debit, jumlah_transaksi, keterangan_batal, id_batal)
+
+    if metode_transaksi == "Pelunasan Utang":
+        return buat_jurnal(waktu_hapus, "Kas", "Utang Dagang", jumlah_transaksi, keterangan_batal, id_batal)
+    akun_kredit = {"Tunai": "Kas", "Transfer": "Bank", "Utang": "Utang Dagang"}.get(metode_transaksi, "Kas")
+    sub_kategori = transaksi.get('Sub Kategori') or 'Beban Lain'
+    return buat_jurnal(waktu_hapus, akun_kredit, sub_kategori, jumlah_transaksi, keterangan_batal, id_batal)
+
+def hapus_transaksi(transaksi_type, id_transaksi, username):
+    # Tombstone + jurnal pembalik ditulis bersama (lihat _tandai_hapus): kalau
+    # pembaliknya tidak bisa dibuat/ditulis, transaksi tidak jadi dihapus.
+    if transaksi_type not in ("pemasukan", "pengeluaran"):
+        return False
+    try:
+        transaksi = _tandai_hapus(f"{transaksi_type}.csv", username, str(id_transaksi),
+                                  pembalikan=lambda t: _jurnal_pembalikan(transaksi_type, t))
+    except (ValueError, TypeError, KeyError):
+        app.logger.exception("Gagal menghapus %s %s", transaksi_type, id_transaksi)
+        return False
+    return transaksi is not None
+
+def simpan_pemasukan(username, waktu, sumber, jumlah, metode, deskripsi=""):
+    # Simpan pemasukan + pasangan jurnalnya (dipakai form dan API). Hasil: baris yang disimpan
+    data = {
+        "Tanggal": waktu, "Sumber": sumber, "Jumlah": jumlah,
+        "Metode": metode, "Keterangan": deskripsi, "Username": username,
+        "ID": buat_id()
+    }
+    append_data(data, "pemasukan.csv", username)
+
+    akun_debit = {"Tunai": "Kas", "Transfer": "Bank", "Piutang": "Piutang Dagang", "Pelunasan Piutang": "Kas"}.get(metode, "Kas")
+    akun_kredit = "Pendapatan" if metode != "Pelunasan Piutang" else "Piutang Dagang"
+
+    jurnal = buat_jurnal(waktu, akun_debit, akun_kredit, jumlah, f"{sumber} - {deskripsi}", data["ID"])
+    append_data(jurnal, "jurnal.csv", username)
+    return data
+
+def simpan_pengeluaran(username, waktu, kategori, sub_kategori, jumlah, metode, deskripsi=""):
+    data = {
+        "Tanggal": waktu, "Kategori": kategori, "Sub Kategori": sub_kategori,
+        "Jumlah": jumlah, "Keterangan": deskripsi, "Metode": metode, "Username": username,
+        "ID": buat_id()
+    }
+    append_data(data, "pengeluaran.csv", username)
+
+    akun_kredit = {"Tunai": "Kas", "Transfer": "Bank", "Utang": "Utang Dagang", "Pelunasan Utang": "Kas"}.get(metode, "Kas")
+    akun_debit = sub_kategori if metode != "Pelunasan Utang" else "Utang Dagang"
+
+    jurnal = buat_jurnal(waktu, akun_debit, akun_kredit, jumlah, f"{kategori} - {deskripsi}", data["ID"])
+    append_data(jurnal, "jurnal.csv", username)
+    return data
+
+
+@diukur("buku_besar")
+def buat_buku_besar(jurnal_df, saldo_awal=None, mulai=None):
+    # Buku besar semua akun sekaligus: urutkan sekali per (Akun, Tanggal),
+    # lalu Saldo = saldo awal + cumsum(Debit - Kredit) per Akun.
+    # saldo_awal: Series Akun -> saldo (Debit - Kredit) sebelum `mulai`.
+    if jurnal_df.empty:
+        return {}
+    df = jurnal_df
+    if isinstance(df["Akun"].dtype, pd.CategoricalDtype):
+        # Urutan kategori registry bukan alfabetis: urutkan kategorinya dulu
+        akun = df["Akun"].cat.remove_unused_categories()
+        df = df.assign(Akun=akun.cat.reorder_categories(sorted(akun.cat.categories)))
+    if saldo_awal is not None:
+        saldo_awal = saldo_awal[saldo_awal.index.isin(df["Akun"].unique()) & (saldo_awal != 0)]
+        if not saldo_awal.empty:
+            pembuka = pd.DataFrame({
+                "Tanggal": mulai if mulai is not None else df["Tanggal"].min(),
+                "Akun": saldo_awal.index,
+                "Debit": 0,
+                "Kredit": 0,
+                "Keterangan": "Saldo Awal",
+            })
+            df = pd.concat([pembuka, df], ignore_index=True)
+    df = df.sort_values(["Akun", "Tanggal"], kind="stable")
+    df["Saldo"] = (df["Debit"] - df["Kredit"]).groupby(df["Akun"]).cumsum()
+    if saldo_awal is not None and not saldo_awal.empty:
+        df["Saldo"] += df["Akun"].astype(object).map(saldo_awal).fillna(0).astype(float)
+    return {akun: data for akun, data in df.groupby("Akun", sort=True)}
+
+LAPORAN_BAGIAN = ("ringkasan", "laba_rugi", "neraca", "jurnal", "buku_besar")
+
+@diukur("laporan")
+def hitung_laporan(username, mulai, akhir, bagian=LAPORAN_BAGIAN):
+    # Bagian-bagian Laporan untuk Tanggal di [mulai, akhir) (dipakai halaman
+    # Laporan dan API). Hanya bagian yang diminta yang dihitung; jurnal dan
+    # buku_besar satu-satunya yang perlu memuat baris jurnal.
+    hasil = {}
+    if "ringkasan" in bagian or "laba_rugi" in bagian:
+        # Ringkasan & Laba Rugi dari rollup harian, tanpa scan baris mentah
+        rollup = rollup_rentang(username, mulai, akhir)
+        hasil["ringkasan"] = {
+            "total_pemasukan": sum(d for (tabel, _, _), (d, _) in rollup.items() if tabel == "pemasukan.csv"),
+            "total_pengeluaran": sum(d for (tabel, _, _), (d, _) in rollup.items() if tabel == "pengeluaran.csv"),
+        }
+        pendapatan = sum(k for (tabel, akun, _), (_, k) in rollup.items()
+                         if tabel == "jurnal.csv" and kelas_akun(akun) == KELAS_AKUN.index("pendapatan"))
+        beban = sum(d for (tabel, akun, _), (d, _) in rollup.items()
+                    if tabel == "jurnal.csv" and kelas_akun(akun) == KELAS_AKUN.index("beban"))
+        hasil["laba_rugi"] = {"pendapatan": pendapatan, "beban": beban, "laba_rugi": pendapatan - beban}
+
+    if "neraca" in bagian:
+        saldo = saldo_per_akun(username, akhir=akhir)
+        aktiva, kewajiban, ekuitas = 0, 0, 0
+        if not saldo.empty:
+            per_kelas = saldo.groupby(kode_kelas(saldo.index))[["Debit", "Kredit"]].sum()
+            per_kelas = per_kelas.reindex(range(len(KELAS_AKUN)), fill_value=0)
+            per_kelas.index = KELAS_AKUN
+
+            aktiva = float(per_kelas.loc["aktiva", "Debit"] - per_kelas.loc["aktiva", "Kredit"])
+            kewajiban = float(per_kelas.loc["kewajiban", "Kredit"] - per_kelas.loc["kewajiban", "Debit"])
+            ekuitas = float(per_kelas.loc["pendapatan", "Kredit"] - per_kelas.loc["beban", "Debit"])
+        hasil["neraca"] = {"aktiva": aktiva, "kewajiban": kewajiban, "ekuitas": ekuitas}
+
+    if "jurnal" in bagian or "buku_besar" in bagian:
+        # Load jurnal (hanya baris dalam rentang filter)
+        jurnal_df = load_data("jurnal.csv", username, mulai=mulai, akhir=akhir, kolom=COLUMNS_MAP["jurnal.csv"])
+        jurnal_df_f = jurnal_df[(jurnal_df['Tanggal'] >= mulai) & (jurnal_df['Tanggal'] < akhir)] if not jurnal_df.empty else pd.DataFrame(columns=jurnal_df.columns)
+        if "jurnal" in bagian:
+            hasil["jurnal"] = jurnal_df_f.sort_values(by="Tanggal") if not jurnal_df_f.empty else pd.DataFrame()
+        if "buku_besar" in bagian:
+            saldo_awal = saldo_per_akun(username, akhir=mulai)
+            hasil["buku_besar"] = buat_buku_besar(jurnal_df_f, saldo_awal=saldo_awal["Debit"] - saldo_awal["Kredit"], mulai=mulai)
+    return hasil
+
+# ---------------- Laporan Streaming ----------------
+# Dengan LAPORAN_STREAM=1 halaman Laporan dikirim bertahap: layout, filter,
+# Ringkasan dan Laba Rugi (dari rollup) dulu, lalu Neraca, Jurnal Umum dan
+# Buku Besar yang baru dihitung saat template sampai di bagiannya. Baris
+# tabel dirender satu per satu oleh Jinja dan dikumpulkan per LAPORAN_CHUNK
+# karakter, jadi HTML lengkap tidak pernah ada di memori.
+# Default tetap antrean job (LAPORAN_STREAM=0): job menghitung di luar
+# thread request, menggabungkan permintaan yang sama dan menyimpan hasilnya
+# sampai data berubah. Mode streaming melewati antrean itu: tiap request
+# menghitung sendiri di thread request-nya, sebagai ganti byte pertama yang
+# cepat dan memori yang kecil. Pilih streaming kalau laporannya panjang dan
+# proxy di depan tidak menahan respon (header X-Accel-Buffering ikut dikirim).
+# Kalau gagal di tengah jalan status 200 sudah terkirim, jadi kesalahannya
+# ditulis sebagai penanda di akhir halaman.
+
+LAPORAN_STREAM = os.environ.get("TANIAKUN_LAPORAN_STREAM", "0") == "1"
+LAPORAN_CHUNK = int(os.environ.get("TANIAKUN_LAPORAN_CHUNK", "65536"))
+LAPORAN_KIRIM = "<!-- kirim -->"  # penanda di template: kirim yang sudah ada sekarang
+LAPORAN_GAGAL = ('<div id="laporan-gagal" class="mt-6 p-4 rounded-lg border border-red-200 bg-red-50 '
+                 'text-sm text-red-700">Laporan gagal dibuat lengkap ({}). Muat ulang halaman untuk mencoba lagi.</div>')
+
+def _bagian_malas(username, mulai, akhir):
+    # bagian(nama) untuk template laporan; dihitung saat pertama diminta
+    hasil = {}
+    def bagian(nama):
+        if nama not in hasil:
+            perlu = ("jurnal", "buku_besar") if nama in ("jurnal", "buku_besar") else (nama,)
+            hasil.update(hitung_laporan(username, mulai, akhir, bagian=perlu))
+        return hasil[nama]
+    return bagian
+
+def _alirkan(potongan, ukuran=None):
+    # Potongan kecil dari template.generate digabung jadi blok sekitar
+    # `ukuran` karakter; blok dikirim lebih awal di setiap LAPORAN_KIRIM
+    ukuran = ukuran or LAPORAN_CHUNK
+    buffer, n = [], 0
+    try:
+        for teks in potongan:
+            buffer.append(teks)
+            n += len(teks)
+            if n >= ukuran or LAPORAN_KIRIM in teks:
+                yield "".join(buffer)
+                buffer, n = [], 0
+    except Exception as e:
+        app.logger.exception("Laporan streaming gagal")
+        buffer.append(LAPORAN_GAGAL.format(escape(repr(e))))
+    if buffer:
+        yield "".join(buffer)
+
+# ---------------- Export Streaming ----------------
+# iter_data membaca data per potongan (EXPORT_CHUNK baris) langsung dari
+# file/database, tidak lewat cache, jadi memori tetap konstan berapa pun
+# panjang jurnalnya. File CSV hanya dibaca sampai ukurannya saat export
+# dimulai; append yang datang sesudahnya tidak ikut (dan tidak terpotong).
+
+EXPORT_CHUNK = int(os.environ.get("TANIAKUN_EXPORT_CHUNK", "20000"))
+
+class _FileTerbatas(io.RawIOBase):
+    def __init__(self, f, batas):
+        self.f, self.sisa = f, batas
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.f.readinto(memoryview(buffer)[:min(len(buffer), self.sisa)])
+        self.sisa -= n
+        return n
+
+def _filter_potongan(df, mulai, akhir, akun):
+    mask = pd.Series(True, index=df.index)
+    if mulai is not None or akhir is not None:
+        tanggal = _parse_tanggal(df["Tanggal"])
+        if mulai is not None:
+            mask &= tanggal >= pd.Timestamp(mulai)
+        if akhir is not None:
+            mask &= tanggal < pd.Timestamp(akhir)
+    if akun is not None:
+        mask &= df["Akun"].isin([akun] if isinstance(akun, str) else list(akun))
+    return df[mask]
+
+def iter_data(base_filename, username, mulai=None, akhir=None, akun=None, ukuran=None):
+    # Seperti load_data, tapi menghasilkan DataFrame per potongan
+    ukuran = ukuran or EXPORT_CHUNK
+    if STORAGE_BACKEND == "sqlite":
+        yield from _sqlite_iter(base_filename, username, mulai, akhir, akun, ukuran)
+        return
+    for b in _file_tabel(base_filename, username, mulai, akhir):
+        yield from _iter_file(b, username, mulai, akhir, akun, ukuran)
+
+def _iter_file(base_filename, username, mulai, akhir, akun, ukuran):
+    filename = get_user_file(base_filename, username)
+    with _kunci_user(username):
+        try:
+            f = open(filename, "rb")
+        except FileNotFoundError:
+            return
+        batas = os.fstat(f.fileno()).st_size
+        dihapus = set(_baca_tombstone(base_filename, username))
+    with f:
+        if batas == 0:
+            return
+        teks = io.TextIOWrapper(io.BufferedReader(_FileTerbatas(f, batas)), encoding="utf-8", newline="")
+        for df in pd.read_csv(teks, chunksize=ukuran):
+            if dihapus and "ID" in df.columns:
+                df = df[~df["ID"].astype(str).isin(dihapus)]
+            df = _filter_potongan(df, mulai, akhir, akun)
+            if not df.empty:
+                yield df
+
+def _sqlite_iter(base_filename, username, mulai, akhir, akun, ukuran):
+    _sqlite_conn()  # pastikan tabel ada
+    kolom = COLUMNS_MAP[base_filename]
+    where, params = ['"Username" = ?'], [username]
+    if akun is not None:
+        akun = [akun] if isinstance(akun, str) else list(akun)
+        where.append(f'"Akun" IN ({", ".join("?" * len(akun))})')
+        params.extend(akun)
+    if mulai is not None:
+        where.append('"Tanggal" >= ?')
+        params.append(_format_waktu(mulai))
+    if akhir is not None:
+        where.append('"Tanggal" < ?')
+        params.append(_format_waktu(akhir))
+    # Koneksi sendiri: generator bisa hidup lebih lama dari request
+    conn = sqlite3.connect(SQLITE_PATH, timeout=30)
+    try:
+        cursor = conn.execute(f'SELECT {_sqlite_kolom(kolom)} FROM "{_sqlite_table(base_filename)}" '
+                              f'WHERE {" AND ".join(where)} ORDER BY rowid', params)
+        while True:
+            rows = cursor.fetchmany(ukuran)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=kolom)
+    finally:
+        conn.close()
+
+def export_csv(jenis, username, mulai=None, akhir=None):
+    # Generator teks CSV untuk /export/<jenis>
+    if jenis == "buku_besar":
+        yield from _export_buku_besar(username, mulai, akhir)
+        return
+    base_filename = f"{jenis}.csv"
+    kolom = COLUMNS_MAP[base_filename]
+    yield _csv_baris(kolom)
+    for df in iter_data(base_filename, username, mulai, akhir):
+        yield df.reindex(columns=kolom).to_csv(index=False, header=False, lineterminator="\n")
+
+def _export_buku_besar(username, mulai, akhir):
+    # Urutan dan Saldo sama dengan buat_buku_besar (per Akun, lalu Tanggal),
+    # dengan memori tetap: jurnal dalam rentang dibaca sekali per potongan
+    # ke SQLite sementara, lalu dibaca kembali ORDER BY Akun, Tanggal per
+    # potongan sambil menjumlah Saldo berjalan tiap akun. Baris "Saldo Awal"
+    # suatu akun mendahului baris bertanggal sama.
+    kolom = ["Tanggal", "Akun", "Keterangan", "Debit", "Kredit", "Saldo"]
+    yield _csv_baris(kolom)
+    saldo_awal = {}
+    if mulai is not None:
+        saldo = saldo_per_akun(username, akhir=mulai)
+        saldo_awal = _parse_rupiah(saldo["Debit"] - saldo["Kredit"]).to_dict()
+    path = f"{get_user_file('buku_besar.db', username)}.{buat_id()}.tmp"
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute('CREATE TABLE "baris" ("Urut" INTEGER PRIMARY KEY, "Jenis" INTEGER, "Tanggal" TEXT, '
+                     '"Akun" TEXT, "Keterangan" TEXT, "Debit" INTEGER, "Kredit" INTEGER)')
+        sisip = ('INSERT INTO "baris" ("Jenis", "Tanggal", "Akun", "Keterangan", "Debit", "Kredit") '
+                 'VALUES (?, ?, ?, ?, ?, ?)')
+        ada = set()
+        for df in iter_data("jurnal.csv", username, mulai, akhir):
+            df = df[df["Akun"].notna()]
+            if df.empty:
+                continue
+            akun = df["Akun"].astype(str)
+            ada.update(akun.unique())
+            tanggal = _parse_tanggal(df["Tanggal"])
+            tanggal = tanggal.dt.strftime(FORMAT_TANGGAL).astype(object).where(tanggal.notna(), None)
+            keterangan = df["Keterangan"].astype(object).where(df["Keterangan"].notna(), None)
+            conn.executemany(sisip, zip([1] * len(df), tanggal, akun, keterangan,
+                                        _parse_rupiah(df["Debit"]).tolist(), _parse_rupiah(df["Kredit"]).tolist()))
+        if mulai is not None:
+            conn.executemany(sisip, [(0, _format_waktu(mulai), a, "Saldo Awal", 0, 0)
+                                     for a in sorted(ada) if saldo_awal.get(a)])
+        cur = conn.execute('SELECT "Tanggal", "Akun", "Keterangan", "Debit", "Kredit" FROM "baris" '
+                           'ORDER BY "Akun", "Tanggal" IS NULL, "Tanggal", "Jenis", "Urut"')
+        berjalan = {}
+        while True:
+            potongan = cur.fetchmany(EXPORT_CHUNK)
+            if not potongan:
+                break
+            data = pd.DataFrame(potongan, columns=kolom[:-1])
+            akun = data["Akun"]
+            berjalan.update((a, int(saldo_awal.get(a, 0))) for a in akun.unique() if a not in berjalan)
+            saldo = (data["Debit"] - data["Kredit"]).groupby(akun, sort=False).cumsum() + akun.map(berjalan).astype("int64")
+            berjalan.update(saldo.groupby(akun, sort=False).last().to_dict())
+            yield data.assign(Saldo=saldo).to_csv(index=False, header=False, lineterminator="\n")
+    finally:
+        conn.close()
+        _hapus_file(path)
+
+def _gzip_stream(potongan):
+    kompresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = format gzip
+    for teks in potongan:
+        data = kompresor.compress(teks.encode("utf-8"))
+        if data:
+            yield data
+    yield kompresor.flush()
+
+
+# ---------------- Impor Massal ----------------
+# Upload CSV (mis. mutasi rekening) + pemetaan kolom. Semua baris
+# divalidasi sekaligus (vektor pandas); kalau ada satu saja yang salah,
+# tidak ada yang disimpan dan laporan error per baris ditampilkan. Kalau
+# valid, transaksi dan pasangan jurnalnya ditulis lewat append_bersama.
+
+IMPOR_KOLOM = {
+    "pemasukan": ["Tanggal", "Sumber", "Jumlah", "Metode", "Keterangan"],
+    "pengeluaran": ["Tanggal", "Kategori", "Sub Kategori", "Jumlah", "Metode", "Keterangan"],
+}
+IMPOR_FORMAT_TANGGAL = {"YYYY-MM-DD": "ISO8601", "DD/MM/YYYY": "%d/%m/%Y", "DD-MM-YYYY": "%d-%m-%Y"}
+
+def buat_jurnal_batch(tanggal, akun_debit, akun_kredit, jumlah, keterangan, id_transaksi):
+    # Versi vektor buat_jurnal: array sejajar -> DataFrame pasangan D/K
+    # (baris debit lalu kredit untuk tiap transaksi, seperti buat_jurnal)
+    id_transaksi = pd.Series(np.asarray(id_transaksi, dtype=object))
+    umum = {"Tanggal": np.asarray(tanggal, dtype=object), "Keterangan": np.asarray(keterangan, dtype=object)}
+    jumlah = np.asarray(jumlah, dtype=float)
+    debit = pd.DataFrame(dict(umum, Akun=np.asarray(akun_debit, dtype=object), Debit=jumlah, Kredit=0.0,
+                              ID=(id_transaksi + "-D").to_numpy()))
+    kredit = pd.DataFrame(dict(umum, Akun=np.asarray(akun_kredit, dtype=object), Debit=0.0, Kredit=jumlah,
+                               ID=(id_transaksi + "-K").to_numpy()))
+    jurnal = pd.concat([debit, kredit]).sort_index(kind="stable").reset_index(drop=True)
+    return jurnal[COLUMNS_MAP["jurnal.csv"]]
+
+def _ke_records(df):
+    # Lebih cepat dari to_dict("records") (tanpa boxing per nilai)
+    kolom = list(df.columns)
+    return [dict(zip(kolom, nilai)) for nilai in zip(*(df[k].tolist() for k in kolom))]
+
+def _error_impor(errors, mask, df, kolom, pesan):
+    if mask.any():
+        errors.append(pd.DataFrame({"Baris": df.index[mask] + 2, "Kolom": kolom,
+                                    "Nilai": df.loc[mask, kolom].to_numpy(), "Pesan": pesan}))
+
+@diukur("impor")
+def impor_transaksi(tipe, berkas, pemetaan, username, format_tanggal="YYYY-MM-DD", angka_indonesia=False):
+    # pemetaan: {kolom aplikasi: nama kolom di file}. Hasil: (jumlah baris
+    # tersimpan, DataFrame error dengan kolom Baris/Kolom/Nilai/Pesan).
+    kolom_wajib = [k for k in IMPOR_KOLOM[tipe] if k != "Keterangan"]
+    try:
+        mentah = pd.read_csv(berkas, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        return 0, pd.DataFrame([{"Baris": 0, "Kolom": "", "Nilai": "", "Pesan": f"File tidak bisa dibaca: {e}"}])
+
+    hilang = [k for k in kolom_wajib if pemetaan.get(k, k) not in mentah.columns]
+    if hilang:
+        return 0, pd.DataFrame([{"Baris": 0, "Kolom": k, "Nilai": pemetaan.get(k, k), "Pesan": "Kolom tidak ada di file"}
+                                for k in hilang])
+    df = pd.DataFrame({k: mentah[pemetaan.get(k, k)].str.strip() if pemetaan.get(k, k) in mentah.columns else ""
+                       for k in IMPOR_KOLOM[tipe]})
+
+    errors = []
+    fmt = IMPOR_FORMAT_TANGGAL.get(format_tanggal, "ISO8601")
+    tanggal = pd.to_datetime(df["Tanggal"], format=fmt, errors='coerce')
+    if fmt != "ISO8601":
+        # jam boleh ikut (mis. "31/01/2024 08:15:00")
+        for fmt_jam in (f"{fmt} %H:%M:%S", f"{fmt} %H:%M"):
+            sisa = tanggal.isna()
+            if not sisa.any():
+                break
+            tanggal = tanggal.fillna(pd.to_datetime(df["Tanggal"].where(sisa), format=fmt_jam, errors='coerce'))
+    _error_impor(errors, tanggal.isna(), df, "Tanggal", f"Tanggal tidak valid (format {format_tanggal})")
+
+    angka = df["Jumlah"].str.replace(r"^Rp\.?\s*|\s", "", regex=True)
+    if angka_indonesia:
+        angka = angka.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    jumlah = pd.to_numeric(angka, errors='coerce')
+    _error_impor(errors, jumlah.isna(), df, "Jumlah", "Jumlah bukan angka")
+    _error_impor(errors, jumlah.notna() & (jumlah <= 0), df, "Jumlah", "Jumlah harus lebih dari 0")
+    _error_impor(errors, jumlah.notna() & (jumlah > 0) & ((jumlah != jumlah.round()) | (jumlah > RUPIAH_MAKS)),
+                 df, "Jumlah", PESAN_RUPIAH.rstrip("."))
+
+    if tipe == "pemasukan":
+        _error_impor(errors, ~df["Metode"].isin(metode_pemasukan), df, "Metode", "Metode tidak dikenal")
+        _error_impor(errors, ~df["Sumber"].isin(kategori_pemasukan["Sumber Pemasukan"]), df, "Sumber", "Sumber tidak dikenal")
+    else:
+        _error_impor(errors, ~df["Metode"].isin(metode_pengeluaran), df, "Metode", "Metode tidak dikenal")
+        kategori_ok = df["Kategori"].isin(list(kategori_pengeluaran))
+        _error_impor(errors, ~kategori_ok, df, "Kategori", "Kategori tidak dikenal")
+        pasangan = pd.MultiIndex.from_tuples([(k, s) for k, subs in kategori_pengeluaran.items() for s in subs])
+        sub_ok = pd.MultiIndex.from_arrays([df["Kategori"], df["Sub Kategori"]]).isin(pasangan)
+        _error_impor(errors, kategori_ok & ~sub_ok, df, "Sub Kategori", "Sub Kategori tidak cocok dengan Kategori")
+
+    if errors:
+        return 0, pd.concat(errors, ignore_index=True).sort_values(["Baris", "Kolom"], kind="stable")
+    if df.empty:
+        return 0, pd.DataFrame(columns=["Baris", "Kolom", "Nilai", "Pesan"])
+
+    # Tanggal tanpa jam diberi jam saat ini, sama seperti form input
+    sekarang = pd.Timestamp.now()
+    tanpa_jam = tanggal == tanggal.dt.normalize()
+    tanggal = tanggal.where(~tanpa_jam, tanggal + (sekarang - sekarang.normalize()).floor("s"))
+    waktu = tanggal.dt.strftime("%Y-%m-%d %H:%M:%S")
+    ids = [buat_id() for _ in range(len(df))]
+
+    transaksi = df.assign(Tanggal=waktu, Jumlah=jumlah, Username=username, ID=ids)
+    transaksi = transaksi[COLUMNS_MAP[f"{tipe}.csv"]]
+    if tipe == "pemasukan":
+        akun_debit = df["Metode"].map({"Tunai": "Kas", "Transfer": "Bank", "Piutang": "Piutang Dagang", "Pelunasan Piutang": "Kas"})
+        akun_kredit = np.where(df["Metode"] == "Pelunasan Piutang", "Piutang Dagang", "Pendapatan")
+        keterangan = df["Sumber"] + " - " + df["Keterangan"]
+    else:
+        akun_kredit = df["Metode"].map({"Tunai": "Kas", "Transfer": "Bank", "Utang": "Utang Dagang", "Pelunasan Utang": "Kas"})
+        akun_debit = np.where(df["Metode"] == "Pelunasan Utang", "Utang Dagang", df["Sub Kategori"])
+        keterangan = df["Kategori"] + " - " + df["Keterangan"]
+    jurnal = buat_jurnal_batch(waktu, akun_debit, akun_kredit, jumlah, keterangan, ids)
+
+    append_bersama({f"{tipe}.csv": _ke_records(transaksi), "jurnal.csv": _ke_records(jurnal)}, username)
+    return len(transaksi), pd.DataFrame(columns=["Baris", "Kolom", "Nilai", "Pesan"])
 
+# ---------------- Grafik Laporan ----------------
+# Grafik halaman Laporan digambar matplotlib (backend Agg) di process pool
+# GRAFIK_WORKERS dan disimpan di folder grafik milik user dengan nama
+# {jenis}_{rentang}_{versi_data}.{png|svg}, jadi tampilan berikutnya cukup
+# mengirim file (dengan ETag). Selama belum jadi, /grafik membalas 202 +
+# gambar placeholder dan halaman mencoba lagi. Data grafik disiapkan di
+# proses aplikasi (rollup/saldo), proses pool hanya menggambar.
+# GRAFIK_WORKERS=0 = gambar langsung di request /grafik.
 
-# ---------------- Data Kategori (Sama) ----------------
-kategori_pengeluaran = {
-    "Bibit": ["Intani", "Inpari", "Ciherang", "32"],
-    "Pupuk": ["Urea", "NPK", "Organik", "Ponska"],
-    "Pestisida": ["Debestan", "Ronsa", "Refaton", "Ema", "Plenum"],
-    "Alat Tani": ["Sabit", "Cangkul", "Karung"],
-    "Tenaga Kerja": ["Upah Harian", "Borongan"],
-    "Lainnya": ["Lain-lain"]
-}
-kategori_pemasukan = {
-    "Sumber Pemasukan": ["Penjualan Padi", "Lain-lain"]
+GRAFIK_JENIS = {
+    "bulanan": "Pemasukan vs Pengeluaran per Bulan",
+    "kategori": "Pengeluaran per Kategori",
+    "kas": "Saldo Kas & Bank",
 }
+GRAFIK_FORMAT = {"png": "image/png", "svg": "image/svg+xml"}
+GRAFIK_WORKERS = int(os.environ.get("TANIAKUN_GRAFIK_WORKERS", "1"))
+GRAFIK_PLACEHOLDER = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="700" height="350">'
+    '<rect width="100%" height="100%" fill="#f9fafb"/>'
+    '<text x="50%" y="50%" text-anchor="middle" font-family="sans-serif" font-size="14" fill="#6b7280">'
+    'Grafik sedang dibuat...</text></svg>'
+)
 
-# ---------------- Helper Functions (Sama, sudah benar) ----------------
-# (Helper functions dari load_data s/d hapus_transaksi tidak diubah,
-# karena logikanya sudah benar dengan APP_DIR)
+_grafik_lock = threading.Lock()
+_grafik_pool = None
+_grafik_proses = {}  # path -> Future yang sedang menggambar
+_grafik_gagal = {}   # path -> pesan error (dicoba lagi kalau versi data berubah)
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+def _grafik_path(username, jenis, mulai, akhir, fmt):
+    rentang = hashlib.sha1(f"{_format_waktu(mulai)}|{_format_waktu(akhir)}".encode()).hexdigest()[:12]
+    return os.path.join(_subfolder_user(username, "grafik"), f"{jenis}_{rentang}_{versi_data(username)}.{fmt}")
 
-def get_user_file(base_filename, username):
-    name, ext = os.path.splitext(base_filename)
-    filename = f"{name}_{username}{ext}"
-    return os.path.join(APP_DIR, filename)
+def _data_grafik(jenis, username, mulai, akhir):
+    # Data polos (list/dict) supaya murah dikirim ke proses pool
+    if jenis == "bulanan":
+        batas = [mulai] + [b for b in pd.date_range(mulai.to_period("M").to_timestamp(), akhir, freq="MS")
+                           if mulai < b < akhir] + [akhir]
+        data = {"label": [], "pemasukan": [], "pengeluaran": []}
+        for dari, sampai in zip(batas, batas[1:]):
+            rollup = rollup_rentang(username, dari, sampai)
+            data["label"].append(dari.strftime("%Y-%m"))
+            data["pemasukan"].append(sum(d for (t, _, _), (d, _) in rollup.items() if t == "pemasukan.csv"))
+            data["pengeluaran"].append(sum(d for (t, _, _), (d, _) in rollup.items() if t == "pengeluaran.csv"))
+        data["kosong"] = not any(data["pemasukan"]) and not any(data["pengeluaran"])
+        return data
 
-def load_data(base_filename, username):
-    filename = get_user_file(base_filename, username)
-    columns_map = {
-        "pemasukan.csv": ["Tanggal", "Sumber", "Jumlah", "Metode", "Keterangan", "Username"],
-        "pengeluaran.csv": ["Tanggal", "Kategori", "Sub Kategori", "Jumlah", "Keterangan", "Metode", "Username"],
-        "jurnal.csv": ["Tanggal", "Akun", "Debit", "Kredit", "Keterangan"]
-    }
-    
-    if os.path.exists(filename):
-        try:
-            return pd.read_csv(filename)
-        except pd.errors.EmptyDataError:
-            return pd.DataFrame(columns=columns_map.get(base_filename, []))
+    if jenis == "kategori":
+        per_kategori = {}
+        for (tabel, kategori, _), (d, _) in rollup_rentang(username, mulai, akhir).items():
+            if tabel == "pengeluaran.csv":
+                per_kategori[kategori] = per_kategori.get(kategori, 0.0) + d
+        urut = sorted(((k, v) for k, v in per_kategori.items() if v), key=lambda kv: -kv[1])
+        return {"label": [k for k, _ in urut], "jumlah": [v for _, v in urut], "kosong": not urut}
+
+    akun = ["Kas", "Bank"]
+    awal = saldo_per_akun(username, akhir=mulai)
+    awal = (awal["Debit"] - awal["Kredit"]).reindex(akun, fill_value=0.0)
+    hari = pd.date_range(mulai.normalize(), (akhir - pd.Timedelta(seconds=1)).normalize(), freq="D")
+    jurnal = load_data("jurnal.csv", username, mulai=mulai, akhir=akhir, akun=akun,
+                       kolom=["Tanggal", "Akun", "Debit", "Kredit"])
+    if jurnal.empty:
+        mutasi = pd.DataFrame(0.0, index=hari, columns=akun)
     else:
-        return pd.DataFrame(columns=columns_map.get(base_filename, []))
+        tanggal = pd.to_datetime(jurnal["Tanggal"], errors='coerce').dt.normalize()
+        mutasi = (jurnal["Debit"] - jurnal["Kredit"]).groupby([tanggal, jurnal["Akun"].astype(str)]).sum()
+        mutasi = mutasi.unstack(fill_value=0.0).reindex(index=hari, columns=akun, fill_value=0.0)
+    saldo = mutasi.cumsum() + awal
+    return {"hari": [h.strftime("%Y-%m-%d") for h in hari], "Kas": saldo["Kas"].tolist(),
+            "Bank": saldo["Bank"].tolist(), "kosong": len(hari) == 0}
 
-def save_data(df, base_filename, username):
-    filename = get_user_file(base_filename, username)
-    df.to_csv(filename, index=False)
+def _gambar_grafik(jenis, data, path, fmt):
+    # Dijalankan di proses pool (atau langsung kalau GRAFIK_WORKERS=0).
+    # Figure dipakai langsung, tanpa pyplot, jadi tidak ada state global.
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+    from matplotlib.ticker import FuncFormatter
 
-def append_data(data, base_filename, username):
-    df = load_data(base_filename, username)
-    if df.empty:
-        df = pd.DataFrame([data])
+    fig = Figure(figsize=(7, 3.5), dpi=100)
+    ax = fig.subplots()
+    ax.set_title(GRAFIK_JENIS[jenis], fontsize=11)
+    rupiah = FuncFormatter(lambda x, _: f"Rp {x:,.0f}".replace(",", "."))
+    if data["kosong"]:
+        ax.set_axis_off()
+        ax.text(0.5, 0.5, "Belum ada data pada rentang ini", ha="center", va="center", color="#6b7280")
+    elif jenis == "bulanan":
+        x = np.arange(len(data["label"]))
+        ax.bar(x - 0.2, data["pemasukan"], 0.4, label="Pemasukan", color="#16a34a")
+        ax.bar(x + 0.2, data["pengeluaran"], 0.4, label="Pengeluaran", color="#dc2626")
+        ax.set_xticks(x, data["label"], rotation=45 if len(x) > 6 else 0, fontsize=8)
+        ax.yaxis.set_major_formatter(rupiah)
+        ax.legend(fontsize=8)
+    elif jenis == "kategori":
+        ax.barh(data["label"][::-1], data["jumlah"][::-1], color="#ea580c")
+        ax.xaxis.set_major_formatter(rupiah)
+        ax.tick_params(labelsize=8)
     else:
-        df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
-    save_data(df, base_filename, username)
+        hari = pd.to_datetime(data["hari"])
+        for akun, warna in (("Kas", "#16a34a"), ("Bank", "#2563eb")):
+            ax.plot(hari, data[akun], label=akun, color=warna, linewidth=1.5)
+        lokasi = AutoDateLocator()
+        ax.xaxis.set_major_locator(lokasi)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(lokasi))
+        ax.yaxis.set_major_formatter(rupiah)
+        ax.tick_params(labelsize=8)
+        ax.legend(fontsize=8)
+    fig.tight_layout()
+    _tulis_atomik(path, lambda f: fig.savefig(f, format=fmt), biner=True)
 
-def buat_jurnal(tanggal, akun_debit, akun_kredit, jumlah, keterangan):
-    return [
-        {"Tanggal": tanggal, "Akun": akun_debit, "Debit": jumlah, "Kredit": 0, "Keterangan": keterangan},
-        {"Tanggal": tanggal, "Akun": akun_kredit, "Debit": 0, "Kredit": jumlah, "Keterangan": keterangan},
-    ]
+def _hapus_grafik_lama(path):
+    # Versi lain untuk (jenis, rentang, format) yang sama sudah basi
+    folder, nama = os.path.split(path)
+    awalan, akhiran = nama.rsplit("_", 1)[0] + "_", os.path.splitext(nama)[1]
+    for lain in os.listdir(folder):
+        if lain != nama and lain.startswith(awalan) and lain.endswith(akhiran):
+            _hapus_file(os.path.join(folder, lain))
 
-def load_user_accounts():
-    akun_file = os.path.join(APP_DIR, "akun.csv")
-    if os.path.exists(akun_file):
-        try:
-            return pd.read_csv(akun_file)
-        except pd.errors.EmptyDataError:
-             return pd.DataFrame(columns=["Username", "Password"])
-    else:
-        return pd.DataFrame(columns=["Username", "Password"])
+def _grafik_selesai(path, future):
+    with _grafik_lock:
+        _grafik_proses.pop(path, None)
+        if future.exception() is not None:
+            _grafik_gagal[path] = repr(future.exception())
+            return
+    _hapus_grafik_lama(path)
 
-def save_user_accounts(df):
-    akun_file = os.path.join(APP_DIR, "akun.csv")
-    df.to_csv(akun_file, index=False)
+def minta_grafik(username, jenis, mulai, akhir, fmt="png"):
+    # Path file grafik kalau sudah ada. Kalau belum, penggambaran dijadwalkan
+    # di pool (paling banyak satu per path) dan hasilnya None.
+    global _grafik_pool
+    path = _grafik_path(username, jenis, mulai, akhir, fmt)
+    if os.path.exists(path):
+        return path
+    if not GRAFIK_WORKERS:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _gambar_grafik(jenis, _data_grafik(jenis, username, mulai, akhir), path, fmt)
+        _hapus_grafik_lama(path)
+        return path
 
-def register_user(username, password):
-    akun_df = load_user_accounts()
-    if not akun_df.empty and (akun_df['Username'] == username).any():
+    with _grafik_lock:
+        if path in _grafik_proses or path in _grafik_gagal:
+            return None
+        _grafik_proses[path] = None  # dipesan; data disiapkan di luar kunci
+        if _grafik_pool is None:
+            _grafik_pool = ProcessPoolExecutor(GRAFIK_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        future = _grafik_pool.submit(_gambar_grafik, jenis, _data_grafik(jenis, username, mulai, akhir), path, fmt)
+    except BaseException:
+        with _grafik_lock:
+            _grafik_proses.pop(path, None)
+        raise
+    with _grafik_lock:
+        _grafik_proses[path] = future
+    future.add_done_callback(lambda f: _grafik_selesai(path, f))
+    return None
+
+def grafik_gagal(username, jenis, mulai, akhir, fmt="png"):
+    return _grafik_gagal.get(_grafik_path(username, jenis, mulai, akhir, fmt))
+
+# ---------------- Antrean Job Laporan ----------------
+# Laporan berat dihitung di thread pool (JOB_WORKERS) di luar thread request.
+# Tabel job ada di {data}/job.db (SQLite, dipakai bersama semua worker
+# gunicorn); hasilnya di-pickle ke folder job milik user, {id}.pkl. ID job =
+# hash (user, jenis, parameter, versi_data), jadi permintaan yang sama
+# selagi job masih jalan tidak membuat job baru, dan hasil yang sudah
+# selesai dipakai ulang sampai data user berubah. Job "jalan" milik proses
+# yang sudah mati diambil alih oleh proses yang menanyakannya.
+# JOB_WORKERS=0 = dihitung langsung di request.
+
+JOB_WORKERS = int(os.environ.get("TANIAKUN_JOB_WORKERS", "2"))
+JOB_TIMEOUT = int(os.environ.get("TANIAKUN_JOB_TIMEOUT", "600"))  # detik; job lebih lama dianggap yatim
+# Halaman Laporan menunggu job selama ini sebelum menampilkan "sedang disiapkan"
+LAPORAN_TUNGGU = float(os.environ.get("TANIAKUN_LAPORAN_TUNGGU", "0.5"))
+
+_job_local = threading.local()
+_job_lock = threading.Lock()
+_job_pool = None
+_job_futures = {}  # ID -> Future di proses ini
+
+def _job_laporan(username, param):
+    # Hasil: HTML isi laporan (menghitung dan merender sama-sama berat)
+    laporan = hitung_laporan(username, pd.Timestamp(param["mulai"]), pd.Timestamp(param["akhir"]))
+    with app.app_context():
+        return render_laporan_isi(laporan, param["akhir_tampil"])
+
+JOB_JENIS = {"laporan": _job_laporan}
+
+def render_laporan_isi(laporan, akhir_tampil):
+    return render_template("laporan_isi.html", filter={"akhir": akhir_tampil}, bagian=laporan.__getitem__)
+
+def _job_conn():
+    path = os.path.join(_data_dir(), "job.db")
+    conn = getattr(_job_local, "conn", None)
+    if conn is not None and _job_local.path == path:
+        return conn
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('CREATE TABLE IF NOT EXISTS "job" ("ID" TEXT PRIMARY KEY, "Username" TEXT, "Jenis" TEXT, '
+                 '"Param" TEXT, "Versi" TEXT, "Status" TEXT, "Pid" INTEGER, "Dibuat" TEXT, "Selesai" TEXT, "Error" TEXT)')
+    conn.execute('CREATE INDEX IF NOT EXISTS "idx_job_user" ON "job" ("Username")')
+    conn.commit()
+    _job_local.conn, _job_local.path = conn, path
+    return conn
+
+def _job_hasil_path(username, job_id):
+    return os.path.join(_subfolder_user(username, "job"), f"{job_id}.pkl")
+
+def _job_baca(job_id):
+    row = _job_conn().execute('SELECT * FROM "job" WHERE "ID" = ?', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+def _job_hidup(job):
+    # Apakah job antre/jalan masih dipegang proses yang hidup
+    dibuat = datetime.strptime(job["Dibuat"], "%Y-%m-%d %H:%M:%S")
+    if (datetime.now() - dibuat).total_seconds() > JOB_TIMEOUT:
+        return False
+    if job["Pid"] == os.getpid():
+        return job["ID"] in _job_futures
+    try:
+        os.kill(job["Pid"], 0)
+    except ProcessLookupError:
         return False
-    akun_df = pd.concat([akun_df, pd.DataFrame([{"Username": username, "Password": hash_password(password)}])], ignore_index=True)
-    save_user_accounts(akun_df)
+    except PermissionError:
+        pass
     return True
 
-def validate_login(username, password):
-    akun_df = load_user_accounts()
-    if akun_df.empty:
-        return False
-    hashed_pw = hash_password(password)
-    user_data = akun_df[(akun_df['Username'] == username) & (akun_df['Password'] == hashed_pw)]
-    return not user_data.empty
+def _job_jalankan(job_id):
+    job = _job_baca(job_id)
+    conn = _job_conn()
+    with conn:
+        conn.execute('UPDATE "job" SET "Status" = \'jalan\' WHERE "ID" = ?', (job_id,))
+    try:
+        hasil = JOB_JENIS[job["Jenis"]](job["Username"], json.loads(job["Param"]))
+        path = _job_hasil_path(job["Username"], job_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _tulis_atomik(path, lambda f: pickle.dump(hasil, f, protocol=pickle.HIGHEST_PROTOCOL), biner=True)
+        status, error = "selesai", None
+    except Exception as e:
+        status, error = "gagal", repr(e)
+    with conn:
+        conn.execute('UPDATE "job" SET "Status" = ?, "Error" = ?, "Selesai" = ? WHERE "ID" = ?',
+                     (status, error, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id))
+    if status == "selesai":
+        _job_bersihkan(job["Username"], kecuali=job_id)
 
-def hapus_transaksi(transaksi_type, index_to_delete, username):
-    base_filename = f"{transaksi_type}.csv"
-    df = load_data(base_filename, username)
-    
+def _job_bersihkan(username, kecuali=None):
+    # Hasil job untuk versi data yang sudah lewat tidak akan dipakai lagi.
+    # Job yang baru selesai (kecuali) tetap disimpan: pembacaannya sendiri
+    # bisa mengubah versi data (mis. migrasi ID file lama), padahal halaman
+    # yang menunggunya belum mengambil hasilnya.
+    versi = versi_data(username)
+    conn = _job_conn()
+    with conn:
+        basi = [r["ID"] for r in conn.execute(
+            'SELECT "ID" FROM "job" WHERE "Username" = ? AND "Versi" != ? AND "Status" IN (\'selesai\', \'gagal\')',
+            (username, versi)) if r["ID"] != kecuali]
+        conn.executemany('DELETE FROM "job" WHERE "ID" = ?', [(i,) for i in basi])
+    for job_id in basi:
+        _hapus_file(_job_hasil_path(username, job_id))
+
+def _job_mulai(job_id):
+    # Dipanggil dengan _job_lock dipegang. Hasil True kalau JOB_WORKERS=0:
+    # pemanggil menjalankan job sendiri (_job_langsung) sesudah melepas kunci.
+    global _job_pool
+    if not JOB_WORKERS:
+        _job_futures[job_id] = None
+        return True
+    if _job_pool is None:
+        _job_pool = ThreadPoolExecutor(JOB_WORKERS, thread_name_prefix="job")
+    future = _job_pool.submit(_job_jalankan, job_id)
+    _job_futures[job_id] = future
+    future.add_done_callback(lambda f: _job_futures.pop(job_id, None))
+    return False
+
+def _job_langsung(job_id):
     try:
-        index_to_delete = int(index_to_delete)
-        
-        if index_to_delete in df.index:
-            transaksi = df.loc[index_to_delete]
-            df = df.drop(index_to_delete).reset_index(drop=True)
-            save_data(df, base_filename, username)
-            
-            waktu_hapus = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            keterangan_batal = f"Pembatalan: {transaksi.get('Keterangan', '')}"
-            jumlah_transaksi = transaksi['Jumlah']
-            metode_transaksi = transaksi['Metode']
-            
-            if transaksi_type == "pemasukan":
-                if metode_transaksi == "Pelunasan Piutang":
-                    jurnal_pembalikan = buat_jurnal(waktu_hapus, "Piutang Dagang", "Kas", jumlah_transaksi, keterangan_batal)
-                else:
-                    akun_debit = {"Tunai": "Kas", "Transfer": "Bank", "Piutang": "Piutang Dagang"}.get(metode_transaksi, "Kas")
-                    jurnal_pembalikan = buat_jurnal(waktu_hapus, "Pendapatan", akun_debit, jumlah_transaksi, keterangan_batal)
-            
-            elif transaksi_type == "pengeluaran":
-                if metode_transaksi == "Pelunasan Utang":
-                    jurnal_pembalikan = buat_jurnal(waktu_hapus, "Kas", "Utang Dagang", jumlah_transaksi, keterangan_batal)
-                else:
-                    akun_kredit = {"Tunai": "Kas", "Transfer": "Bank", "Utang": "Utang Dagang"}.get(metode_transaksi, "Kas")
-                    sub_kategori = transaksi.get('Sub Kategori', 'Beban Lain')
-                    jurnal_pembalikan = buat_jurnal(waktu_hapus, akun_kredit, sub_kategori, jumlah_transaksi, keterangan_batal)
-            else:
-                return False
+        _job_jalankan(job_id)
+    finally:
+        _job_futures.pop(job_id, None)
 
-            for j in jurnal_pembalikan:
-                append_data(j, "jurnal.csv", username)
-            return True
-        else:
-            return False
-    except (ValueError, TypeError):
-        return False
-    
+def _job_pastikan(job, ulang_gagal=True):
+    # Job yatim (pemiliknya mati/terlalu lama), yang file hasilnya hilang, dan
+    # (kalau ulang_gagal) yang gagal diantrekan ulang; UPDATE bersyarat
+    # memastikan hanya satu proses yang mengambil alih.
+    with _job_lock:
+        if job["Status"] == "selesai" and os.path.exists(_job_hasil_path(job["Username"], job["ID"])):
+            return job
+        if job["Status"] in ("antre", "jalan") and _job_hidup(job):
+            return job
+        if job["Status"] == "gagal" and not ulang_gagal:
+            return job
+        conn = _job_conn()
+        with conn:
+            cur = conn.execute('UPDATE "job" SET "Status" = \'antre\', "Pid" = ?, "Dibuat" = ?, "Error" = NULL '
+                               'WHERE "ID" = ? AND "Status" = ? AND "Pid" = ?',
+                               (os.getpid(), datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                job["ID"], job["Status"], job["Pid"]))
+        langsung = cur.rowcount == 1 and _job_mulai(job["ID"])
+    if langsung:
+        _job_langsung(job["ID"])
+    return _job_baca(job["ID"])
+
+def kirim_job(username, jenis, param):
+    # Hasil: baris job (dict). Permintaan identik memakai job yang sama.
+    versi = versi_data(username)
+    job_id = hashlib.sha1(json.dumps([username, jenis, param, versi], sort_keys=True).encode()).hexdigest()[:20]
+    conn = _job_conn()
+    with _job_lock:
+        with conn:
+            cur = conn.execute('INSERT OR IGNORE INTO "job" VALUES (?, ?, ?, ?, ?, \'antre\', ?, ?, NULL, NULL)',
+                               (job_id, username, jenis, json.dumps(param, sort_keys=True), versi, os.getpid(),
+                                datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        baru = cur.rowcount == 1
+        langsung = baru and _job_mulai(job_id)
+    if langsung:
+        _job_langsung(job_id)
+    if baru:
+        return _job_baca(job_id)
+    return _job_pastikan(_job_baca(job_id))
+
+def status_job(job_id, username):
+    job = _job_baca(job_id)
+    if job is None or job["Username"] != username:
+        return None
+    return _job_pastikan(job, ulang_gagal=False)
+
+def tunggu_job(job, detik):
+    # Tunggu sebentar job yang jalan di proses ini (laporan kecil langsung jadi)
+    future = _job_futures.get(job["ID"])
+    if future is not None:
+        try:
+            future.result(timeout=detik)
+        except FutureTimeoutError:
+            pass
+    # Baris job bisa sudah dibersihkan job lain (versi data berubah)
+    return _job_baca(job["ID"]) or job
+
+def hasil_job(job):
+    try:
+        with open(_job_hasil_path(job["Username"], job["ID"]), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
 
 # ---------------- Decorator (Sama) ----------------
 
@@ -169,9 +3270,18 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def api_login_required(f):
+    # Sama dengan login_required, tapi membalas 401 JSON (bukan redirect)
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'logged_in' not in session:
+            return jsonify({"error": "Harap login terlebih dahulu."}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 # ---------------- KUMPULAN TEMPLATE HTML (Dengan Perbaikan) ----------------
 
-# HTML_LAYOUT (Parent) tetap SAMA. Placeholder-nya penting.
+# HTML_LAYOUT (Parent). Placeholder-nya penting.
 HTML_LAYOUT = """
 <!DOCTYPE html>
 <html lang="id">
@@ -200,6 +3310,7 @@ HTML_LAYOUT = """
                         <a href="{{ url_for('pemasukan_page') }}" class="px-3 py-2 rounded-md text-sm font-medium text-gray-700 hover:bg-gray-100">Pemasukan</a>
                         <a href="{{ url_for('pengeluaran_page') }}" class="px-3 py-2 rounded-md text-sm font-medium text-gray-700 hover:bg-gray-100">Pengeluaran</a>
                         <a href="{{ url_for('kelola_page') }}" class="px-3 py-2 rounded-md text-sm font-medium text-gray-700 hover:bg-gray-100">Kelola Data</a>
+                        <a href="{{ url_for('impor_page') }}" class="px-3 py-2 rounded-md text-sm font-medium text-gray-700 hover:bg-gray-100">Impor</a>
                         <a href="{{ url_for('laporan_page') }}" class="px-3 py-2 rounded-md text-sm font-medium text-gray-700 hover:bg-gray-100">Laporan</a>
                         <a href="{{ url_for('logout_page') }}" class="ml-4 px-3 py-2 rounded-md text-sm font-medium text-red-600 bg-red-100 hover:bg-red-200">Logout</a>
                     {% else %}
@@ -231,7 +3342,8 @@ HTML_LAYOUT = """
 </html>
 """
 
-# --- PERBAIKAN: Hapus '{% extends ... %}' dan '{% block ... %}' dari semua template "anak" ---
+# Template "anak" hanya berisi konten; '{% extends %}' dan '{% block %}'
+# ditambahkan saat didaftarkan ke loader Jinja (lihat TEMPLATES di bawah).
 
 HTML_LOGIN = """
 <div class="flex items-center justify-center py-12 px-4 sm:px-6 lg:px-8">
@@ -421,9 +3533,59 @@ HTML_KELOLA_DATA = """
 <div class="bg-white p-8 rounded-xl shadow-lg">
     <h2 class="text-2xl font-bold text-gray-900 mb-6">Kelola Data Transaksi</h2>
     
+    <!-- Filter & Urutan -->
+    <form method="GET" action="{{ url_for('kelola_page') }}" class="mb-6 bg-gray-50 p-4 rounded-lg border border-gray-200 flex flex-wrap items-end gap-4">
+        <div>
+            <label for="mulai" class="block text-sm font-medium text-gray-700">Tanggal Mulai</label>
+            <input type="date" id="mulai" name="mulai" value="{{ filter.mulai }}"
+                   class="mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+        </div>
+        <div>
+            <label for="akhir" class="block text-sm font-medium text-gray-700">Tanggal Akhir</label>
+            <input type="date" id="akhir" name="akhir" value="{{ filter.akhir }}"
+                   class="mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+        </div>
+        <div>
+            <label for="kategori" class="block text-sm font-medium text-gray-700">Kategori</label>
+            <select id="kategori" name="kategori"
+                    class="mt-1 block w-full px-3 py-2 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+                <option value="">Semua</option>
+                {% for kategori in kategori_pengeluaran.keys() %}
+                <option value="{{ kategori }}" {% if filter.kategori == kategori %}selected{% endif %}>{{ kategori }}</option>
+                {% endfor %}
+            </select>
+        </div>
+        <div>
+            <label for="metode" class="block text-sm font-medium text-gray-700">Metode</label>
+            <select id="metode" name="metode"
+                    class="mt-1 block w-full px-3 py-2 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+                <option value="">Semua</option>
+                {% for metode in ['Tunai', 'Transfer', 'Piutang', 'Pelunasan Piutang', 'Utang', 'Pelunasan Utang'] %}
+                <option value="{{ metode }}" {% if filter.metode == metode %}selected{% endif %}>{{ metode }}</option>
+                {% endfor %}
+            </select>
+        </div>
+        <div>
+            <label for="urut" class="block text-sm font-medium text-gray-700">Urutan</label>
+            <select id="urut" name="urut"
+                    class="mt-1 block w-full px-3 py-2 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+                <option value="desc" {% if filter.urut == 'desc' %}selected{% endif %}>Terbaru</option>
+                <option value="asc" {% if filter.urut == 'asc' %}selected{% endif %}>Terlama</option>
+            </select>
+        </div>
+        <div>
+            <label for="per" class="block text-sm font-medium text-gray-700">Per Halaman</label>
+            <input type="number" id="per" name="per" min="1" max="500" value="{{ filter.per }}"
+                   class="mt-1 block w-24 px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+        </div>
+        <button type="submit" class="py-2 px-4 border border-transparent rounded-md shadow-sm text-sm font-medium text-white bg-green-600 hover:bg-green-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-green-500">
+            Terapkan Filter
+        </button>
+    </form>
+
     <!-- Tabel Pemasukan -->
-    <h3 class="text-xl font-semibold text-gray-800 mb-3">Data Pemasukan</h3>
-    <div class="overflow-x-auto rounded-lg border border-gray-200 mb-6">
+    <h3 class="text-xl font-semibold text-gray-800 mb-3">Data Pemasukan <span class="text-sm font-normal text-gray-500">({{ halaman.pemasukan.total }} transaksi)</span></h3>
+    <div class="overflow-x-auto rounded-lg border border-gray-200 mb-2">
         <table class="min-w-full divide-y divide-gray-200">
             <thead class="bg-gray-50">
                 <tr>
@@ -438,13 +3600,13 @@ HTML_KELOLA_DATA = """
             <tbody class="bg-white divide-y divide-gray-200">
                 {% for index, row in pemasukan_df.iterrows() %}
                 <tr>
-                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ index }}</td>
+                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500 font-mono">{{ row['ID'] }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row['Tanggal'] | string | truncate(10, True, '') }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">{{ row['Sumber'] }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">Rp {{ "%.0f"|format(row['Jumlah']|float) }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row['Metode'] }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm">
-                        <a href="{{ url_for('hapus_page', tipe='pemasukan', index=index) }}" 
+                        <a href="{{ url_for('hapus_page', tipe='pemasukan', id_transaksi=row['ID']) }}" 
                            onclick="return confirm('Yakin ingin menghapus data ini? Aksi ini akan membuat jurnal pembalikan.')"
                            class="text-red-600 hover:text-red-900 font-medium">Hapus</a>
                     </td>
@@ -455,10 +3617,14 @@ HTML_KELOLA_DATA = """
             </tbody>
         </table>
     </div>
+    <div class="flex justify-end gap-4 text-sm mb-6">
+        {% if halaman.pemasukan.awal %}<a href="{{ halaman.pemasukan.awal }}" class="text-green-600 hover:text-green-800 font-medium">&laquo; Halaman Pertama</a>{% endif %}
+        {% if halaman.pemasukan.berikut %}<a href="{{ halaman.pemasukan.berikut }}" class="text-green-600 hover:text-green-800 font-medium">Berikutnya &raquo;</a>{% endif %}
+    </div>
 
     <!-- Tabel Pengeluaran -->
-    <h3 class="text-xl font-semibold text-gray-800 mb-3">Data Pengeluaran</h3>
-    <div class="overflow-x-auto rounded-lg border border-gray-200">
+    <h3 class="text-xl font-semibold text-gray-800 mb-3">Data Pengeluaran <span class="text-sm font-normal text-gray-500">({{ halaman.pengeluaran.total }} transaksi)</span></h3>
+    <div class="overflow-x-auto rounded-lg border border-gray-200 mb-2">
         <table class="min-w-full divide-y divide-gray-200">
             <thead class="bg-gray-50">
                 <tr>
@@ -473,13 +3639,13 @@ HTML_KELOLA_DATA = """
             <tbody class="bg-white divide-y divide-gray-200">
                 {% for index, row in pengeluaran_df.iterrows() %}
                 <tr>
-                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ index }}</td>
+                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500 font-mono">{{ row['ID'] }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row['Tanggal'] | string | truncate(10, True, '') }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">{{ row['Kategori'] }} - {{ row['Sub Kategori'] }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">Rp {{ "%.0f"|format(row['Jumlah']|float) }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row['Metode'] }}</td>
                     <td class="px-4 py-3 whitespace-nowrap text-sm">
-                        <a href="{{ url_for('hapus_page', tipe='pengeluaran', index=index) }}" 
+                        <a href="{{ url_for('hapus_page', tipe='pengeluaran', id_transaksi=row['ID']) }}" 
                            onclick="return confirm('Yakin ingin menghapus data ini? Aksi ini akan membuat jurnal pembalikan.')"
                            class="text-red-600 hover:text-red-900 font-medium">Hapus</a>
                     </td>
@@ -490,6 +3656,10 @@ HTML_KELOLA_DATA = """
             </tbody>
         </table>
     </div>
+    <div class="flex justify-end gap-4 text-sm">
+        {% if halaman.pengeluaran.awal %}<a href="{{ halaman.pengeluaran.awal }}" class="text-green-600 hover:text-green-800 font-medium">&laquo; Halaman Pertama</a>{% endif %}
+        {% if halaman.pengeluaran.berikut %}<a href="{{ halaman.pengeluaran.berikut }}" class="text-green-600 hover:text-green-800 font-medium">Berikutnya &raquo;</a>{% endif %}
+    </div>
 </div>
 """
 
@@ -513,7 +3683,76 @@ HTML_LAPORAN = """
             Terapkan Filter
         </button>
     </form>
+
+    <!-- Export CSV (rentang sama dengan filter) -->
+    <div class="mb-6 flex flex-wrap items-center gap-2 text-sm">
+        <span class="text-gray-600">Export CSV:</span>
+        {% for jenis, label in [('pemasukan', 'Pemasukan'), ('pengeluaran', 'Pengeluaran'), ('jurnal', 'Jurnal Umum'), ('buku_besar', 'Buku Besar')] %}
+        <a href="{{ url_for('export_page', jenis=jenis, mulai=filter.mulai, akhir=filter.akhir) }}"
+           class="py-1 px-3 rounded-md border border-green-300 text-green-700 hover:bg-green-50">{{ label }}</a>
+        {% endfor %}
+    </div>
+    
+    {% if job %}
+    <!-- Laporan masih dihitung di antrean job -->
+    <div id="job-laporan" class="bg-gray-50 p-6 rounded-lg border border-gray-200 text-center text-sm text-gray-600"
+         data-status="{{ url_for('job_page', job_id=job.ID) }}"
+         data-hasil="{{ url_for('laporan_page', mulai=filter.mulai, akhir=filter.akhir) }}">
+        {% if job.Status == 'gagal' %}
+        Laporan gagal dibuat ({{ job.Error }}). Muat ulang halaman untuk mencoba lagi.
+        {% else %}
+        Laporan sedang disiapkan... halaman akan dimuat otomatis.
+        {% endif %}
+    </div>
+    {% if job.Status != 'gagal' %}
+    <script>
+        (function cek() {
+            var el = document.getElementById('job-laporan');
+            fetch(el.dataset.status, {cache: 'no-store'}).then(function (r) { return r.json(); }).then(function (job) {
+                if (job.status === 'selesai') { window.location = el.dataset.hasil; }
+                else if (job.status === 'gagal') { el.textContent = 'Laporan gagal dibuat (' + job.error + ').'; }
+                else { setTimeout(cek, 1000); }
+            });
+        })();
+    </script>
+    {% endif %}
+    {% else %}
+
+    <!-- Grafik (gambar yang belum jadi dimuat ulang sampai siap) -->
+    {% if grafik %}
+    <div class="grid grid-cols-1 lg:grid-cols-2 gap-4 mb-6">
+        {% for g in grafik %}
+        <div class="bg-gray-50 p-2 rounded-lg border border-gray-200">
+            <img src="{{ g.url }}" alt="{{ g.judul }}" class="w-full" {% if not g.siap %}data-tunggu="1"{% endif %}>
+        </div>
+        {% endfor %}
+    </div>
+    <script>
+        document.querySelectorAll('img[data-tunggu]').forEach(function (img) {
+            var src = img.getAttribute('src'), coba = 0;
+            (function cek() {
+                fetch(src, {cache: 'no-store'}).then(function (r) {
+                    if (r.status === 200) { img.src = src + '&siap=' + Date.now(); }
+                    else if (r.status === 202 && ++coba < 60) { setTimeout(cek, 1000); }
+                });
+            })();
+        });
+    </script>
+    {% endif %}
+
+    {% if isi is defined %}{{ isi|safe }}{% else %}{% include "laporan_isi.html" %}{% endif %}
+    {% endif %}
     
+</div>
+"""
+
+# Isi laporan (Ringkasan s/d Buku Besar). Di-include langsung oleh
+# HTML_LAPORAN saat streaming, atau dirender di job laporan lalu disisipkan
+# sebagai {{ isi }}. Tiap bagian diambil lewat bagian(nama) tepat sebelum
+# dipakai, supaya bagian yang berat baru dihitung setelah yang ringan terkirim.
+HTML_LAPORAN_ISI = """
+    {% set ringkasan = bagian('ringkasan') %}
+    {% set laba_rugi = bagian('laba_rugi') %}
     <!-- 1. Ringkasan -->
     <h3 class="text-xl font-semibold text-gray-800 mb-3">Ringkasan</h3>
     <div class="grid grid-cols-1 md:grid-cols-2 gap-4 mb-6">
@@ -548,7 +3787,10 @@ HTML_LAPORAN = """
         </div>
     </div>
 
+    <!-- kirim -->
+
     <!-- 3. Neraca -->
+    {% set neraca = bagian('neraca') %}
     <h3 class="text-xl font-semibold text-gray-800 mb-3">Neraca (Posisi Keuangan s/d {{ filter.akhir }})</h3>
     <div class="grid grid-cols-1 md:grid-cols-2 gap-6 mb-6">
         <!-- Sisi Aktiva -->
@@ -581,7 +3823,10 @@ HTML_LAPORAN = """
         </div>
     </div>
 
+    <!-- kirim -->
+
     <!-- 4. Jurnal Umum -->
+    {% set jurnal_df = bagian('jurnal') %}
     <h3 class="text-xl font-semibold text-gray-800 mb-3">Jurnal Umum</h3>
     <div class="overflow-x-auto rounded-lg border border-gray-200 mb-6">
         <table class="min-w-full divide-y divide-gray-200">
@@ -595,13 +3840,13 @@ HTML_LAPORAN = """
                 </tr>
             </thead>
             <tbody class="bg-white divide-y divide-gray-200">
-                {% for index, row in jurnal_df.iterrows() %}
+                {% for row in jurnal_df.itertuples() %}
                 <tr>
-                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row['Tanggal'] | string | truncate(19, True, '') }}</td>
-                    <td class="px-4 py-3 whitespace-nowrap text-sm {% if row['Debit'] > 0 %}pl-6{% else %}pl-10{% endif %} text-gray-900">{{ row['Akun'] }}</td>
-                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row['Keterangan'] | truncate(30, True) }}</td>
-                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">{% if row['Debit'] > 0 %}Rp {{ "%.0f"|format(row['Debit']|float) }}{% endif %}</td>
-                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">{% if row['Kredit'] > 0 %}Rp {{ "%.0f"|format(row['Kredit']|float) }}{% endif %}</td>
+                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row.Tanggal | string | truncate(19, True, '') }}</td>
+                    <td class="px-4 py-3 whitespace-nowrap text-sm {% if row.Debit > 0 %}pl-6{% else %}pl-10{% endif %} text-gray-900">{{ row.Akun }}</td>
+                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-500">{{ row.Keterangan | truncate(30, True) }}</td>
+                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">{% if row.Debit > 0 %}Rp {{ "%.0f"|format(row.Debit|float) }}{% endif %}</td>
+                    <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-900">{% if row.Kredit > 0 %}Rp {{ "%.0f"|format(row.Kredit|float) }}{% endif %}</td>
                 </tr>
                 {% else %}
                 <tr><td colspan="5" class="px-4 py-3 text-center text-sm text-gray-500">Tidak ada data jurnal.</td></tr>
@@ -611,6 +3856,7 @@ HTML_LAPORAN = """
     </div>
 
     <!-- 5. Buku Besar -->
+    {% set buku_besar = bagian('buku_besar') %}
     <h3 class="text-xl font-semibold text-gray-800 mb-3">Buku Besar</h3>
     <div class="space-y-4">
         {% for akun, data in buku_besar.items() %}
@@ -645,19 +3891,118 @@ HTML_LAPORAN = """
         <p class="text-sm text-gray-500">Tidak ada data untuk buku besar.</p>
         {% endfor %}
     </div>
-    
+"""
+
+HTML_IMPOR = """
+<div class="bg-white p-8 rounded-xl shadow-lg max-w-3xl mx-auto">
+    <h2 class="text-2xl font-bold text-gray-900 mb-2">Impor Transaksi (CSV)</h2>
+    <p class="text-sm text-gray-600 mb-6">Semua baris diperiksa dulu; kalau ada satu saja yang salah, tidak ada data yang disimpan.</p>
+    <form action="{{ url_for('impor_page') }}" method="POST" enctype="multipart/form-data" class="space-y-4">
+        <div class="grid grid-cols-1 md:grid-cols-2 gap-4">
+            <div>
+                <label for="tipe" class="block text-sm font-medium text-gray-700">Jenis Transaksi</label>
+                <select id="tipe" name="tipe" class="mt-1 block w-full px-3 py-2 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+                    <option value="pemasukan" {% if form.tipe == 'pemasukan' %}selected{% endif %}>Pemasukan</option>
+                    <option value="pengeluaran" {% if form.tipe == 'pengeluaran' %}selected{% endif %}>Pengeluaran</option>
+                </select>
+            </div>
+            <div>
+                <label for="berkas" class="block text-sm font-medium text-gray-700">File CSV</label>
+                <input type="file" id="berkas" name="berkas" accept=".csv,text/csv" required
+                       class="mt-1 block w-full text-sm text-gray-700">
+            </div>
+            <div>
+                <label for="format_tanggal" class="block text-sm font-medium text-gray-700">Format Tanggal</label>
+                <select id="format_tanggal" name="format_tanggal" class="mt-1 block w-full px-3 py-2 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-green-500 focus:border-green-500 sm:text-sm">
+                    {% for fmt in format_tanggal %}
+                    <option value="{{ fmt }}" {% if form.format_tanggal == fmt %}selected{% endif %}>{{ fmt }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+            <div class="flex items-end">
+                <label class="inline-flex items-center text-sm text-gray-700">
+                    <input type="checkbox" name="angka_indonesia" value="1" {% if form.angka_indonesia %}checked{% endif %}
+                           class="h-4 w-4 text-green-600 focus:ring-green-500 border-gray-300 mr-2">
+                    Angka format Indonesia (1.500.000,50)
+                </label>
+            </div>
+        </div>
+        <h3 class="text-sm font-semibold text-gray-800 pt-2">Pemetaan Kolom (nama kolom di file)</h3>
+        <div class="grid grid-cols-2 md:grid-cols-4 gap-3">
+            {% for kolom in kolom_impor %}
+            <div>
+                <label class="block text-xs font-medium text-gray-600">{{ kolom }}</label>
+                <input type="text" name="kolom_{{ kolom }}" value="{{ form.pemetaan.get(kolom, kolom) }}"
+                       class="mt-1 block w-full px-2 py-1 border border-gray-300 rounded-md text-sm">
+            </div>
+            {% endfor %}
+        </div>
+        <p class="text-xs text-gray-500">Sumber hanya untuk pemasukan; Kategori dan Sub Kategori hanya untuk pengeluaran. Keterangan boleh tidak ada.</p>
+        <button type="submit" class="w-full flex justify-center py-2 px-4 border border-transparent rounded-md shadow-sm text-sm font-medium text-white bg-green-600 hover:bg-green-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-green-500">
+            Impor
+        </button>
+    </form>
+
+    {% if errors is not none and not errors.empty %}
+    <h3 class="text-lg font-semibold text-red-700 mt-8 mb-3">{{ errors|length }} kesalahan, tidak ada data yang disimpan</h3>
+    <div class="overflow-x-auto rounded-lg border border-red-200">
+        <table class="min-w-full divide-y divide-gray-200">
+            <thead class="bg-red-50">
+                <tr>
+                    <th class="px-4 py-2 text-left text-xs font-medium text-gray-500 uppercase">Baris</th>
+                    <th class="px-4 py-2 text-left text-xs font-medium text-gray-500 uppercase">Kolom</th>
+                    <th class="px-4 py-2 text-left text-xs font-medium text-gray-500 uppercase">Nilai</th>
+                    <th class="px-4 py-2 text-left text-xs font-medium text-gray-500 uppercase">Pesan</th>
+                </tr>
+            </thead>
+            <tbody class="bg-white divide-y divide-gray-200">
+                {% for index, row in errors.head(200).iterrows() %}
+                <tr>
+                    <td class="px-4 py-2 text-sm text-gray-700">{{ row['Baris'] }}</td>
+                    <td class="px-4 py-2 text-sm text-gray-700">{{ row['Kolom'] }}</td>
+                    <td class="px-4 py-2 text-sm text-gray-500 font-mono">{{ row['Nilai'] }}</td>
+                    <td class="px-4 py-2 text-sm text-red-700">{{ row['Pesan'] }}</td>
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+    </div>
+    {% if errors|length > 200 %}<p class="text-xs text-gray-500 mt-2">Menampilkan 200 kesalahan pertama.</p>{% endif %}
+    {% endif %}
 </div>
 """
 
 
-# ---------------- RUTE FLASK (Dengan Perbaikan di 'return') ----------------
+# ---------------- Registrasi Template ----------------
+# Semua template didaftarkan sekali ke DictLoader dengan pewarisan Jinja
+# asli, lalu dikompilasi saat startup; render_template memakai objek
+# Template yang sudah di-cache oleh jinja_env.
+
+def _halaman(konten):
+    return '{% extends "layout.html" %}{% block content %}' + konten + '{% endblock %}'
+
+TEMPLATES = {
+    "layout.html": HTML_LAYOUT,
+    "login.html": _halaman(HTML_LOGIN),
+    "index.html": _halaman(HTML_INDEX),
+    "pemasukan.html": _halaman(HTML_PEMASUKAN),
+    "pengeluaran.html": _halaman(HTML_PENGELUARAN),
+    "kelola_data.html": _halaman(HTML_KELOLA_DATA),
+    "laporan.html": _halaman(HTML_LAPORAN),
+    "laporan_isi.html": HTML_LAPORAN_ISI,
+    "impor.html": _halaman(HTML_IMPOR),
+}
+app.jinja_loader = DictLoader(TEMPLATES)
+for _nama_template in TEMPLATES:
+    app.jinja_env.get_template(_nama_template)
+
+
+# ---------------- RUTE FLASK ----------------
 
 @app.route("/")
 @login_required
 def index_page():
-    # PERBAIKAN: Gabungkan layout dan template anak secara manual
-    full_html = HTML_LAYOUT.replace('{% block content %}{% endblock %}', HTML_INDEX)
-    return render_template_string(full_html, title="Beranda")
+    return render_template("index.html", title="Beranda")
 
 @app.route("/login", methods=["GET", "POST"])
 def login_page():
@@ -690,9 +4035,7 @@ def login_page():
                 flash("Username atau password salah.", "danger")
                 return redirect(url_for('login_page'))
 
-    # PERBAIKAN: Gabungkan layout dan template anak secara manual
-    full_html = HTML_LAYOUT.replace('{% block content %}{% endblock %}', HTML_LOGIN)
-    return render_template_string(full_html, title="Login")
+    return render_template("login.html", title="Login")
 
 @app.route("/logout")
 def logout_page():
@@ -717,19 +4060,11 @@ def pemasukan_page():
             if jumlah <= 0:
                 flash("Jumlah harus lebih dari 0.", "danger")
                 return redirect(url_for('pemasukan_page'))
+            if not _rupiah_bulat(jumlah):
+                flash(PESAN_RUPIAH, "danger")
+                return redirect(url_for('pemasukan_page'))
             
-            data = {
-                "Tanggal": waktu, "Sumber": sumber, "Jumlah": jumlah,
-                "Metode": metode, "Keterangan": deskripsi, "Username": username
-            }
-            append_data(data, "pemasukan.csv", username)
-            
-            akun_debit = {"Tunai": "Kas", "Transfer": "Bank", "Piutang": "Piutang Dagang", "Pelunasan Piutang": "Kas"}.get(metode, "Kas")
-            akun_kredit = "Pendapatan" if metode != "Pelunasan Piutang" else "Piutang Dagang"
-            
-            jurnal = buat_jurnal(waktu, akun_debit, akun_kredit, jumlah, f"{sumber} - {deskripsi}")
-            for j in jurnal:
-                append_data(j, "jurnal.csv", username)
+            simpan_pemasukan(username, waktu, sumber, jumlah, metode, deskripsi)
                 
             flash("Pemasukan berhasil disimpan.", "success")
             return redirect(url_for('pemasukan_page'))
@@ -739,9 +4074,7 @@ def pemasukan_page():
             
     today = datetime.now().strftime("%Y-%m-%d")
     
-    # PERBAIKAN: Gabungkan layout dan template anak secara manual
-    full_html = HTML_LAYOUT.replace('{% block content %}{% endblock %}', HTML_PEMASUKAN)
-    return render_template_string(full_html, title="Pemasukan", kategori_pemasukan=kategori_pemasukan, today=today)
+    return render_template("pemasukan.html", title="Pemasukan", kategori_pemasukan=kategori_pemasukan, today=today)
 
 @app.route("/pengeluaran", methods=["GET", "POST"])
 @login_required
@@ -761,19 +4094,11 @@ def pengeluaran_page():
             if jumlah <= 0:
                 flash("Jumlah harus lebih dari 0.", "danger")
                 return redirect(url_for('pengeluaran_page'))
+            if not _rupiah_bulat(jumlah):
+                flash(PESAN_RUPIAH, "danger")
+                return redirect(url_for('pengeluaran_page'))
             
-            data = {
-                "Tanggal": waktu, "Kategori": kategori, "Sub Kategori": sub_kategori,
-                "Jumlah": jumlah, "Keterangan": deskripsi, "Metode": metode, "Username": username
-            }
-            append_data(data, "pengeluaran.csv", username)
-            
-            akun_kredit = {"Tunai": "Kas", "Transfer": "Bank", "Utang": "Utang Dagang", "Pelunasan Utang": "Kas"}.get(metode, "Kas")
-            akun_debit = sub_kategori if metode != "Pelunasan Utang" else "Utang Dagang"
-            
-            jurnal = buat_jurnal(waktu, akun_debit, akun_kredit, jumlah, f"{kategori} - {deskripsi}")
-            for j in jurnal:
-                append_data(j, "jurnal.csv", username)
+            simpan_pengeluaran(username, waktu, kategori, sub_kategori, jumlah, metode, deskripsi)
 
             flash("Pengeluaran berhasil disimpan.", "success")
             return redirect(url_for('pengeluaran_page'))
@@ -783,42 +4108,180 @@ def pengeluaran_page():
             
     today = datetime.now().strftime("%Y-%m-%d")
     
-    # PERBAIKAN: Gabungkan layout dan template anak secara manual
-    full_html = HTML_LAYOUT.replace('{% block content %}{% endblock %}', HTML_PENGELUARAN)
-    return render_template_string(full_html, title="Pengeluaran", kategori_pengeluaran=kategori_pengeluaran, today=today)
+    return render_template("pengeluaran.html", title="Pengeluaran", kategori_pengeluaran=kategori_pengeluaran, today=today)
+
+KELOLA_PER_HALAMAN = 50
+
+def _parse_cursor(nilai):
+    # "Tanggal|ID" dari link halaman berikutnya; None kalau kosong atau rusak
+    if not nilai or "|" not in nilai:
+        return None
+    tgl, rid = nilai.rsplit("|", 1)
+    try:
+        waktu = pd.Timestamp(tgl)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    if pd.isna(waktu) or not rid:
+        return None
+    return (_format_waktu(waktu), rid)
 
 @app.route("/kelola")
 @login_required
 def kelola_page():
     username = session['username']
-    pemasukan_df = load_data("pemasukan.csv", username)
-    if not pemasukan_df.empty:
-        pemasukan_df = pemasukan_df.sort_values(by="Tanggal", ascending=False)
-        
-    pengeluaran_df = load_data("pengeluaran.csv", username)
-    if not pengeluaran_df.empty:
-        pengeluaran_df = pengeluaran_df.sort_values(by="Tanggal", ascending=False)
-    
-    # PERBAIKAN: Gabungkan layout dan template anak secara manual
-    full_html = HTML_LAYOUT.replace('{% block content %}{% endblock %}', HTML_KELOLA_DATA)
-    return render_template_string(full_html, title="Kelola Data", 
-                                  pemasukan_df=pemasukan_df, pengeluaran_df=pengeluaran_df)
+    args = request.args.to_dict()
+    try:
+        per = min(max(int(args.get("per", KELOLA_PER_HALAMAN)), 1), 500)
+    except ValueError:
+        per = KELOLA_PER_HALAMAN
+    urutan = "asc" if args.get("urut") == "asc" else "desc"
+    try:
+        mulai = pd.to_datetime(args["mulai"]) if args.get("mulai") else None
+        akhir = pd.to_datetime(args["akhir"]) + pd.Timedelta(days=1) if args.get("akhir") else None
+    except ValueError:
+        flash("Format tanggal tidak valid.", "danger")
+        mulai = akhir = None
+    filter_kelola = {
+        "mulai": args.get("mulai", ""), "akhir": args.get("akhir", ""),
+        "kategori": args.get("kategori", ""), "metode": args.get("metode", ""),
+        "per": per, "urut": urutan,
+    }
+
+    halaman = {}
+    for tipe in ("pemasukan", "pengeluaran"):
+        df, total, berikut = load_halaman(
+            f"{tipe}.csv", username, per=per, cursor=_parse_cursor(args.get(f"cursor_{tipe}")),
+            urutan=urutan, mulai=mulai, akhir=akhir,
+            kategori=args.get("kategori") or None, metode=args.get("metode") or None,
+        )
+        link_berikut = None
+        if berikut is not None:
+            link_berikut = url_for('kelola_page', **dict(args, **{f"cursor_{tipe}": f"{berikut[0]}|{berikut[1]}"}))
+        link_awal = None
+        if args.get(f"cursor_{tipe}"):
+            link_awal = url_for('kelola_page', **{k: v for k, v in args.items() if k != f"cursor_{tipe}"})
+        halaman[tipe] = {"df": df, "total": total, "berikut": link_berikut, "awal": link_awal}
+
+    return render_template("kelola_data.html", title="Kelola Data", 
+                           pemasukan_df=halaman["pemasukan"]["df"], pengeluaran_df=halaman["pengeluaran"]["df"],
+                           halaman=halaman, filter=filter_kelola, kategori_pengeluaran=kategori_pengeluaran)
+
+@app.route("/impor", methods=["GET", "POST"])
+@login_required
+def impor_page():
+    username = session['username']
+    kolom_impor = list(dict.fromkeys(IMPOR_KOLOM["pemasukan"] + IMPOR_KOLOM["pengeluaran"]))
+    form = {"tipe": "pemasukan", "format_tanggal": "YYYY-MM-DD", "angka_indonesia": False, "pemetaan": {}}
+    errors = None
+
+    if request.method == "POST":
+        form = {
+            "tipe": request.form.get("tipe", "pemasukan"),
+            "format_tanggal": request.form.get("format_tanggal", "YYYY-MM-DD"),
+            "angka_indonesia": request.form.get("angka_indonesia") == "1",
+            "pemetaan": {k: request.form.get(f"kolom_{k}", "").strip() or k for k in kolom_impor},
+        }
+        berkas = request.files.get("berkas")
+        if form["tipe"] not in IMPOR_KOLOM or berkas is None or not berkas.filename:
+            flash("Pilih jenis transaksi dan file CSV.", "danger")
+        else:
+            jumlah, errors = impor_transaksi(form["tipe"], berkas.stream, form["pemetaan"], username,
+                                             form["format_tanggal"], form["angka_indonesia"])
+            if errors.empty:
+                flash(f"{jumlah} transaksi {form['tipe']} berhasil diimpor.", "success")
+                return redirect(url_for('kelola_page'))
+            flash("Impor dibatalkan karena ada data yang tidak valid.", "danger")
+
+    return render_template("impor.html", title="Impor", form=form, errors=errors,
+                           kolom_impor=kolom_impor, format_tanggal=list(IMPOR_FORMAT_TANGGAL))
 
-@app.route("/hapus/<string:tipe>/<int:index>")
+@app.route("/hapus/<string:tipe>/<string:id_transaksi>")
 @login_required
-def hapus_page(tipe, index):
+def hapus_page(tipe, id_transaksi):
     username = session['username']
     if tipe not in ['pemasukan', 'pengeluaran']:
         flash("Tipe transaksi tidak valid.", "danger")
         return redirect(url_for('kelola_page'))
         
-    if hapus_transaksi(tipe, index, username):
-        flash(f"Data {tipe} ID {index} berhasil dihapus dan jurnal pembalikan dibuat.", "success")
+    if hapus_transaksi(tipe, id_transaksi, username):
+        flash(f"Data {tipe} ID {id_transaksi} berhasil dihapus dan jurnal pembalikan dibuat.", "success")
     else:
-        flash(f"Gagal menghapus data {tipe} ID {index}. Mungkin index tidak ditemukan.", "danger")
+        flash(f"Gagal menghapus data {tipe} ID {id_transaksi}. Mungkin ID tidak ditemukan atau sudah dihapus.", "danger")
         
     return redirect(url_for('kelola_page'))
 
+@app.route("/metrics")
+def metrics_page():
+    if not INSTRUMENTASI:
+        return Response("Instrumentasi tidak aktif (TANIAKUN_INSTRUMENTASI=1).", status=404, mimetype="text/plain")
+    return Response(teks_metrik(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/status/cache")
+@login_required
+def status_cache_page():
+    # Hanya untuk admin (TANIAKUN_ADMIN), sama seperti profiling per request
+    if session.get("username") not in ADMIN_USERS:
+        return Response("Tidak ditemukan.", status=404, mimetype="text/plain")
+    return jsonify(dict(cache_stats, max_bytes=CACHE_MAX_BYTES))
+
+@app.route("/export/<string:jenis>")
+@login_required
+def export_page(jenis):
+    # /export/<jenis>?mulai=YYYY-MM-DD&akhir=YYYY-MM-DD[&gzip=1]
+    username = session['username']
+    if jenis not in ("pemasukan", "pengeluaran", "jurnal", "buku_besar"):
+        flash("Jenis export tidak valid.", "danger")
+        return redirect(url_for('laporan_page'))
+    try:
+        mulai = pd.to_datetime(request.args["mulai"]) if request.args.get("mulai") else None
+        akhir = pd.to_datetime(request.args["akhir"]) + pd.Timedelta(days=1) if request.args.get("akhir") else None
+    except ValueError:
+        flash("Format tanggal tidak valid.", "danger")
+        return redirect(url_for('laporan_page'))
+
+    nama_file = f"{jenis}_{username}"
+    if mulai is not None or akhir is not None:
+        nama_file += f"_{request.args.get('mulai', '')}_{request.args.get('akhir', '')}"
+    isi = export_csv(jenis, username, mulai, akhir)
+    if request.args.get("gzip") == "1":
+        return Response(_gzip_stream(isi), mimetype="application/gzip",
+                        headers={"Content-Disposition": f'attachment; filename="{nama_file}.csv.gz"'})
+    return Response((teks.encode("utf-8") for teks in isi), mimetype="text/csv",
+                    headers={"Content-Disposition": f'attachment; filename="{nama_file}.csv"'})
+
+@app.route("/grafik/<jenis>.<fmt>")
+@login_required
+def grafik_page(jenis, fmt):
+    # /grafik/<jenis>.<png|svg>?mulai=YYYY-MM-DD&akhir=YYYY-MM-DD
+    username = session['username']
+    if jenis not in GRAFIK_JENIS or fmt not in GRAFIK_FORMAT:
+        return Response("Grafik tidak dikenal.", status=404, mimetype="text/plain")
+    try:
+        mulai = pd.to_datetime(request.args["mulai"])
+        akhir = pd.to_datetime(request.args["akhir"]) + pd.Timedelta(days=1)
+    except (KeyError, ValueError):
+        return Response("Parameter mulai/akhir tidak valid.", status=400, mimetype="text/plain")
+
+    path = minta_grafik(username, jenis, mulai, akhir, fmt)
+    if path is None:
+        if grafik_gagal(username, jenis, mulai, akhir, fmt):
+            return Response("Grafik gagal dibuat.", status=500, mimetype="text/plain")
+        return Response(GRAFIK_PLACEHOLDER, status=202, mimetype="image/svg+xml",
+                        headers={"Retry-After": "1", "Cache-Control": "no-store"})
+    # Nama file memuat versi data, jadi cocok sebagai ETag
+    resp = send_file(path, mimetype=GRAFIK_FORMAT[fmt], etag=os.path.splitext(os.path.basename(path))[0],
+                     conditional=True, max_age=0)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+@app.route("/job/<string:job_id>")
+@login_required
+def job_page(job_id):
+    job = status_job(job_id, session['username'])
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan."}), 404
+    return jsonify({"id": job["ID"], "status": job["Status"], "error": job["Error"]})
+
 @app.route("/laporan", methods=["GET", "POST"])
 @login_required
 def laporan_page():
@@ -828,8 +4291,9 @@ def laporan_page():
         mulai_str = request.form.get("mulai")
         akhir_str = request.form.get("akhir")
     else:
-        mulai_str = datetime.now().replace(day=1).strftime("%Y-%m-%d")
-        akhir_str = datetime.now().strftime("%Y-%m-%d")
+        # ?mulai=&akhir= dipakai halaman tunggu job saat laporan sudah siap
+        mulai_str = request.args.get("mulai") or datetime.now().replace(day=1).strftime("%Y-%m-%d")
+        akhir_str = request.args.get("akhir") or datetime.now().strftime("%Y-%m-%d")
         
     filter_tanggal = {"mulai": mulai_str, "akhir": akhir_str}
     
@@ -839,88 +4303,255 @@ def laporan_page():
     except ValueError:
         flash("Format tanggal tidak valid.", "danger")
         empty_df = pd.DataFrame(columns=["Tanggal", "Akun", "Debit", "Kredit", "Keterangan"])
-        full_html = HTML_LAYOUT.replace('{% block content %}{% endblock %}', HTML_LAPORAN)
-        return render_template_string(
-            full_html, title="Laporan", filter=filter_tanggal,
-            ringkasan={"total_pemasukan": 0, "total_pengeluaran": 0},
-            laba_rugi={"pendapatan": 0, "beban": 0, "laba_rugi": 0},
-            neraca={"aktiva": 0, "kewajiban": 0, "ekuitas": 0},
-            jurnal_df=empty_df, buku_besar={}
-        )
+        isi = render_laporan_isi({
+            "ringkasan": {"total_pemasukan": 0, "total_pengeluaran": 0},
+            "laba_rugi": {"pendapatan": 0, "beban": 0, "laba_rugi": 0},
+            "neraca": {"aktiva": 0, "kewajiban": 0, "ekuitas": 0},
+            "jurnal": empty_df, "buku_besar": {},
+        }, akhir_str)
+        return render_template("laporan.html", title="Laporan", filter=filter_tanggal, isi=isi)
 
-    # Load data
-    pemasukan_df = load_data("pemasukan.csv", username)
-    pengeluaran_df = load_data("pengeluaran.csv", username)
-    jurnal_df = load_data("jurnal.csv", username)
+    if LAPORAN_STREAM:
+        # Grafik yang belum ada tidak digambar di sini (TTFB); gambarnya
+        # dijadwalkan oleh /grafik saat diminta browser
+        grafik = [{
+            "judul": judul,
+            "url": url_for('grafik_page', jenis=jenis, fmt="png", mulai=mulai_str, akhir=akhir_str),
+            "siap": not GRAFIK_WORKERS or os.path.exists(_grafik_path(username, jenis, mulai_dt, akhir_dt, "png")),
+        } for jenis, judul in GRAFIK_JENIS.items()]
+        # Flash diambil sekarang, selagi cookie sesi masih bisa ditulis
+        get_flashed_messages(with_categories=True)
+        isi = stream_template("laporan.html", title="Laporan", filter=filter_tanggal, grafik=grafik,
+                              bagian=_bagian_malas(username, mulai_dt, akhir_dt))
+        return Response(_alirkan(isi), mimetype="text/html", headers={"X-Accel-Buffering": "no"})
 
-    for df in [pemasukan_df, pengeluaran_df, jurnal_df]:
-        if not df.empty and "Tanggal" in df.columns:
-            df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors='coerce')
-    
-    pemasukan_df_f = pemasukan_df[(pemasukan_df['Tanggal'] >= mulai_dt) & (pemasukan_df['Tanggal'] < akhir_dt)] if not pemasukan_df.empty else pd.DataFrame(columns=pemasukan_df.columns)
-    pengeluaran_df_f = pengeluaran_df[(pengeluaran_df['Tanggal'] >= mulai_dt) & (pengeluaran_df['Tanggal'] < akhir_dt)] if not pengeluaran_df.empty else pd.DataFrame(columns=pengeluaran_df.columns)
-    jurnal_df_f = jurnal_df[(jurnal_df['Tanggal'] >= mulai_dt) & (jurnal_df['Tanggal'] < akhir_dt)] if not jurnal_df.empty else pd.DataFrame(columns=jurnal_df.columns)
-    
-    ringkasan = {
-        "total_pemasukan": pemasukan_df_f['Jumlah'].sum() if not pemasukan_df_f.empty else 0,
-        "total_pengeluaran": pengeluaran_df_f['Jumlah'].sum() if not pengeluaran_df_f.empty else 0
-    }
+    # Dihitung dan dirender di antrean job; laporan kecil biasanya selesai
+    # dalam LAPORAN_TUNGGU, yang besar ditunggu halaman lewat polling
+    job = kirim_job(username, "laporan", {"mulai": _format_waktu(mulai_dt), "akhir": _format_waktu(akhir_dt),
+                                          "akhir_tampil": akhir_str})
+    if job["Status"] in ("antre", "jalan"):
+        job = tunggu_job(job, LAPORAN_TUNGGU)
+    isi = hasil_job(job) if job["Status"] == "selesai" else None
+    if isi is None:
+        return render_template("laporan.html", title="Laporan", filter=filter_tanggal, job=job)
 
-    pendapatan = 0
-    beban = 0
-    if not jurnal_df_f.empty:
-        pendapatan = jurnal_df_f[jurnal_df_f['Akun'].str.contains("Pendapatan", na=False)]['Kredit'].sum()
-        beban_akun = list(kategori_pengeluaran.keys())
-        for subs in kategori_pengeluaran.values():
-            beban_akun.extend(subs)
-        beban = jurnal_df_f[jurnal_df_f['Akun'].isin(beban_akun)]['Debit'].sum()
-        
-    laba_rugi_data = {"pendapatan": pendapatan, "beban": beban, "laba_rugi": pendapatan - beban}
+    # Grafik: dijadwalkan sekarang, gambar yang belum jadi dimuat ulang oleh halaman
+    grafik = [{
+        "judul": judul,
+        "url": url_for('grafik_page', jenis=jenis, fmt="png", mulai=mulai_str, akhir=akhir_str),
+        "siap": not GRAFIK_WORKERS or minta_grafik(username, jenis, mulai_dt, akhir_dt) is not None,
+    } for jenis, judul in GRAFIK_JENIS.items()]
 
-    jurnal_total = jurnal_df[jurnal_df['Tanggal'] < akhir_dt] if not jurnal_df.empty else pd.DataFrame(columns=jurnal_df.columns)
-    
-    aktiva, kewajiban, ekuitas = 0, 0, 0
-    if not jurnal_total.empty:
-        aktiva_akun = ['Kas', 'Bank', 'Piutang Dagang']
-        kewajiban_akun = ['Utang Dagang']
-        
-        aktiva = jurnal_total[jurnal_total['Akun'].isin(aktiva_akun)]['Debit'].sum() - \
-                 jurnal_total[jurnal_total['Akun'].isin(aktiva_akun)]['Kredit'].sum()
-        kewajiban = jurnal_total[jurnal_total['Akun'].isin(kewajiban_akun)]['Kredit'].sum() - \
-                    jurnal_total[jurnal_total['Akun'].isin(kewajiban_akun)]['Debit'].sum()
-        
-        pendapatan_total = jurnal_total[jurnal_total['Akun'].str.contains("Pendapatan", na=False)]['Kredit'].sum()
-        beban_akun_total = list(kategori_pengeluaran.keys())
-        for subs in kategori_pengeluaran.values():
-            beban_akun_total.extend(subs)
-        beban_total = jurnal_total[jurnal_total['Akun'].isin(beban_akun_total)]['Debit'].sum()
-        ekuitas = pendapatan_total - beban_total
-
-    neraca_data = {"aktiva": aktiva, "kewajiban": kewajiban, "ekuitas": ekuitas}
-
-    buku_besar_data = {}
-    if not jurnal_df_f.empty:
-        akun_list = sorted(jurnal_df_f['Akun'].unique())
-        for akun in akun_list:
-            df_akun = jurnal_df_f[jurnal_df_f['Akun'] == akun].copy().sort_values("Tanggal")
-            saldo = 0
-            saldos = []
-            for _, row in df_akun.iterrows():
-                saldo += (row['Debit'] - row['Kredit'])
-                saldos.append(saldo)
-            df_akun['Saldo'] = saldos
-            buku_besar_data[akun] = df_akun
-
-    # PERBAIKAN: Gabungkan layout dan template anak secara manual
-    full_html = HTML_LAYOUT.replace('{% block content %}{% endblock %}', HTML_LAPORAN)
-    return render_template_string(
-        full_html, 
+    return render_template(
+        "laporan.html",
         title="Laporan",
         filter=filter_tanggal,
-        ringkasan=ringkasan,
-        laba_rugi=laba_rugi_data,
-        neraca=neraca_data,
-        jurnal_df=jurnal_df_f.sort_values(by="Tanggal") if not jurnal_df_f.empty else pd.DataFrame(),
-        buku_besar=buku_besar_data
+        isi=isi,
+        grafik=grafik
+    )
+
+# ---------------- API JSON v1 ----------------
+# /api/v1/... untuk aplikasi mobile dan dashboard, memakai sesi login yang
+# sama dengan halaman web (POST /api/v1/login). Respon GET membawa ETag dari
+# versi_data + URL, jadi polling yang datanya belum berubah dijawab 304
+# tanpa memuat data. ?fields=a,b membatasi kolom (transaksi) atau bagian
+# (laporan) yang dikirim.
+
+API_TIPE = ("pemasukan", "pengeluaran")
+
+def _api_error(pesan, status):
+    return jsonify({"error": pesan}), status
+
+def _api_fields(tersedia):
+    # Hasil: (daftar field, error). Tanpa ?fields= semua field dikirim.
+    nilai = request.args.get("fields")
+    if not nilai:
+        return list(tersedia), None
+    fields = [f.strip() for f in nilai.split(",") if f.strip()]
+    asing = [f for f in fields if f not in tersedia]
+    if asing:
+        return None, f"Field tidak dikenal: {', '.join(asing)}"
+    return fields, None
+
+def _api_etag(username, *tambahan):
+    return hashlib.sha1(repr((username, versi_data(username), request.full_path) + tambahan).encode()).hexdigest()[:20]
+
+def _api_tidak_berubah(etag):
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+    return None
+
+def _api_json(data, etag):
+    resp = jsonify(data)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+def _api_records(df, kolom):
+    if df.empty:
+        return []
+    df = df[kolom].astype(object)
+    if "Tanggal" in df.columns:
+        df["Tanggal"] = [_format_waktu(t) if isinstance(t, datetime) and pd.notna(t) else t for t in df["Tanggal"]]
+    return df.where(df.notna(), None).to_dict("records")
+
+def _api_transaksi(tipe, body):
+    # Validasi body POST. Hasil: (argumen simpan_pemasukan/simpan_pengeluaran, error)
+    if not isinstance(body, dict):
+        return None, "Body harus berupa objek JSON."
+    # bool turunan int di Python: true/false JSON bukan nominal
+    jumlah = body.get("Jumlah")
+    if isinstance(jumlah, bool) or not isinstance(jumlah, (int, float)):
+        return None, "Jumlah harus berupa angka."
+    try:
+        jumlah = float(jumlah)
+    except OverflowError:
+        return None, PESAN_RUPIAH
+    for kolom in ("Metode", "Sumber", "Kategori", "Sub Kategori"):
+        if body.get(kolom) is not None and not isinstance(body[kolom], str):
+            return None, f"{kolom} harus berupa teks."
+    if not 0 < jumlah < float("inf"):
+        return None, "Jumlah harus lebih dari 0."
+    if not _rupiah_bulat(jumlah):
+        return None, PESAN_RUPIAH
+    tanggal = str(body.get("Tanggal") or datetime.now().strftime("%Y-%m-%d"))
+    try:
+        waktu = datetime.strptime(tanggal, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        try:
+            waktu = datetime.combine(datetime.strptime(tanggal, "%Y-%m-%d").date(), datetime.now().time())
+        except ValueError:
+            return None, "Tanggal harus YYYY-MM-DD atau YYYY-MM-DD HH:MM:SS."
+    data = {"waktu": waktu.strftime("%Y-%m-%d %H:%M:%S"), "jumlah": jumlah,
+            "metode": body.get("Metode"), "deskripsi": str(body.get("Keterangan") or "")}
+
+    if tipe == "pemasukan":
+        if data["metode"] not in metode_pemasukan:
+            return None, f"Metode harus salah satu dari: {', '.join(metode_pemasukan)}"
+        if body.get("Sumber") not in kategori_pemasukan["Sumber Pemasukan"]:
+            return None, "Sumber tidak dikenal."
+        data["sumber"] = body["Sumber"]
+    else:
+        if data["metode"] not in metode_pengeluaran:
+            return None, f"Metode harus salah satu dari: {', '.join(metode_pengeluaran)}"
+        if body.get("Kategori") not in kategori_pengeluaran:
+            return None, "Kategori tidak dikenal."
+        if body.get("Sub Kategori") not in kategori_pengeluaran[body["Kategori"]]:
+            return None, "Sub Kategori tidak cocok dengan Kategori."
+        data["kategori"], data["sub_kategori"] = body["Kategori"], body["Sub Kategori"]
+    return data, None
+
+@app.route("/api/v1/login", methods=["POST"])
+def api_login():
+    body = request.get_json(silent=True) or {}
+    username = str(body.get("username", "")).strip()
+    password = str(body.get("password", "")).strip()
+    if not username or not password or not validate_login(username, password):
+        return _api_error("Username atau password salah.", 401)
+    session['logged_in'] = True
+    session['username'] = username
+    return jsonify({"username": username})
+
+@app.route("/api/v1/logout", methods=["POST"])
+def api_logout():
+    session.clear()
+    return Response(status=204)
+
+@app.route("/api/v1/laporan")
+@api_login_required
+def api_laporan():
+    # /api/v1/laporan?mulai=YYYY-MM-DD&akhir=YYYY-MM-DD&fields=ringkasan,neraca
+    username = session['username']
+    fields, error = _api_fields(LAPORAN_BAGIAN)
+    if error:
+        return _api_error(error, 400)
+    mulai_str = request.args.get("mulai") or datetime.now().replace(day=1).strftime("%Y-%m-%d")
+    akhir_str = request.args.get("akhir") or datetime.now().strftime("%Y-%m-%d")
+    try:
+        mulai = pd.to_datetime(mulai_str)
+        akhir = pd.to_datetime(akhir_str) + pd.Timedelta(days=1)
+    except ValueError:
+        return _api_error("Format tanggal tidak valid.", 400)
+
+    # Rentang default ikut tanggal hari ini, jadi ikut masuk ETag
+    etag = _api_etag(username, mulai_str, akhir_str)
+    tidak_berubah = _api_tidak_berubah(etag)
+    if tidak_berubah is not None:
+        return tidak_berubah
+
+    laporan = hitung_laporan(username, mulai, akhir, fields)
+    hasil = {"mulai": mulai_str, "akhir": akhir_str}
+    for bagian in fields:
+        if bagian == "jurnal":
+            hasil[bagian] = _api_records(laporan[bagian], COLUMNS_MAP["jurnal.csv"])
+        elif bagian == "buku_besar":
+            hasil[bagian] = {str(akun): _api_records(df, ["Tanggal", "Debit", "Kredit", "Keterangan", "Saldo"])
+                             for akun, df in laporan[bagian].items()}
+        else:
+            hasil[bagian] = laporan[bagian]
+    return _api_json(hasil, etag)
+
+@app.route("/api/v1/<string:tipe>", methods=["GET"])
+@api_login_required
+def api_daftar(tipe):
+    # ?per=&cursor=&urut=asc|desc&mulai=&akhir=&kategori=&metode=&fields=
+    username = session['username']
+    if tipe not in API_TIPE:
+        return _api_error("Tipe transaksi tidak valid.", 404)
+    fields, error = _api_fields([k for k in COLUMNS_MAP[f"{tipe}.csv"] if k != "Username"])
+    if error:
+        return _api_error(error, 400)
+    args = request.args
+    try:
+        per = min(max(int(args.get("per", KELOLA_PER_HALAMAN)), 1), 500)
+        mulai = pd.to_datetime(args["mulai"]) if args.get("mulai") else None
+        akhir = pd.to_datetime(args["akhir"]) + pd.Timedelta(days=1) if args.get("akhir") else None
+    except ValueError:
+        return _api_error("Parameter per/mulai/akhir tidak valid.", 400)
+    cursor = _parse_cursor(args.get("cursor"))
+    if args.get("cursor") and cursor is None:
+        return _api_error("Parameter cursor tidak valid.", 400)
+
+    etag = _api_etag(username)
+    tidak_berubah = _api_tidak_berubah(etag)
+    if tidak_berubah is not None:
+        return tidak_berubah
+
+    df, total, berikut = load_halaman(
+        f"{tipe}.csv", username, per=per, cursor=cursor,
+        urutan="asc" if args.get("urut") == "asc" else "desc", mulai=mulai, akhir=akhir,
+        kategori=args.get("kategori") or None, metode=args.get("metode") or None,
     )
+    return _api_json({
+        "data": _api_records(df, fields),
+        "total": total,
+        "berikutnya": f"{berikut[0]}|{berikut[1]}" if berikut is not None else None,
+    }, etag)
 
+@app.route("/api/v1/<string:tipe>", methods=["POST"])
+@api_login_required
+def api_tambah(tipe):
+    username = session['username']
+    if tipe not in API_TIPE:
+        return _api_error("Tipe transaksi tidak valid.", 404)
+    data, error = _api_transaksi(tipe, request.get_json(silent=True))
+    if error:
+        return _api_error(error, 400)
+    if tipe == "pemasukan":
+        baris = simpan_pemasukan(username, **data)
+    else:
+        baris = simpan_pengeluaran(username, **data)
+    return jsonify({k: v for k, v in baris.items() if k != "Username"}), 201
+
+@app.route("/api/v1/<string:tipe>/<string:id_transaksi>", methods=["DELETE"])
+@api_login_required
+def api_hapus(tipe, id_transaksi):
+    username = session['username']
+    if tipe not in API_TIPE:
+        return _api_error("Tipe transaksi tidak valid.", 404)
+    if not hapus_transaksi(tipe, id_transaksi, username):
+        return _api_error("ID tidak ditemukan atau sudah dihapus.", 404)
+    return Response(status=204)
@@ -0,0 +1,1274 @@
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import app as taniakun
+
+
+# ---------------- Helper ----------------
+
+def buat_jurnal_dummy(n, hari=3 * 365):
+    # n baris jurnal (n/2 pasangan debit/kredit) tersebar rata selama `hari` hari
+    awal = pd.Timestamp("2021-01-01 08:00:00")
+    langkah = pd.Timedelta(days=hari) / max(n // 2, 1)
+    rows = []
+    for i in range(n // 2):
+        waktu = (awal + langkah * i).strftime("%Y-%m-%d %H:%M:%S")
+        rows.extend(taniakun.buat_jurnal(waktu, "Kas", "Pendapatan", 1000 + i, f"Dummy {i}"))
+    return pd.DataFrame(rows, columns=taniakun.COLUMNS_MAP["jurnal.csv"])
+
+
+def buat_pengeluaran_dummy(n, hari=3 * 365):
+    awal = pd.Timestamp("2021-01-01 08:00:00")
+    langkah = pd.Timedelta(days=hari) / max(n, 1)
+    kategori = list(taniakun.kategori_pengeluaran.items())
+    rows = []
+    for i in range(n):
+        kat, subs = kategori[i % len(kategori)]
+        rows.append({
+            "Tanggal": (awal + langkah * i).strftime("%Y-%m-%d %H:%M:%S"), "Kategori": kat,
+            "Sub Kategori": subs[i % len(subs)], "Jumlah": 1000 + i, "Keterangan": f"Dummy {i}",
+            "Metode": ["Tunai", "Transfer", "Utang"][i % 3], "Username": "bench",
+        })
+    return pd.DataFrame(rows, columns=taniakun.COLUMNS_MAP["pengeluaran.csv"])
+
+
+def klien_login(username):
+    klien = taniakun.app.test_client()
+    with klien.session_transaction() as sesi:
+        sesi["logged_in"] = True
+        sesi["username"] = username
+    return klien
+
+
+def rss_puncak_mb():
+    # Puncak RSS proses ini. VmHWM dipakai kalau ada: ru_maxrss proses spawn
+    # ikut membawa RSS proses induk saat fork (sebelum exec)
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for baris in f:
+                if baris.startswith("VmHWM:"):
+                    return int(baris.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def ukur(fn, ulang):
+    waktu = []
+    for _ in range(ulang):
+        t0 = time.perf_counter()
+        fn()
+        waktu.append(time.perf_counter() - t0)
+    waktu.sort()
+    return waktu[len(waktu) // 2] * 1000
+
+
+def append_lama(data, base_filename, username):
+    # Jalur lama: load -> concat -> tulis ulang seluruh file
+    df = taniakun.load_data(base_filename, username)
+    df = pd.concat([df, pd.DataFrame(data)], ignore_index=True)
+    df.to_csv(taniakun.get_user_file(base_filename, username), index=False)
+
+
+# ---------------- Benchmark ----------------
+
+def bench_append(ukuran, ulang):
+    print("== append_data: latensi per entri (pasangan debit/kredit) ==")
+    print(f"{'baris jurnal':>14} {'append (ms)':>12} {'lama (ms)':>12}")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        jurnal = taniakun.buat_jurnal("2024-02-01 08:00:00", "Kas", "Pendapatan", 5000, "Bench")
+        baru = ukur(lambda: taniakun.append_data(jurnal, "jurnal.csv", "bench"), ulang)
+        lama = ukur(lambda: append_lama(jurnal, "jurnal.csv", "bench"), min(ulang, 5))
+        print(f"{n:>14} {baru:>12.3f} {lama:>12.3f}")
+
+
+def bench_backend(ukuran, ulang):
+    print("== laporan 1 bulan: backend csv vs sqlite ==")
+    print(f"{'baris jurnal':>14} {'backend':>8} {'load (ms)':>10} {'laporan (ms)':>13}")
+    rentang = {"mulai": "2023-06-01", "akhir": "2023-06-30"}
+    mulai, akhir = pd.Timestamp("2023-06-01"), pd.Timestamp("2023-07-01")
+    backend_awal = taniakun.STORAGE_BACKEND
+    for n in ukuran:
+        jurnal = buat_jurnal_dummy(n)
+        for backend in ("csv", "sqlite"):
+            taniakun.STORAGE_BACKEND = backend
+            taniakun.save_data(jurnal, "jurnal.csv", "bench")
+            load = ukur(lambda: taniakun.load_data("jurnal.csv", "bench", mulai=mulai, akhir=akhir), min(ulang, 10))
+            klien = klien_login("bench")
+            laporan = ukur(lambda: klien.post("/laporan", data=rentang), min(ulang, 5))
+            print(f"{n:>14} {backend:>8} {load:>10.1f} {laporan:>13.1f}")
+    taniakun.STORAGE_BACKEND = backend_awal
+
+
+def saldo_full_scan(username, akhir):
+    # Perhitungan Neraca lama: scan seluruh jurnal dengan Tanggal < akhir
+    jurnal_df = taniakun.load_data("jurnal.csv", username)
+    jurnal_df["Tanggal"] = pd.to_datetime(jurnal_df["Tanggal"], errors="coerce")
+    jurnal_df = jurnal_df[jurnal_df["Tanggal"] < akhir]
+    return jurnal_df.groupby(jurnal_df["Akun"].astype(str))[["Debit", "Kredit"]].sum()
+
+
+def cek_snapshot_acak(username, jumlah_transaksi, seed):
+    # Aliran transaksi acak (termasuk tanggal mundur dan jurnal pembalikan),
+    # lalu bandingkan saldo_per_akun dengan full scan di tanggal acak.
+    rng = random.Random(seed)
+    akun = ["Kas", "Bank", "Piutang Dagang", "Utang Dagang", "Pendapatan", "Urea", "Sabit"]
+    for i in range(jumlah_transaksi):
+        waktu = pd.Timestamp("2023-01-01") + pd.Timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        debit, kredit = rng.sample(akun, 2)
+        jurnal = taniakun.buat_jurnal(waktu.strftime("%Y-%m-%d %H:%M:%S"), debit, kredit,
+                                      rng.randrange(1, 10_000_000), f"Acak {i}")
+        taniakun.append_data(jurnal, "jurnal.csv", username)
+        if rng.random() < 0.1:
+            taniakun.append_data(taniakun.buat_jurnal(jurnal[0]["Tanggal"], kredit, debit, jurnal[0]["Debit"], "Batal"),
+                                 "jurnal.csv", username)
+    for _ in range(20):
+        akhir = pd.Timestamp("2022-12-01") + pd.Timedelta(hours=rng.randrange(26 * 31 * 24))
+        if rng.random() < 0.5:
+            akhir = akhir.normalize().replace(day=1)
+        cepat = taniakun.saldo_per_akun(username, akhir=akhir).sort_index()
+        lambat = saldo_full_scan(username, akhir).sort_index()
+        cepat = cepat[(cepat["Debit"] != 0) | (cepat["Kredit"] != 0)]
+        lambat = lambat[(lambat["Debit"] != 0) | (lambat["Kredit"] != 0)]
+        pd.testing.assert_frame_equal(cepat, lambat, check_dtype=False, check_names=False, check_index_type=False)
+
+
+def bench_saldo(ukuran, ulang):
+    print("== saldo Neraca: snapshot vs full scan ==")
+    for seed in range(5):
+        cek_snapshot_acak(f"acak{seed}", 300, seed)
+    print("cek acak: snapshot == full scan (5 aliran transaksi)")
+    print(f"{'baris jurnal':>14} {'snapshot (ms)':>14} {'full scan (ms)':>15}")
+    akhir = pd.Timestamp("2023-07-01")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        taniakun.saldo_per_akun("bench", akhir=akhir)
+        cepat = ukur(lambda: taniakun.saldo_per_akun("bench", akhir=akhir), ulang)
+        lambat = ukur(lambda: saldo_full_scan("bench", akhir), min(ulang, 5))
+        print(f"{n:>14} {cepat:>14.2f} {lambat:>15.2f}")
+
+
+def buku_besar_lama(jurnal_df_f):
+    # Loop lama laporan_page: per akun copy + sort + iterrows
+    buku_besar_data = {}
+    for akun in sorted(jurnal_df_f['Akun'].unique()):
+        df_akun = jurnal_df_f[jurnal_df_f['Akun'] == akun].copy().sort_values("Tanggal")
+        saldo = 0
+        saldos = []
+        for _, row in df_akun.iterrows():
+            saldo += (row['Debit'] - row['Kredit'])
+            saldos.append(saldo)
+        df_akun['Saldo'] = saldos
+        buku_besar_data[akun] = df_akun
+    return buku_besar_data
+
+
+def bench_buku_besar(ukuran, ulang):
+    print("== buku besar: vectorized vs loop iterrows ==")
+    print(f"{'baris jurnal':>14} {'vectorized (ms)':>16} {'loop (ms)':>10}")
+    for n in ukuran:
+        jurnal_df = buat_jurnal_dummy(n)
+        jurnal_df["Tanggal"] = pd.to_datetime(jurnal_df["Tanggal"])
+        baru = ukur(lambda: taniakun.buat_buku_besar(jurnal_df), min(ulang, 10))
+        lama = ukur(lambda: buku_besar_lama(jurnal_df), min(ulang, 3))
+        print(f"{n:>14} {baru:>16.1f} {lama:>10.1f}")
+
+
+def bench_cache(ukuran, ulang):
+    print("== load_data: cache hit vs pd.read_csv ==")
+    print(f"{'baris jurnal':>14} {'cache (ms)':>11} {'read_csv (ms)':>14}")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        taniakun.load_data("jurnal.csv", "bench")
+        cache = ukur(lambda: taniakun.load_data("jurnal.csv", "bench"), ulang)
+        baca = ukur(lambda: pd.read_csv(taniakun.get_user_file("jurnal.csv", "bench")), min(ulang, 5))
+        print(f"{n:>14} {cache:>11.2f} {baca:>14.2f}")
+    print(taniakun.cache_stats)
+
+
+def bench_template(ukuran, ulang):
+    # ukuran tidak dipakai: halaman / dan /pemasukan tidak bergantung data
+    from flask import render_template_string, session
+    print("== render template: req/detik (/ dan /pemasukan) ==")
+    halaman = {
+        "/": ("index.html", taniakun.HTML_INDEX, {"title": "Beranda"}),
+        "/pemasukan": ("pemasukan.html", taniakun.HTML_PEMASUKAN,
+                       {"title": "Pemasukan", "kategori_pemasukan": taniakun.kategori_pemasukan, "today": "2024-01-01"}),
+    }
+    n = max(ulang, 200)
+    print(f"{'rute':>12} {'string (rps)':>13} {'cached (rps)':>13} {'test client (rps)':>18}")
+    klien = klien_login("bench")
+    for rute, (nama, konten, konteks) in halaman.items():
+        with taniakun.app.test_request_context(rute):
+            session["logged_in"], session["username"] = True, "bench"
+            t0 = time.perf_counter()
+            for _ in range(n):
+                full_html = taniakun.HTML_LAYOUT.replace('{% block content %}{% endblock %}', konten)
+                render_template_string(full_html, **konteks)
+            lama = n / (time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            for _ in range(n):
+                taniakun.render_template(nama, **konteks)
+            baru = n / (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            klien.get(rute)
+        klien_rps = n / (time.perf_counter() - t0)
+        print(f"{rute:>12} {lama:>13.0f} {baru:>13.0f} {klien_rps:>18.0f}")
+
+
+def bench_kelola(ukuran, ulang):
+    print("== /kelola: halaman pertama & halaman dengan cursor ==")
+    print(f"{'baris':>10} {'backend':>8} {'hal. 1 (ms)':>12} {'cursor (ms)':>12}")
+    backend_awal = taniakun.STORAGE_BACKEND
+    for n in ukuran:
+        pengeluaran = buat_pengeluaran_dummy(n)
+        for backend in ("csv", "sqlite"):
+            taniakun.STORAGE_BACKEND = backend
+            taniakun.save_data(pengeluaran, "pengeluaran.csv", "bench")
+            klien = klien_login("bench")
+            pertama = ukur(lambda: klien.get("/kelola"), min(ulang, 10))
+            _, _, cursor = taniakun.load_halaman("pengeluaran.csv", "bench", cursor=None)
+            url = f"/kelola?cursor_pengeluaran={cursor[0]}|{cursor[1]}&kategori=Pupuk"
+            berikut = ukur(lambda: klien.get(url), min(ulang, 10))
+            print(f"{n:>10} {backend:>8} {pertama:>12.1f} {berikut:>12.1f}")
+    taniakun.STORAGE_BACKEND = backend_awal
+
+
+def bench_hapus(ukuran, ulang):
+    print("== hapus_transaksi: tombstone + jurnal pembalikan ==")
+    print(f"{'baris':>10} {'hapus (ms)':>11}")
+    for n in ukuran:
+        taniakun.save_data(buat_pengeluaran_dummy(n), "pengeluaran.csv", "bench")
+        ids = iter(taniakun.load_data("pengeluaran.csv", "bench")["ID"].sample(ulang + 1, random_state=0))
+        taniakun.hapus_transaksi("pengeluaran", next(ids), "bench")
+        hapus = ukur(lambda: taniakun.hapus_transaksi("pengeluaran", next(ids), "bench"), ulang)
+        print(f"{n:>10} {hapus:>11.2f}")
+
+
+def _pekerja_post(username, n_thread, n_post, seed):
+    # Satu proses worker: n_thread thread, masing-masing n_post POST
+    # bergantian /pemasukan dan /pengeluaran dengan metode acak.
+    def jalan(i):
+        rng = random.Random(seed * 1000 + i)
+        klien = klien_login(username)
+        for j in range(n_post):
+            metode = rng.choice(["Tunai", "Transfer", "Piutang", "Utang"])
+            tanggal = f"2024-0{rng.randrange(1, 10)}-1{rng.randrange(10)}"
+            if j % 2 == 0:
+                klien.post("/pemasukan", data={"tanggal": tanggal, "sumber": "Penjualan Padi",
+                                               "jumlah": str(rng.randrange(1, 10**7)), "metode": metode, "deskripsi": "stress"})
+            else:
+                klien.post("/pengeluaran", data={"tanggal": tanggal, "kategori": "Pupuk", "sub_kategori": "Urea",
+                                                 "jumlah": str(rng.randrange(1, 10**7)), "metode": metode, "deskripsi": "stress"})
+    thread = [threading.Thread(target=jalan, args=(i,)) for i in range(n_thread)]
+    for t in thread:
+        t.start()
+    for t in thread:
+        t.join()
+
+
+def bench_tulis_paralel(ukuran, ulang):
+    # ukuran tidak dipakai. Beberapa proses x thread menulis user yang sama,
+    # compaction sengaja sering supaya tulis ulang penuh ikut berbenturan.
+    # Tiap thread paling sedikit 250 POST (2.000 POST per konfigurasi).
+    ulang = max(ulang, 250)
+    print("== tulis paralel: proses x thread POST ke user yang sama ==")
+    print(f"{'proses':>7} {'thread':>7} {'POST':>7} {'POST/detik':>11} {'debit == kredit':>16}")
+    ctx = multiprocessing.get_context("fork")
+    compact_awal = taniakun.COMPACT_EVERY
+    taniakun.COMPACT_EVERY = 500
+    for n_proses, n_thread in ((1, 8), (4, 4), (8, 2)):
+        username = f"paralel{n_proses}"
+        t0 = time.perf_counter()
+        proses = [ctx.Process(target=_pekerja_post, args=(username, n_thread, ulang, p)) for p in range(n_proses)]
+        for p in proses:
+            p.start()
+        for p in proses:
+            p.join()
+            assert p.exitcode == 0, p.exitcode
+        durasi = time.perf_counter() - t0
+        total = n_proses * n_thread * ulang
+
+        # Cache divalidasi mtime/ukuran, jadi ini membaca hasil akhir di disk
+        jurnal = taniakun.load_data("jurnal.csv", username)
+        transaksi = len(taniakun.load_data("pemasukan.csv", username)) + len(taniakun.load_data("pengeluaran.csv", username))
+        assert transaksi == total, (transaksi, total)
+        assert len(jurnal) == 2 * total, (len(jurnal), total)
+        assert jurnal["ID"].is_unique
+        seimbang = jurnal["Debit"].sum() == jurnal["Kredit"].sum()
+        assert seimbang
+        print(f"{n_proses:>7} {n_thread:>7} {total:>7} {total / durasi:>11.0f} {str(seimbang):>16}")
+    taniakun.COMPACT_EVERY = compact_awal
+
+
+def login_lama(username, password):
+    # Jalur lama: baca seluruh akun.csv ke pandas lalu filter
+    akun_df = taniakun.load_user_accounts()
+    hashed_pw = taniakun._sha256_lama(password)
+    return not akun_df[(akun_df['Username'] == username) & (akun_df['Password'] == hashed_pw)].empty
+
+
+def bench_login(ukuran, ulang):
+    # ukuran tidak dipakai: jumlah akun tetap 100 / 10rb / 1jt. Biaya KDF
+    # diturunkan supaya yang terukur adalah lookup akun, bukan scrypt.
+    print("== login: index akun vs scan akun.csv ==")
+    print(f"{'akun':>10} {'index (ms)':>11} {'register (ms)':>14} {'scan (ms)':>10}")
+    kdf_awal = taniakun.KDF_N, taniakun.KDF_WORKERS
+    taniakun.KDF_N, taniakun.KDF_WORKERS = 2, 0
+    hash_pw = taniakun._sha256_lama("rahasia")
+    for n in (100, 10_000, 1_000_000):
+        with open(os.path.join(taniakun.APP_DIR, "akun.csv"), "w", encoding="utf-8") as f:
+            f.write("Username,Password\n" + "".join(f"petani{i},{hash_pw}\n" for i in range(n)))
+        target = f"petani{n - 1}"
+        assert login_lama(target, "rahasia")
+        # Login pertama meng-hash ulang entri SHA-256 lama target
+        assert taniakun.validate_login(target, "rahasia") and not taniakun.validate_login(target, "salah")
+        cepat = ukur(lambda: taniakun.validate_login(target, "rahasia"), ulang)
+        baru = iter(range(ulang))
+        daftar = ukur(lambda: taniakun.register_user(f"baru{next(baru)}", "rahasia"), ulang)
+        lambat = ukur(lambda: login_lama(f"petani{n - 2}", "rahasia"), min(ulang, 3))
+        print(f"{n:>10} {cepat:>11.4f} {daftar:>14.3f} {lambat:>10.1f}")
+    taniakun.KDF_N, taniakun.KDF_WORKERS = kdf_awal
+
+
+def bench_login_beban(ukuran, ulang):
+    # ukuran tidak dipakai. Banyak thread login terus-menerus, satu thread
+    # lain mengukur latensi GET / selama itu: scrypt di thread request
+    # (KDF_WORKERS=0) vs di process pool.
+    print("== beban login: login/detik dan latensi rute lain ==")
+    print(f"{'kdf':>10} {'login/detik':>12} {'/ p50 (ms)':>11} {'/ p99 (ms)':>11}")
+    workers_awal = taniakun.KDF_WORKERS
+    taniakun.register_user("beban", "rahasia")
+    for mode, workers in (("langsung", 0), ("pool", workers_awal or 2)):
+        taniakun.KDF_WORKERS = workers
+        selesai = threading.Event()
+        jumlah_login = [0]
+
+        def login():
+            while not selesai.is_set():
+                # Klien baru tiap kali: sesi yang sudah login langsung di-redirect
+                r = taniakun.app.test_client().post("/login", data={"username": "beban", "password": "rahasia", "mode": "Login"})
+                assert r.headers["Location"] == "/"
+                jumlah_login[0] += 1
+
+        thread = [threading.Thread(target=login) for _ in range(8)]
+        for t in thread:
+            t.start()
+        klien = klien_login("beban")
+        t0 = time.perf_counter()
+        latensi = []
+        for _ in range(max(ulang, 100)):
+            t1 = time.perf_counter()
+            klien.get("/")
+            latensi.append((time.perf_counter() - t1) * 1000)
+            time.sleep(0.01)
+        durasi = time.perf_counter() - t0
+        selesai.set()
+        for t in thread:
+            t.join()
+        latensi.sort()
+        p99 = latensi[min(len(latensi) - 1, int(len(latensi) * 0.99))]
+        print(f"{mode:>10} {jumlah_login[0] / durasi:>12.1f} {latensi[len(latensi) // 2]:>11.2f} {p99:>11.2f}")
+    taniakun.KDF_WORKERS = workers_awal
+
+
+def ringkasan_mentah(username, mulai, akhir):
+    # Jalur lama laporan_page: jumlahkan baris mentah dalam rentang
+    pemasukan = taniakun.load_data("pemasukan.csv", username, mulai=mulai, akhir=akhir)
+    pengeluaran = taniakun.load_data("pengeluaran.csv", username, mulai=mulai, akhir=akhir)
+    jurnal = taniakun.load_data("jurnal.csv", username, mulai=mulai, akhir=akhir)
+    beban_akun = list(taniakun.kategori_pengeluaran) + [s for subs in taniakun.kategori_pengeluaran.values() for s in subs]
+    return (pemasukan["Jumlah"].sum() if not pemasukan.empty else 0,
+            pengeluaran["Jumlah"].sum() if not pengeluaran.empty else 0,
+            jurnal[jurnal["Akun"].str.contains("Pendapatan", na=False)]["Kredit"].sum() if not jurnal.empty else 0,
+            jurnal[jurnal["Akun"].isin(beban_akun)]["Debit"].sum() if not jurnal.empty else 0)
+
+
+def ringkasan_rollup(username, mulai, akhir):
+    beban_akun = list(taniakun.kategori_pengeluaran) + [s for subs in taniakun.kategori_pengeluaran.values() for s in subs]
+    rollup = taniakun.rollup_rentang(username, mulai, akhir)
+    return (sum(d for (t, _, _), (d, _) in rollup.items() if t == "pemasukan.csv"),
+            sum(d for (t, _, _), (d, _) in rollup.items() if t == "pengeluaran.csv"),
+            sum(k for (t, a, _), (_, k) in rollup.items() if t == "jurnal.csv" and "Pendapatan" in a),
+            sum(d for (t, a, _), (d, _) in rollup.items() if t == "jurnal.csv" and a in beban_akun))
+
+
+def cek_rollup_acak(username, jumlah_transaksi, seed):
+    # Insert + hapus acak lewat rute, lalu bandingkan rollup dengan
+    # penjumlahan mentah di rentang acak (termasuk batas di tengah hari).
+    rng = random.Random(seed)
+    klien = klien_login(username)
+    for i in range(jumlah_transaksi):
+        tanggal = (pd.Timestamp("2023-01-01") + pd.Timedelta(days=rng.randrange(730))).strftime("%Y-%m-%d")
+        metode = rng.choice(["Tunai", "Transfer", "Piutang", "Utang"])
+        if rng.random() < 0.5:
+            klien.post("/pemasukan", data={"tanggal": tanggal, "sumber": rng.choice(["Penjualan Padi", "Lain-lain"]),
+                                           "jumlah": str(rng.randrange(1, 10**8)), "metode": metode, "deskripsi": "acak"})
+        else:
+            kategori = rng.choice(list(taniakun.kategori_pengeluaran))
+            klien.post("/pengeluaran", data={"tanggal": tanggal, "kategori": kategori,
+                                             "sub_kategori": rng.choice(taniakun.kategori_pengeluaran[kategori]),
+                                             "jumlah": str(rng.randrange(1, 10**8)), "metode": metode, "deskripsi": "acak"})
+        if i % 20 == 10:
+            # Rollup dibaca di tengah aliran supaya delta ikut teruji
+            taniakun.rollup_rentang(username, "2023-01-01", "2025-01-01")
+        if rng.random() < 0.15:
+            tipe = rng.choice(["pemasukan", "pengeluaran"])
+            df = taniakun.load_data(f"{tipe}.csv", username)
+            if not df.empty:
+                taniakun.hapus_transaksi(tipe, df["ID"].iloc[rng.randrange(len(df))], username)
+    for _ in range(30):
+        mulai = pd.Timestamp("2022-12-01") + pd.Timedelta(hours=rng.randrange(26 * 31 * 24))
+        akhir = mulai + pd.Timedelta(hours=rng.randrange(1, 400 * 24))
+        if rng.random() < 0.5:
+            mulai, akhir = mulai.normalize(), akhir.normalize() + pd.Timedelta(days=1)
+        assert ringkasan_rollup(username, mulai, akhir) == ringkasan_mentah(username, mulai, akhir), (mulai, akhir)
+
+
+def bench_rollup(ukuran, ulang):
+    print("== Ringkasan + Laba Rugi: rollup harian vs jumlah baris mentah ==")
+    for seed in range(3):
+        cek_rollup_acak(f"rollup{seed}", 300, seed)
+    print("cek acak: rollup == baris mentah (3 aliran insert/hapus)")
+    print(f"{'baris':>10} {'rentang':>9} {'rollup (ms)':>12} {'mentah (ms)':>12}")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        taniakun.save_data(buat_pengeluaran_dummy(n), "pengeluaran.csv", "bench")
+        for nama, mulai, akhir in (("1 bulan", "2023-06-01", "2023-07-01"), ("1 tahun", "2023-01-01", "2024-01-01"),
+                                   ("3 tahun", "2021-01-01", "2024-01-01")):
+            assert ringkasan_rollup("bench", mulai, akhir) == ringkasan_mentah("bench", mulai, akhir)
+            cepat = ukur(lambda: ringkasan_rollup("bench", mulai, akhir), ulang)
+            lambat = ukur(lambda: ringkasan_mentah("bench", mulai, akhir), min(ulang, 5))
+            print(f"{n:>10} {nama:>9} {cepat:>12.2f} {lambat:>12.1f}")
+
+
+def klasifikasi_lama(jurnal_df):
+    # Jalur lama laporan_page: list beban dibangun ulang, str.contains + isin
+    beban_akun = list(taniakun.kategori_pengeluaran.keys())
+    for subs in taniakun.kategori_pengeluaran.values():
+        beban_akun.extend(subs)
+    aktiva = jurnal_df[jurnal_df["Akun"].isin(["Kas", "Bank", "Piutang Dagang"])]
+    kewajiban = jurnal_df[jurnal_df["Akun"].isin(["Utang Dagang"])]
+    return (aktiva["Debit"].sum() - aktiva["Kredit"].sum(),
+            kewajiban["Kredit"].sum() - kewajiban["Debit"].sum(),
+            jurnal_df[jurnal_df["Akun"].str.contains("Pendapatan", na=False)]["Kredit"].sum(),
+            jurnal_df[jurnal_df["Akun"].isin(beban_akun)]["Debit"].sum())
+
+
+def klasifikasi_kode(jurnal_df):
+    kode = taniakun.kode_kelas(jurnal_df["Akun"])
+    n = len(taniakun.KELAS_AKUN)
+    debit = np.bincount(kode, weights=jurnal_df["Debit"].to_numpy(), minlength=n)
+    kredit = np.bincount(kode, weights=jurnal_df["Kredit"].to_numpy(), minlength=n)
+    kelas = taniakun.KELAS_AKUN.index
+    return (debit[kelas("aktiva")] - kredit[kelas("aktiva")],
+            kredit[kelas("kewajiban")] - debit[kelas("kewajiban")],
+            kredit[kelas("pendapatan")], debit[kelas("beban")])
+
+
+def bench_kategori(ukuran, ulang):
+    print("== jurnal: Akun/Metode/Kategori Categorical vs object ==")
+    print(f"{'baris':>10} {'memori obj (MB)':>16} {'memori cat (MB)':>16} {'klas. kode (ms)':>16} {'klas. lama (ms)':>16}")
+    akun = list(taniakun.BAGAN_AKUN)
+    for n in ukuran:
+        rng = np.random.default_rng(0)
+        jurnal = buat_jurnal_dummy(n)
+        jurnal["Akun"] = rng.choice(akun, size=len(jurnal))
+        jurnal["Debit"] = rng.integers(0, 10**7, size=len(jurnal)).astype(float)
+        jurnal["Kredit"] = rng.integers(0, 10**7, size=len(jurnal)).astype(float)
+        taniakun.save_data(jurnal, "jurnal.csv", "bench")
+        objek = pd.read_csv(taniakun.get_user_file("jurnal.csv", "bench"))
+        kategori = taniakun.load_data("jurnal.csv", "bench")
+        assert isinstance(kategori["Akun"].dtype, pd.CategoricalDtype)
+        hasil_lama = klasifikasi_lama(objek)
+        assert all(abs(a - b) < 1e-3 for a, b in zip(klasifikasi_kode(kategori), hasil_lama))
+        mb = lambda df: df.memory_usage(deep=True).sum() / 2**20
+        cepat = ukur(lambda: klasifikasi_kode(kategori), ulang)
+        lambat = ukur(lambda: klasifikasi_lama(objek), min(ulang, 10))
+        print(f"{n:>10} {mb(objek):>16.1f} {mb(kategori):>16.1f} {cepat:>16.2f} {lambat:>16.2f}")
+
+
+def tulis_jurnal_besar(n, username, potongan=100_000):
+    # Tulis n baris jurnal per potongan supaya proses ini tidak ikut membengkak
+    filename = taniakun.get_user_file("jurnal.csv", username)
+    kolom = taniakun.COLUMNS_MAP["jurnal.csv"]
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        f.write(",".join(kolom) + "\n")
+        for awal in range(0, n, potongan):
+            df = buat_jurnal_dummy(min(potongan, n - awal), hari=3 * 365)
+            df["ID"] = [f"{awal + i:012x}" for i in range(len(df))]
+            df.to_csv(f, index=False, header=False, lineterminator="\n")
+
+
+def _rss_export(app_dir, mode, url):
+    # Dijalankan di proses baru: puncak RSS (MB) di atas baseline sesudah import
+    taniakun.APP_DIR = app_dir
+    baseline = rss_puncak_mb()
+    t0 = time.perf_counter()
+    byte = 0
+    if mode == "stream":
+        respon = klien_login("besar").get(url, buffered=False)
+        for potongan in respon.response:
+            byte += len(potongan)
+        respon.close()
+    else:
+        # Jalur tanpa streaming: muat semua lalu bangun satu string CSV
+        mulai, akhir = pd.Timestamp("2021-01-01"), pd.Timestamp("2024-01-01")
+        byte = len(taniakun.load_data("jurnal.csv", "besar", mulai=mulai, akhir=akhir).to_csv(index=False).encode())
+    durasi = time.perf_counter() - t0
+    puncak = rss_puncak_mb()
+    return puncak, puncak - baseline, byte / 2**20, durasi
+
+
+def bench_export(ukuran, ulang):
+    # ukuran terbesar dipakai sebagai jumlah baris jurnal (mis. --ukuran 1000000)
+    print("== export jurnal: puncak RSS streaming vs muat semua ==")
+    n = max(ukuran)
+    tulis_jurnal_besar(n, "besar")
+    # Snapshot saldo (saldo awal buku besar) dibangun dulu: yang diukur exportnya
+    taniakun.saldo_per_akun("besar")
+    print(f"{'baris':>10} {'mode':>14} {'puncak RSS (MB)':>16} {'+RSS (MB)':>10} {'output (MB)':>12} {'waktu (s)':>10}")
+    ctx = multiprocessing.get_context("spawn")
+    rentang = "mulai=2021-01-01&akhir=2023-12-31"
+    for mode, url in (("stream", f"/export/jurnal?{rentang}"), ("stream gzip", f"/export/jurnal?{rentang}&gzip=1"),
+                      ("buku besar", f"/export/buku_besar?{rentang}"), ("muat semua", None)):
+        with ctx.Pool(1) as pool:
+            puncak, naik, mb, durasi = pool.apply(_rss_export, (taniakun.APP_DIR, "stream" if url else "muat", url))
+        print(f"{n:>10} {mode:>14} {puncak:>16.1f} {naik:>10.1f} {mb:>12.1f} {durasi:>10.2f}")
+
+
+def buat_csv_impor(n, seed, rusak=0):
+    rng = np.random.default_rng(seed)
+    kategori = list(taniakun.kategori_pengeluaran)
+    kat = rng.choice(kategori, n)
+    sub = [taniakun.kategori_pengeluaran[k][i % len(taniakun.kategori_pengeluaran[k])]
+           for k, i in zip(kat, rng.integers(0, 100, n))]
+    tanggal = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, n), unit="s")
+    df = pd.DataFrame({
+        "tanggal": tanggal.strftime("%d/%m/%Y %H:%M:%S"),
+        "kategori": kat,
+        "sub": sub,
+        "nominal": rng.integers(1_000, 5_000_000, n).astype(str),
+        "metode": rng.choice(taniakun.metode_pengeluaran, n),
+        "catatan": "impor",
+    })
+    if rusak:
+        idx = rng.choice(n, rusak, replace=False)
+        df.loc[idx, "nominal"] = "abc"
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False)
+    buf.seek(0)
+    return buf
+
+
+def bench_impor(ukuran, ulang):
+    print("== impor massal pengeluaran (CSV): validasi + satu tulis per file ==")
+    pemetaan = {"Tanggal": "tanggal", "Kategori": "kategori", "Sub Kategori": "sub",
+                "Jumlah": "nominal", "Metode": "metode", "Keterangan": "catatan"}
+    print(f"{'baris':>10} {'impor (s)':>10} {'baris/s':>10} {'rusak 1 (s)':>12} {'jurnal OK':>10}")
+    for n in ukuran:
+        username = f"impor{n}"
+        durasi = []
+        for i in range(ulang):
+            berkas = buat_csv_impor(n, i)
+            t0 = time.perf_counter()
+            jumlah, errors = taniakun.impor_transaksi("pengeluaran", berkas, pemetaan, username, "DD/MM/YYYY")
+            durasi.append(time.perf_counter() - t0)
+            assert jumlah == n and errors.empty, errors.head()
+        jurnal = taniakun.load_data("jurnal.csv", username)
+        seimbang = len(jurnal) == 2 * n * ulang and abs(jurnal["Debit"].sum() - jurnal["Kredit"].sum()) < 1e-6
+
+        # satu baris rusak di tengah: tidak ada yang tertulis
+        berkas = buat_csv_impor(n, 99, rusak=1)
+        t0 = time.perf_counter()
+        jumlah, errors = taniakun.impor_transaksi("pengeluaran", berkas, pemetaan, username, "DD/MM/YYYY")
+        gagal = time.perf_counter() - t0
+        seimbang = seimbang and jumlah == 0 and len(errors) == 1 and \
+            len(taniakun.load_data("jurnal.csv", username)) == 2 * n * ulang
+        rata = sum(durasi) / len(durasi)
+        print(f"{n:>10} {rata:>10.2f} {n / rata:>10.0f} {gagal:>12.2f} {str(seimbang):>10}")
+
+
+def tunggu_grafik(klien, url, batas=120):
+    t0 = time.perf_counter()
+    while True:
+        r = klien.get(url)
+        if r.status_code != 202 or time.perf_counter() - t0 > batas:
+            return r, time.perf_counter() - t0
+        time.sleep(0.01)
+
+
+def bench_grafik(ukuran, ulang):
+    print("== grafik laporan 1 tahun: gambar di request vs pool + cache file ==")
+    mulai, akhir = pd.Timestamp("2023-01-01"), pd.Timestamp("2024-01-01")
+    rentang = {"mulai": "2023-01-01", "akhir": "2023-12-31"}
+    workers_awal = taniakun.GRAFIK_WORKERS
+    print(f"{'baris':>10} {'gambar inline (ms)':>19} {'laporan miss (ms)':>18} {'laporan hit (ms)':>17} "
+          f"{'siap (s)':>9} {'png cache (ms)':>15} {'304 (ms)':>9}")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        taniakun.save_data(buat_pengeluaran_dummy(n), "pengeluaran.csv", "bench")
+        klien = klien_login("bench")
+        folder = os.path.join(taniakun.APP_DIR, "grafik", "bench")
+
+        # Tanpa pool: ketiga grafik digambar di dalam request
+        taniakun.GRAFIK_WORKERS = 0
+        shutil.rmtree(folder, ignore_errors=True)
+        t0 = time.perf_counter()
+        for jenis in taniakun.GRAFIK_JENIS:
+            taniakun.minta_grafik("bench", jenis, mulai, akhir)
+        inline = (time.perf_counter() - t0) * 1000
+
+        # Dengan pool (sudah hangat): halaman langsung kembali, gambar menyusul
+        taniakun.GRAFIK_WORKERS = max(workers_awal, 1)
+        tunggu_grafik(klien, "/grafik/kas.png?mulai=2022-01-01&akhir=2022-01-31")
+        shutil.rmtree(folder, ignore_errors=True)
+        t0 = time.perf_counter()
+        html = klien.post("/laporan", data=rentang).get_data(as_text=True)
+        halaman = (time.perf_counter() - t0) * 1000
+        urls = [u.replace("&amp;", "&") for u in re.findall(r'<img src="(/grafik/[^"]+)"', html)]
+        for url in urls:
+            r, _ = tunggu_grafik(klien, url)
+            assert r.status_code == 200, r.status_code
+        siap = time.perf_counter() - t0
+        cache = ukur(lambda: klien.post("/laporan", data=rentang), min(ulang, 5))
+
+        etag = r.headers["ETag"]
+        hit = ukur(lambda: klien.get(urls[-1]), ulang)
+        tidak_berubah = ukur(lambda: klien.get(urls[-1], headers={"If-None-Match": etag}), ulang)
+        assert klien.get(urls[-1], headers={"If-None-Match": etag}).status_code == 304
+        print(f"{n:>10} {inline:>19.1f} {halaman:>18.1f} {cache:>17.1f} {siap:>9.2f} {hit:>15.2f} {tidak_berubah:>9.2f}")
+    taniakun.GRAFIK_WORKERS = workers_awal
+
+
+def bench_api(ukuran, ulang):
+    print("== API JSON: polling dengan If-None-Match (304) vs respon penuh ==")
+    print(f"{'baris':>10} {'endpoint':>28} {'200 (ms)':>10} {'304 (ms)':>10} {'byte 200':>9}")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        taniakun.save_data(buat_pengeluaran_dummy(n), "pengeluaran.csv", "bench")
+        klien = klien_login("bench")
+        for nama, url in (("laporan 1 tahun", "/api/v1/laporan?mulai=2023-01-01&akhir=2023-12-31"),
+                          ("laporan ringkasan,neraca",
+                           "/api/v1/laporan?mulai=2023-01-01&akhir=2023-12-31&fields=ringkasan,neraca"),
+                          ("pengeluaran per=100", "/api/v1/pengeluaran?per=100"),
+                          ("pengeluaran Tanggal,Jumlah", "/api/v1/pengeluaran?per=100&fields=Tanggal,Jumlah")):
+            r = klien.get(url)
+            assert r.status_code == 200, r.status_code
+            etag = r.headers["ETag"]
+            penuh = ukur(lambda: klien.get(url), min(ulang, 10))
+            tetap = ukur(lambda: klien.get(url, headers={"If-None-Match": etag}), ulang)
+            assert klien.get(url, headers={"If-None-Match": etag}).status_code == 304
+            print(f"{n:>10} {nama:>28} {penuh:>10.1f} {tetap:>10.2f} {len(r.data):>9}")
+
+
+def bench_job(ukuran, ulang):
+    print("== laporan 3 tahun: dihitung di request vs antrean job ==")
+    rentang = {"mulai": "2021-01-01", "akhir": "2023-12-31"}
+    workers_awal, tunggu_awal, grafik_awal = taniakun.JOB_WORKERS, taniakun.LAPORAN_TUNGGU, taniakun.GRAFIK_WORKERS
+    stream_awal = taniakun.LAPORAN_STREAM
+    taniakun.GRAFIK_WORKERS, taniakun.LAPORAN_STREAM = 0, False
+    print(f"{'baris':>10} {'di request (ms)':>16} {'request job (ms)':>17} {'job siap (s)':>13} "
+          f"{'hasil cache (ms)':>17} {'GET / saat job (ms)':>20}")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        taniakun.save_data(buat_pengeluaran_dummy(n), "pengeluaran.csv", "bench")
+        klien = klien_login("bench")
+
+        # Jalur lama: semua dihitung dan dirender di thread request
+        taniakun.JOB_WORKERS = 0
+        t0 = time.perf_counter()
+        assert "Ringkasan" in klien.post("/laporan", data=rentang).get_data(as_text=True)
+        inline = (time.perf_counter() - t0) * 1000
+
+        # Antrean job: request langsung kembali, halaman polling status
+        taniakun.JOB_WORKERS = max(workers_awal, 1)
+        taniakun.LAPORAN_TUNGGU = 0
+        taniakun.append_data(taniakun.buat_jurnal("2021-06-01 08:00:00", "Kas", "Pendapatan", 1, "ubah versi"),
+                             "jurnal.csv", "bench")
+        t0 = time.perf_counter()
+        html = klien.post("/laporan", data=rentang).get_data(as_text=True)
+        kirim = (time.perf_counter() - t0) * 1000
+        status = re.search(r'data-status="([^"]+)"', html).group(1)
+        lain = []
+        while klien.get(status).get_json()["status"] != "selesai":
+            t1 = time.perf_counter()
+            klien.get("/")
+            lain.append((time.perf_counter() - t1) * 1000)
+            time.sleep(0.01)
+        siap = time.perf_counter() - t0
+        cache = ukur(lambda: klien.post("/laporan", data=rentang), min(ulang, 5))
+        lain.sort()
+        p50 = lain[len(lain) // 2] if lain else 0.0
+        print(f"{n:>10} {inline:>16.1f} {kirim:>17.1f} {siap:>13.2f} {cache:>17.1f} {p50:>20.2f}")
+    taniakun.JOB_WORKERS, taniakun.LAPORAN_TUNGGU, taniakun.GRAFIK_WORKERS = workers_awal, tunggu_awal, grafik_awal
+    taniakun.LAPORAN_STREAM = stream_awal
+
+
+def _latensi_instrumentasi(app_dir, sqlite_path, urls, ulang):
+    # Dijalankan di proses baru supaya TANIAKUN_INSTRUMENTASI terbaca saat import
+    taniakun.APP_DIR, taniakun.SQLITE_PATH = app_dir, sqlite_path
+    klien = klien_login("bench")
+    hasil = []
+    for url in urls:
+        klien.get(url)
+        hasil.append(ukur(lambda: klien.get(url), ulang))
+    return taniakun.INSTRUMENTASI, hasil
+
+
+def bench_instrumentasi(ukuran, ulang):
+    print("== overhead instrumentasi (Server-Timing + histogram) per request ==")
+    urls = ["/kelola?per=50", "/api/v1/pengeluaran?per=100", "/api/v1/laporan?mulai=2023-01-01&akhir=2023-12-31"]
+    print(f"{'baris':>10} {'url':>52} {'mati (ms)':>10} {'aktif (ms)':>11} {'selisih':>8}")
+    ctx = multiprocessing.get_context("spawn")
+    awal = os.environ.get("TANIAKUN_INSTRUMENTASI")
+    for n in ukuran:
+        taniakun.save_data(buat_jurnal_dummy(n), "jurnal.csv", "bench")
+        taniakun.save_data(buat_pengeluaran_dummy(n), "pengeluaran.csv", "bench")
+        ms = {}
+        for mode in ("0", "1"):
+            os.environ["TANIAKUN_INSTRUMENTASI"] = mode
+            with ctx.Pool(1) as pool:
+                aktif, ms[mode] = pool.apply(_latensi_instrumentasi,
+                                             (taniakun.APP_DIR, taniakun.SQLITE_PATH, urls, ulang))
+            assert aktif == (mode == "1")
+        for url, mati, hidup in zip(urls, ms["0"], ms["1"]):
+            print(f"{n:>10} {url:>52} {mati:>10.2f} {hidup:>11.2f} {(hidup / mati - 1) * 100:>7.1f}%")
+    if awal is None:
+        os.environ.pop("TANIAKUN_INSTRUMENTASI", None)
+    else:
+        os.environ["TANIAKUN_INSTRUMENTASI"] = awal
+
+
+# ---------------- Suite beban: data tani sintetis ----------------
+# Satu petani: pemasukan terkumpul di bulan panen, pengeluaran di semua
+# sub kategori dengan puncak di musim tanam, dan sebagian transaksi
+# Piutang/Utang dilunasi 1-8 minggu kemudian. Data dibangun vektor supaya
+# 1 juta baris jurnal tetap cepat; pemetaan akun sama dengan simpan_pemasukan
+# / simpan_pengeluaran. Hasil suite bisa disimpan (--json) dan dibandingkan
+# dengan hasil commit lain (--banding).
+
+HASIL_JSON = None
+BANDING_JSON = None
+
+# Bobot per bulan (Jan..Des): panen rendeng Mar-Apr, panen gadu Agu-Sep
+MUSIM_PANEN = np.array([0.5, 1, 4, 4, 1, 0.5, 1, 4, 3, 0.5, 0.5, 0.5])
+MUSIM_TANAM = np.array([2, 1.5, 1, 1, 2, 2.5, 2, 1, 1, 1.5, 2.5, 2.5])
+NOMINAL_PENGELUARAN = {
+    "Bibit": (100_000, 1_500_000), "Pupuk": (150_000, 3_000_000), "Pestisida": (50_000, 1_000_000),
+    "Alat Tani": (20_000, 750_000), "Tenaga Kerja": (100_000, 4_000_000), "Lainnya": (10_000, 500_000),
+}
+AKUN_MASUK = {"Tunai": "Kas", "Transfer": "Bank", "Piutang": "Piutang Dagang", "Pelunasan Piutang": "Kas"}
+AKUN_KELUAR = {"Tunai": "Kas", "Transfer": "Bank", "Utang": "Utang Dagang", "Pelunasan Utang": "Kas"}
+
+
+def _waktu_musiman(rng, n, bobot, awal, tahun):
+    bulan = np.arange(tahun * 12)
+    p = np.tile(bobot, tahun)
+    pilih = rng.choice(bulan, n, p=p / p.sum())
+    mulai_bulan = awal + pd.to_timedelta(pilih * 30.44, unit="D")
+    return mulai_bulan + pd.to_timedelta(rng.integers(0, 30 * 86400, n), unit="s")
+
+
+def _tambah_pelunasan(rng, df, metode_kredit, metode_lunas, porsi=0.8):
+    # Sebagian transaksi kredit dilunasi 7-60 hari kemudian dengan nominal sama
+    kredit = df[df["Metode"] == metode_kredit]
+    lunas = kredit.sample(frac=porsi, random_state=int(rng.integers(2**31))).copy()
+    lunas["Tanggal"] = lunas["Tanggal"] + pd.to_timedelta(rng.integers(7, 61, len(lunas)), unit="D")
+    lunas["Metode"] = metode_lunas
+    lunas["Keterangan"] = "Pelunasan"
+    return pd.concat([df, lunas], ignore_index=True)
+
+
+def _id_acak(rng, n):
+    awal = int(rng.integers(0, 2**47))
+    return [f"{awal + i * 7919:012x}" for i in range(n)]
+
+
+def buat_data_tani(n_jurnal, username, seed=0, tahun=3):
+    # Hasil: (pemasukan, pengeluaran, jurnal) dengan ~n_jurnal baris jurnal
+    rng = np.random.default_rng(seed)
+    awal = pd.Timestamp("2021-01-01 06:00:00")
+    n = max(n_jurnal // 2, 4)
+    # ~14% transaksi kredit dilunasi belakangan, jadi baris dasar dikurangi
+    n_dasar = int(n / 1.12)
+    n_masuk = max(n_dasar // 4, 1)
+    n_keluar = max(n_dasar - n_masuk, 1)
+
+    daftar_sumber = taniakun.kategori_pemasukan["Sumber Pemasukan"]
+    sumber = rng.choice(daftar_sumber, n_masuk, p=[0.85, 0.15])
+    padi = sumber == daftar_sumber[0]
+    pemasukan = pd.DataFrame({
+        "Tanggal": _waktu_musiman(rng, n_masuk, MUSIM_PANEN, awal, tahun),
+        "Sumber": sumber,
+        "Jumlah": np.where(padi, rng.integers(2_000_000, 20_000_000, n_masuk),
+                           rng.integers(100_000, 2_000_000, n_masuk)).round(-3).astype(float),
+        "Metode": rng.choice(["Tunai", "Transfer", "Piutang"], n_masuk, p=[0.5, 0.3, 0.2]),
+        "Keterangan": np.where(padi, "Panen", "Lain-lain"),
+    })
+    pemasukan = _tambah_pelunasan(rng, pemasukan, "Piutang", "Pelunasan Piutang")
+
+    sub = [(kat, s) for kat, subs in taniakun.kategori_pengeluaran.items() for s in subs]
+    pilih = rng.integers(0, len(sub), n_keluar)
+    kategori = np.array([k for k, _ in sub])[pilih]
+    bawah = np.array([NOMINAL_PENGELUARAN[k][0] for k, _ in sub])[pilih]
+    atas = np.array([NOMINAL_PENGELUARAN[k][1] for k, _ in sub])[pilih]
+    pengeluaran = pd.DataFrame({
+        "Tanggal": _waktu_musiman(rng, n_keluar, MUSIM_TANAM, awal, tahun),
+        "Kategori": kategori,
+        "Sub Kategori": np.array([s for _, s in sub])[pilih],
+        "Jumlah": (bawah + rng.random(n_keluar) * (atas - bawah)).round(-3),
+        "Keterangan": "Operasional",
+        "Metode": rng.choice(["Tunai", "Transfer", "Utang"], n_keluar, p=[0.6, 0.2, 0.2]),
+    })
+    pengeluaran = _tambah_pelunasan(rng, pengeluaran, "Utang", "Pelunasan Utang")
+
+    jurnal = []
+    for df, tipe in ((pemasukan, "pemasukan"), (pengeluaran, "pengeluaran")):
+        df.sort_values("Tanggal", inplace=True, kind="stable")
+        df.reset_index(drop=True, inplace=True)
+        df["Tanggal"] = df["Tanggal"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        df["Username"] = username
+        df["ID"] = _id_acak(rng, len(df))
+        if tipe == "pemasukan":
+            lunas = df["Metode"] == "Pelunasan Piutang"
+            debit = df["Metode"].map(AKUN_MASUK)
+            kredit = pd.Series(np.where(lunas, "Piutang Dagang", "Pendapatan"), index=df.index)
+            keterangan = df["Sumber"] + " - " + df["Keterangan"]
+        else:
+            lunas = df["Metode"] == "Pelunasan Utang"
+            debit = df["Sub Kategori"].where(~lunas, "Utang Dagang")
+            kredit = df["Metode"].map(AKUN_KELUAR)
+            keterangan = df["Kategori"] + " - " + df["Keterangan"]
+        for akun, sisi, akhiran in ((debit, "Debit", "-D"), (kredit, "Kredit", "-K")):
+            jurnal.append(pd.DataFrame({
+                "Tanggal": df["Tanggal"], "Akun": akun,
+                "Debit": df["Jumlah"] if sisi == "Debit" else 0.0,
+                "Kredit": df["Jumlah"] if sisi == "Kredit" else 0.0,
+                "Keterangan": keterangan, "ID": df["ID"] + akhiran,
+            }))
+    jurnal = pd.concat(jurnal, ignore_index=True).sort_values(["Tanggal", "ID"], kind="stable")
+    return (pemasukan[taniakun.COLUMNS_MAP["pemasukan.csv"]],
+            pengeluaran[taniakun.COLUMNS_MAP["pengeluaran.csv"]],
+            jurnal[taniakun.COLUMNS_MAP["jurnal.csv"]].reset_index(drop=True))
+
+
+def statistik(waktu, total):
+    # waktu: daftar detik per operasi; p50/p99 nearest-rank dalam ms
+    urut = sorted(waktu)
+    def persentil(p):
+        return urut[min(len(urut) - 1, max(0, int(np.ceil(p / 100 * len(urut))) - 1))] * 1000
+    return {"n": len(urut), "ops_per_detik": len(urut) / total if total else 0.0,
+            "p50_ms": persentil(50), "p99_ms": persentil(99), "maks_ms": urut[-1] * 1000}
+
+
+def _jalankan_beban(app_dir, sqlite_path, username, ulang, seed):
+    # Dijalankan di proses baru per ukuran supaya puncak RSS tidak tercampur.
+    # Laporan dihitung langsung di request (JOB_WORKERS=0) dan tanpa grafik,
+    # jadi yang terukur adalah biaya hitung + render, bukan waktu antre.
+    taniakun.APP_DIR, taniakun.SQLITE_PATH = app_dir, sqlite_path
+    taniakun.JOB_WORKERS = taniakun.GRAFIK_WORKERS = 0
+    rss_awal = rss_puncak_mb()
+    acak = random.Random(seed)
+    klien = klien_login(username)
+    hasil = {}
+
+    def jalankan(nama, buat_request, kali):
+        waktu = []
+        t0 = time.perf_counter()
+        for i in range(kali):
+            t1 = time.perf_counter()
+            r = buat_request(i)
+            r.get_data()  # halaman Laporan bisa streaming: waktu diukur sampai byte terakhir
+            waktu.append(time.perf_counter() - t1)
+            assert r.status_code < 400, (nama, r.status_code)
+        hasil[nama] = statistik(waktu, time.perf_counter() - t0)
+
+    def tanggal_acak():
+        return (pd.Timestamp("2021-01-01") + pd.Timedelta(days=acak.randrange(3 * 365))).strftime("%Y-%m-%d")
+
+    jalankan("insert pemasukan", lambda i: klien.post("/pemasukan", data={
+        "tanggal": tanggal_acak(), "sumber": acak.choice(taniakun.kategori_pemasukan["Sumber Pemasukan"]),
+        "jumlah": str(acak.randrange(100, 20_000) * 1000), "metode": taniakun.metode_pemasukan[i % 4],
+        "deskripsi": "beban"}), ulang)
+    jalankan("insert pengeluaran", lambda i: klien.post("/pengeluaran", data={
+        "tanggal": tanggal_acak(), "kategori": (kat := acak.choice(list(taniakun.kategori_pengeluaran))),
+        "sub_kategori": acak.choice(taniakun.kategori_pengeluaran[kat]),
+        "jumlah": str(acak.randrange(10, 4_000) * 1000), "metode": taniakun.metode_pengeluaran[i % 4],
+        "deskripsi": "beban"}), ulang)
+    jalankan("kelola", lambda i: klien.get("/kelola?per=50"), ulang)
+    jalankan("kelola filter", lambda i: klien.get(
+        f"/kelola?per=50&kategori={acak.choice(list(taniakun.kategori_pengeluaran))}&mulai={tanggal_acak()}"), ulang)
+
+    ids = taniakun.load_data("pengeluaran.csv", username)["ID"].tolist()
+    hapus = acak.sample(ids, min(ulang, len(ids)))
+    jalankan("hapus", lambda i: klien.get(f"/hapus/pengeluaran/{hapus[i]}"), len(hapus))
+
+    # Rentang acak supaya tiap laporan benar-benar dihitung (bukan hasil cache job)
+    kali_laporan = max(ulang // 5, 3)
+    for nama, hari in (("laporan 1 bulan", 30), ("laporan 1 kuartal", 91), ("laporan 1 tahun", 365)):
+        def laporan(i, hari=hari):
+            mulai = pd.Timestamp("2021-01-01") + pd.Timedelta(days=acak.randrange(3 * 365 - hari))
+            akhir = mulai + pd.Timedelta(days=hari - 1)
+            return klien.post("/laporan", data={"mulai": mulai.strftime("%Y-%m-%d"), "akhir": akhir.strftime("%Y-%m-%d")})
+        jalankan(nama, laporan, kali_laporan)
+    jalankan("laporan semua", lambda i: klien.post("/laporan", data={
+        "mulai": "2021-01-01", "akhir": f"2023-12-{acak.randrange(1, 32):02d}"}), kali_laporan)
+
+    puncak = rss_puncak_mb()
+    return {"rss_puncak_mb": puncak, "rss_naik_mb": puncak - rss_awal, "workload": hasil}
+
+
+def _commit_sekarang():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_beban(ukuran, ulang):
+    # mis. --ukuran 1000 10000 100000 1000000 --json hasil.json
+    print(f"== suite beban: data tani sintetis ({taniakun.STORAGE_BACKEND}) ==")
+    banding = {}
+    if BANDING_JSON:
+        with open(BANDING_JSON, encoding="utf-8") as f:
+            banding = json.load(f)["hasil"]
+    hasil = {}
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'baris':>10} {'workload':>20} {'ops/s':>9} {'p50 (ms)':>10} {'p99 (ms)':>10} {'vs banding':>11}")
+    for n in ukuran:
+        username = f"tani{n}"
+        t0 = time.perf_counter()
+        for df, base in zip(buat_data_tani(n, username, seed=n), ("pemasukan.csv", "pengeluaran.csv", "jurnal.csv")):
+            taniakun.save_data(df, base, username)
+        siap = time.perf_counter() - t0
+        with ctx.Pool(1) as pool:
+            hasil[str(n)] = pool.apply(_jalankan_beban, (taniakun.APP_DIR, taniakun.SQLITE_PATH, username, ulang, n))
+        hasil[str(n)]["siapkan_data_s"] = siap
+        lama = banding.get(str(n), {}).get("workload", {})
+        for nama, st in hasil[str(n)]["workload"].items():
+            beda = f"{(st['p50_ms'] / lama[nama]['p50_ms'] - 1) * 100:+.1f}%" if nama in lama else "-"
+            print(f"{n:>10} {nama:>20} {st['ops_per_detik']:>9.1f} {st['p50_ms']:>10.2f} {st['p99_ms']:>10.2f} {beda:>11}")
+        print(f"{n:>10} {'puncak RSS (MB)':>20} {hasil[str(n)]['rss_puncak_mb']:>9.1f}"
+              f"   (+{hasil[str(n)]['rss_naik_mb']:.1f} MB selama workload, data disiapkan {siap:.1f} s)")
+    if HASIL_JSON:
+        with open(HASIL_JSON, "w", encoding="utf-8") as f:
+            json.dump({"commit": _commit_sekarang(), "waktu": datetime.now().isoformat(timespec="seconds"),
+                       "backend": taniakun.STORAGE_BACKEND, "python": sys.version.split()[0],
+                       "ulang": ulang, "hasil": hasil}, f, indent=2)
+        print(f"hasil disimpan ke {HASIL_JSON}")
+
+
+def _baca_kolom(app_dir, username, mode):
+    # Dijalankan di proses baru: (detik, +RSS MB, baris) untuk satu cara baca
+    taniakun.APP_DIR = app_dir
+    kolom = ["Tanggal", "Akun", "Debit", "Kredit"]
+    baseline = rss_puncak_mb()
+    t0 = time.perf_counter()
+    if mode == "pd.read_csv":
+        df = pd.read_csv(taniakun.get_user_file("jurnal.csv", username))
+    elif mode == "load_data CSV":
+        df = taniakun.load_data("jurnal.csv", username)
+    elif mode == "parquet 4 kolom":
+        df = taniakun.load_data("jurnal.csv", username, kolom=kolom)
+    else:
+        df = taniakun.load_data("jurnal.csv", username, mulai=pd.Timestamp("2022-05-01"),
+                                akhir=pd.Timestamp("2022-06-01"), kolom=kolom)
+    durasi = time.perf_counter() - t0
+    return durasi, rss_puncak_mb() - baseline, len(df)
+
+
+def bench_kolom(ukuran, ulang):
+    print("== baca jurnal: CSV penuh vs Parquet (proyeksi kolom + row group) ==")
+    if taniakun.pq is None:
+        print("pyarrow belum terpasang, dilewati")
+        return
+    print(f"{'baris':>10} {'cara baca':>24} {'waktu (s)':>10} {'+RSS (MB)':>10} {'hasil':>9} {'file (MB)':>10}")
+    ctx = multiprocessing.get_context("spawn")
+    awal = os.environ.get("TANIAKUN_KOLOM")
+    for n in ukuran:
+        username = f"kolom{n}"
+        jurnal = buat_data_tani(n, username, seed=n)[2]
+        jurnal.to_csv(taniakun.get_user_file("jurnal.csv", username), index=False)
+        taniakun._tulis_kolom(jurnal, "jurnal.csv", username)
+        del jurnal
+        ukuran_file = {"csv": os.path.getsize(taniakun.get_user_file("jurnal.csv", username)) / 2**20,
+                       "parquet": os.path.getsize(taniakun._kolom_file("jurnal.csv", username)) / 2**20}
+        for mode in ("pd.read_csv", "load_data CSV", "parquet 4 kolom", "parquet 4 kolom 1 bulan"):
+            os.environ["TANIAKUN_KOLOM"] = "1" if mode.startswith("parquet") else "0"
+            with ctx.Pool(1) as pool:
+                durasi, naik, baris = pool.apply(_baca_kolom, (taniakun.APP_DIR, username, mode))
+            print(f"{n:>10} {mode:>24} {durasi:>10.3f} {naik:>10.1f} {baris:>9} "
+                  f"{ukuran_file['parquet' if mode.startswith('parquet') else 'csv']:>10.1f}")
+    if awal is None:
+        os.environ.pop("TANIAKUN_KOLOM", None)
+    else:
+        os.environ["TANIAKUN_KOLOM"] = awal
+
+
+def bench_skema(ukuran, ulang):
+    print("== parse jurnal CSV: inferensi + to_datetime per laporan vs skema bertipe ==")
+    print(f"{'baris':>10} {'read_csv lama (ms)':>19} {'_baca_csv (ms)':>15} {'to_datetime/laporan (ms)':>25} "
+          f"{'selisih float (Rp)':>19}")
+    for n in ukuran:
+        jurnal = buat_data_tani(n, "skema", seed=n)[2]
+        # Nominal ber-sen seperti data lama yang ditulis sebagai float
+        jurnal["Debit"] = jurnal["Debit"] + np.where(jurnal["Debit"] > 0, 0.1, 0.0)
+        jurnal["Kredit"] = jurnal["Kredit"] + np.where(jurnal["Kredit"] > 0, 0.1, 0.0)
+        buf = io.StringIO()
+        jurnal.to_csv(buf, index=False)
+        teks = buf.getvalue()
+
+        def lama():
+            df = taniakun._pakai_kategori(pd.read_csv(io.StringIO(teks)))
+            pd.to_datetime(df["Tanggal"], errors="coerce")
+            return df
+        df_lama = lama()
+        t_lama = ukur(lama, min(ulang, 10))
+        t_baru = ukur(lambda: taniakun._baca_csv(io.StringIO(teks), "jurnal.csv"), min(ulang, 10))
+        df_baru = taniakun._baca_csv(io.StringIO(teks), "jurnal.csv")
+        # Sebelumnya tiap laporan mem-parse ulang Tanggal string di cache
+        t_laporan = ukur(lambda: pd.to_datetime(df_lama["Tanggal"], errors="coerce"), min(ulang, 10))
+        # Akumulasi float berurutan (seperti snapshot/rollup) bergeser dari
+        # total tepatnya; dengan int64 selalu tepat
+        assert df_baru["Debit"].sum() == df_baru["Kredit"].sum()
+        geser = abs(sum(df_lama["Debit"].tolist()) - math.fsum(df_lama["Debit"]))
+        print(f"{n:>10} {t_lama:>19.1f} {t_baru:>15.1f} {t_laporan:>25.1f} {geser:>19.2e}")
+
+
+def _baca_partisi(app_dir, username, mode):
+    # Dijalankan di proses baru (cache kosong): (detik, +RSS MB, baris)
+    taniakun.APP_DIR = app_dir
+    mulai, akhir = pd.Timestamp("2023-06-01"), pd.Timestamp("2023-07-01")
+    baseline = rss_puncak_mb()
+    t0 = time.perf_counter()
+    if mode == "laporan":
+        baris = len(taniakun.hitung_laporan(username, mulai, akhir)["jurnal"])
+    elif mode == "kelola":
+        baris = taniakun.load_halaman("pengeluaran.csv", username, per=50, mulai=mulai, akhir=akhir)[1]
+    else:
+        # Halaman pertama Kelola tanpa filter tanggal (semua bulan)
+        baris = taniakun.load_halaman("pengeluaran.csv", username, per=50)[1]
+    durasi = time.perf_counter() - t0
+    return durasi, rss_puncak_mb() - baseline, baris
+
+
+def bench_partisi(ukuran, ulang):
+    print("== laporan & kelola 1 bulan (cache kosong): file tunggal vs partisi bulanan ==")
+    print(f"{'baris':>10} {'operasi':>8} {'tunggal (ms)':>13} {'partisi (ms)':>13} "
+          f"{'+RSS tunggal':>13} {'+RSS partisi':>13} {'migrasi (ms)':>13}")
+    ctx = multiprocessing.get_context("spawn")
+    for n in ukuran:
+        data = buat_data_tani(n, "partisi", seed=n)
+        migrasi = 0.0
+        for username in (f"tunggal{n}", f"partisi{n}"):
+            for base_filename, df in zip(("pemasukan.csv", "pengeluaran.csv", "jurnal.csv"), data):
+                df.assign(Username=username).to_csv(taniakun.get_user_file(base_filename, username), index=False)
+            if username.startswith("partisi"):
+                t0 = time.perf_counter()
+                for base_filename in taniakun.COLUMNS_MAP:
+                    taniakun.pecah_partisi(base_filename, username)
+                migrasi = (time.perf_counter() - t0) * 1000
+            # Snapshot saldo, rollup dan index partisi dibangun dulu: yang diukur
+            # baris jurnal / halaman
+            taniakun.saldo_per_akun(username)
+            taniakun.rollup_rentang(username, pd.Timestamp("2023-01-01"), pd.Timestamp("2023-02-01"))
+            taniakun.load_halaman("pengeluaran.csv", username)
+        for mode in ("laporan", "kelola", "terbaru"):
+            hasil = {}
+            for username in (f"tunggal{n}", f"partisi{n}"):
+                with ctx.Pool(1) as pool:
+                    hasil[username[:7]] = pool.apply(_baca_partisi, (taniakun.APP_DIR, username, mode))
+            assert hasil["tunggal"][2] == hasil["partisi"][2], hasil
+            print(f"{n:>10} {mode:>8} {hasil['tunggal'][0] * 1000:>13.1f} {hasil['partisi'][0] * 1000:>13.1f} "
+                  f"{hasil['tunggal'][1]:>13.1f} {hasil['partisi'][1]:>13.1f} {migrasi:>13.1f}")
+
+
+def _laporan_stream(app_dir, username, stream):
+    # Dijalankan di proses baru: (TTFB detik, total detik, +RSS MB, byte, potongan)
+    taniakun.APP_DIR = app_dir
+    taniakun.LAPORAN_STREAM, taniakun.JOB_WORKERS, taniakun.GRAFIK_WORKERS = stream, 0, 0
+    klien = klien_login(username)
+    baseline = rss_puncak_mb()
+    t0 = time.perf_counter()
+    resp = klien.post("/laporan", data={"mulai": "2021-01-01", "akhir": "2023-12-31"}, buffered=False)
+    potongan = iter(resp.response)
+    pertama = next(potongan)
+    ttfb = time.perf_counter() - t0
+    assert b"Laporan Laba Rugi" in pertama or not stream
+    total, jumlah = len(pertama), 1
+    for blok in potongan:
+        total += len(blok)
+        jumlah += 1
+    resp.close()
+    return ttfb, time.perf_counter() - t0, rss_puncak_mb() - baseline, total, jumlah
+
+
+def bench_stream(ukuran, ulang):
+    print("== halaman Laporan 3 tahun (cache kosong): render penuh vs streaming ==")
+    print(f"{'baris':>10} {'mode':>8} {'TTFB (ms)':>10} {'total (ms)':>11} {'+RSS (MB)':>10} "
+          f"{'HTML (MB)':>10} {'potongan':>9}")
+    ctx = multiprocessing.get_context("spawn")
+    for n in ukuran:
+        username = f"stream{n}"
+        for base_filename, df in zip(("pemasukan.csv", "pengeluaran.csv", "jurnal.csv"),
+                                     buat_data_tani(n, username, seed=n)):
+            taniakun.save_data(df, base_filename, username)
+        # Snapshot saldo & rollup dibangun dulu, seperti di server yang sudah jalan
+        taniakun.saldo_per_akun(username)
+        taniakun.rollup_rentang(username, pd.Timestamp("2021-01-01"), pd.Timestamp("2024-01-01"))
+        for mode, stream in (("penuh", False), ("stream", True)):
+            with ctx.Pool(1) as pool:
+                ttfb, total, rss, byte, jumlah = pool.apply(_laporan_stream, (taniakun.APP_DIR, username, stream))
+            print(f"{n:>10} {mode:>8} {ttfb * 1000:>10.1f} {total * 1000:>11.1f} {rss:>10.1f} "
+                  f"{byte / 2**20:>10.1f} {jumlah:>9}")
+
+
+def _file_tenant_datar(root, username):
+    # Cara menemukan file satu user di layout datar: scan seluruh folder
+    return [nama for nama in os.listdir(root)
+            if (m := taniakun._POLA_FILE_USER.fullmatch(nama)) and username in m.groups()]
+
+
+def _ops_tenant(root, users, ulang):
+    # Latensi operasi file per user untuk layout yang sedang aktif
+    rng = random.Random(1)
+    sampel = iter([rng.choice(users) for _ in range(ulang * 8)])
+    datar = taniakun.LAYOUT_DATA != "shard"
+    hasil = {
+        "stat": ukur(lambda: os.stat(taniakun.get_user_file("jurnal.csv", next(sampel))), ulang) * 1000,
+        "buat": ukur(lambda: open(taniakun.get_user_file("saldo.json", next(sampel)), "w").close(), ulang) * 1000,
+    }
+    sedikit = min(ulang, 5)
+    if datar:
+        hasil["daftar"] = ukur(lambda: _file_tenant_datar(root, next(sampel)), sedikit)
+        hasil["ukuran"] = ukur(lambda: sum(os.path.getsize(os.path.join(root, nama))
+                                           for nama in _file_tenant_datar(root, next(sampel))), sedikit)
+    else:
+        hasil["daftar"] = ukur(lambda: os.listdir(taniakun._folder_user(next(sampel))), sedikit)
+        hasil["ukuran"] = ukur(lambda: taniakun.ukuran_user(next(sampel)), sedikit)
+    tujuan = os.path.join(root, "backup.tar.gz")
+
+    def backup():
+        username = next(sampel)
+        if not datar:
+            taniakun.backup_user(username, tujuan)
+            return
+        with tarfile.open(tujuan, "w:gz") as tar:
+            for nama in _file_tenant_datar(root, username):
+                tar.add(os.path.join(root, nama), arcname=nama)
+    hasil["backup"] = ukur(backup, sedikit)
+    hasil["akar"] = ukur(lambda: os.listdir(root), sedikit)
+    return hasil
+
+
+def bench_layout(ukuran, ulang):
+    # ukuran tidak dipakai: jumlah user tetap 10rb / 100rb, masing-masing
+    # 3 file CSV (header + 1 baris) seperti user yang baru mulai mencatat
+    print("== operasi file per user: layout datar vs shard (folder per user) ==")
+    print(f"{'user':>8} {'layout':>7} {'stat (us)':>10} {'buat (us)':>10} {'daftar (ms)':>12} "
+          f"{'ukuran (ms)':>12} {'backup (ms)':>12} {'ls akar (ms)':>13} {'pindah (s)':>11}")
+    app_dir, layout = taniakun.APP_DIR, taniakun.LAYOUT_DATA
+    isi = {os.path.splitext(b)[0]: ",".join(kolom) + "\n" + ",".join("1" for _ in kolom) + "\n"
+           for b, kolom in taniakun.COLUMNS_MAP.items()}
+    for n in (10_000, 100_000):
+        root = os.path.join(app_dir, f"layout{n}")
+        os.makedirs(root)
+        taniakun.APP_DIR, taniakun.LAYOUT_DATA = root, "datar"
+        users = [f"petani{i}" for i in range(n)]
+        for username in users:
+            for nama, teks in isi.items():
+                with open(os.path.join(root, f"{nama}_{username}.csv"), "w", encoding="utf-8") as f:
+                    f.write(teks)
+        datar = _ops_tenant(root, users, ulang)
+
+        taniakun.LAYOUT_DATA = "shard"
+        t0 = time.perf_counter()
+        for username in users:
+            taniakun._folder_user(username)  # pindah online, seperti akses pertama
+        pindah = time.perf_counter() - t0
+        assert len(os.listdir(root)) <= 3, os.listdir(root)[:5]
+        shard = _ops_tenant(root, users, ulang)
+        for nama, hasil, detik in (("datar", datar, ""), ("shard", shard, f"{pindah:.1f}")):
+            print(f"{n:>8} {nama:>7} {hasil['stat']:>10.1f} {hasil['buat']:>10.1f} {hasil['daftar']:>12.3f} "
+                  f"{hasil['ukuran']:>12.3f} {hasil['backup']:>12.2f} {hasil['akar']:>13.2f} {detik:>11}")
+        taniakun._folder_siap.clear()
+        taniakun._kunci.clear()
+        shutil.rmtree(root)
+    taniakun.APP_DIR, taniakun.LAYOUT_DATA = app_dir, layout
+
+
+BENCHMARKS = {
+    "append": bench_append,
+    "backend": bench_backend,
+    "saldo": bench_saldo,
+    "buku_besar": bench_buku_besar,
+    "cache": bench_cache,
+    "template": bench_template,
+    "kelola": bench_kelola,
+    "hapus": bench_hapus,
+    "tulis_paralel": bench_tulis_paralel,
+    "login": bench_login,
+    "login_beban": bench_login_beban,
+    "rollup": bench_rollup,
+    "kategori": bench_kategori,
+    "export": bench_export,
+    "impor": bench_impor,
+    "grafik": bench_grafik,
+    "api": bench_api,
+    "job": bench_job,
+    "instrumentasi": bench_instrumentasi,
+    "beban": bench_beban,
+    "kolom": bench_kolom,
+    "skema": bench_skema,
+    "partisi": bench_partisi,
+    "layout": bench_layout,
+    "stream": bench_stream,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TaniAkun")
+    parser.add_argument("nama", nargs="*", help=f"pilihan: {', '.join(BENCHMARKS)} (default: semua)")
+    parser.add_argument("--ukuran", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--ulang", type=int, default=50)
+    parser.add_argument("--json", help="simpan hasil suite beban ke file JSON ini")
+    parser.add_argument("--banding", help="file JSON hasil suite beban commit lain untuk dibandingkan")
+    args = parser.parse_args()
+    for nama in args.nama:
+        if nama not in BENCHMARKS:
+            parser.error(f"benchmark tidak dikenal: {nama}")
+
+    global HASIL_JSON, BANDING_JSON
+    HASIL_JSON, BANDING_JSON = args.json, args.banding
+
+    with tempfile.TemporaryDirectory() as tmp:
+        taniakun.APP_DIR, taniakun.DATA_DIR = tmp, None
+        taniakun.SQLITE_PATH = os.path.join(tmp, "bench.db")
+        for nama in args.nama or list(BENCHMARKS):
+            BENCHMARKS[nama](args.ukuran, args.ulang)
+
+
+if __name__ == "__main__":
+    main()